@@ -1,70 +1,273 @@
-from flask import Flask, request, jsonify
-import subprocess
-import os
+from flask import Flask, Response, request, jsonify, url_for
+import base64
+import binascii
+import json
+import math
+import threading
+from datetime import date
+from functools import partial
+from utils.fetch_engine import DEFAULT_CONCURRENCY
+from utils.jobs import JobQueue
+from utils.listing_store import ListingStore, DEFAULT_STORE_DB
+from utils.query_cache import QueryCache
+from utils.rollups import ROLLUP_GROUPS
+from utils.telemetry import get_metrics, recent_reports
 
 app = Flask(__name__)
 
+# Scrapes run in the background; /scrape only queues them
+job_queue = JobQueue(max_workers=4)
+
+OUTPUT_FILES = {
+    'rightmove': 'rightmove_data.csv',
+    'openrent': 'openrent_data.csv',
+}
+DELTA_FILES = {
+    'rightmove': 'rightmove_delta.csv',
+    'openrent': 'openrent_delta.csv',
+}
+# Every scrape also lands in the listing store, building history across runs
+STORE_DB = DEFAULT_STORE_DB
+
+# Read endpoints: repeat queries are served from here until the store changes
+query_cache = QueryCache()
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STATS_GROUPS = ('area', 'property_type', 'site')
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ListingStore(STORE_DB)
+        return _store
+
+
+def run_site_scrape(site, output_file, concurrency, incremental, progress):
+    """
+    Run one site's scrape; called on a job queue worker thread. The
+    scrapers are imported by the first job rather than at startup, and
+    every job shares one long-lived handler (scrapers.core.default_handler).
+    """
+    from scrapers.core import get_adapter, scrape_site
+    scrape_site(get_adapter(site), output_file, concurrency=concurrency,
+                incremental=incremental, progress=progress, store_db=STORE_DB)
+
+
 @app.route('/scrape', methods=['POST'])
 def scrape():
     """
-    Trigger scraping for Rightmove or OpenRent (or both).
+    Queue scraping for Rightmove or OpenRent (or both) and return a job id.
     Expected JSON body:
       {
-        "site": "rightmove" | "openrent" | "all"
+        "site": "rightmove" | "openrent" | "all",
+        "concurrency": 4 | {"rightmove": 4, "openrent": 2},  (optional)
+        "incremental": true | false   (optional, only new/changed listings)
       }
+    Poll GET /jobs/<job_id> for status, progress and output files. An
+    identical request that is still in flight returns the existing job.
     """
-    data = request.get_json()
-    if not data or 'site' not in data:
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'site' not in data:
         return jsonify({"error": "Please specify 'site' in JSON body."}), 400
+    if not isinstance(data['site'], str):
+        return jsonify({"error": "'site' must be a string."}), 400
 
     site = data['site'].lower()
+    if site == 'all':
+        sites = ['rightmove', 'openrent']
+    elif site in OUTPUT_FILES:
+        sites = [site]
+    else:
+        return jsonify({"error": "Invalid site specified"}), 400
+
+    concurrency = data.get('concurrency', {})
+    if not isinstance(concurrency, dict):
+        concurrency = {name: concurrency for name in sites}
+    try:
+        concurrency = {name: int(concurrency.get(name, DEFAULT_CONCURRENCY)) for name in sites}
+    except (TypeError, ValueError):
+        return jsonify({"error": "'concurrency' must be an integer or a per-site mapping."}), 400
+
+    incremental = bool(data.get('incremental', False))
+    # Incremental runs write a delta file, so they never share a full scrape's task
+    output_files = {name: (DELTA_FILES if incremental else OUTPUT_FILES)[name] for name in sites}
+    tasks = {
+        name: (output_files[name],
+               partial(run_site_scrape, name, output_files[name], concurrency[name], incremental))
+        for name in sites
+    }
+    key = json.dumps({"sites": sites, "concurrency": concurrency, "incremental": incremental},
+                     sort_keys=True)
+    job, created = job_queue.submit(key, tasks)
+
+    body = job.as_dict()
+    body["status_url"] = url_for('job_status', job_id=job.id)
+    body["deduplicated"] = not created
+    return jsonify(body), 202 if created else 200
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Recent scrape jobs, newest first"""
+    return jsonify([job.as_dict() for job in reversed(job_queue.list())]), 200
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status, per-site progress (pages, listings, failures) and result files of a job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job.as_dict()), 200
+
+
+def encode_cursor(listing):
+    raw = json.dumps([listing['monthly_price'], listing['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(monthly_price, id) from a cursor; the price is None past listings without one"""
+    price, listing_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return (None if price is None else finite_float(price)), int(listing_id)
+
+
+def finite_float(value):
+    """float(value), raising ValueError for NaN and infinities as for non-numbers"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"Not a finite number: {value}")
+    return number
+
+
+def cached_json(compute):
+    """
+    Serve compute()'s JSON body through the query cache, keyed by the
+    request path and query string, with an ETag honouring If-None-Match.
+    """
+    store = get_store()
+    key = f"{request.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.args.items(multi=True)))}"
+    etag, body = query_cache.get_or_compute(key, store.version(), lambda: json.dumps(compute()))
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, status=200, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/listings', methods=['GET'])
+def listings():
+    """
+    Stored listings, cheapest first, a page at a time.
+    Query parameters (all optional):
+      site, property_type, available_from     exact match
+      min_price, max_price, min_size, max_size
+      bbox=min_lat,max_lat,min_lng,max_lng
+      limit (default 50, max 500), cursor (next_cursor of the previous page)
+      dedupe=1                                leave out duplicates of a listing on another site
+    """
+    args = request.args
     try:
-        if site == 'rightmove':
-            # Example command if using Scrapy (comment out if using requests+bs4)
-            # subprocess.run(["scrapy", "runspider", "scrapers/rightmove_scraper.py", "-o", "rightmove_data.csv"], check=True)
+        filters = {name: args.get(name, type=str) for name in ('site', 'property_type', 'available_from')}
+        filters['dedupe'] = args.get('dedupe') == '1'
+        for name in ('min_price', 'max_price', 'min_size', 'max_size'):
+            filters[name] = finite_float(args[name]) if name in args else None
+        if 'bbox' in args:
+            bbox = tuple(finite_float(value) for value in args['bbox'].split(','))
+            if len(bbox) != 4:
+                raise ValueError
+            filters['bbox'] = bbox
+        limit = min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Numeric filters, 'bbox' (4 numbers) and 'limit' must be valid numbers."}), 400
+    try:
+        after = decode_cursor(args['cursor']) if 'cursor' in args else None
+    except (ValueError, TypeError, binascii.Error):
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    def compute():
+        # One extra row tells us whether there is a next page
+        rows = get_store().query(**filters, after=after, limit=limit + 1)
+        page = rows[:limit]
+        for row in page:
+            row.pop('key', None)
+        return {
+            "listings": page,
+            "count": len(page),
+            "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None,
+        }
 
-            # Or call a Python function directly:
-            from scrapers.rightmove_scraper import scrape_rightmove
-            output_file = 'rightmove_data.csv'
-            scrape_rightmove(output_csv=output_file)
+    return cached_json(compute)
 
-            return jsonify({"message": f"Rightmove scraping complete -> {output_file}"}), 200
 
-        elif site == 'openrent':
-            # Example command if using Scrapy
-            # subprocess.run(["scrapy", "runspider", "scrapers/openrent_scraper.py", "-o", "openrent_data.csv"], check=True)
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Listing count and median monthly rent per group.
+    Query parameters (optional):
+      by=area,property_type   any of area (postcode district), property_type, site
+      site                    restrict to one site
+      dedupe=1                count a property listed several times once
+    """
+    by = tuple(field for field in request.args.get('by', 'area,property_type').split(',') if field)
+    if not by or any(field not in STATS_GROUPS for field in by):
+        return jsonify({"error": f"'by' must be a comma-separated subset of {', '.join(STATS_GROUPS)}"}), 400
+    site = request.args.get('site')
+    dedupe = request.args.get('dedupe') == '1'
+    return cached_json(lambda: {"by": list(by), "groups": get_store().rent_stats(by=by, site=site, dedupe=dedupe)})
 
-            # Or call a Python function directly:
-            from scrapers.openrent_scraper import scrape_openrent
-            output_file = 'openrent_data.csv'
-            scrape_openrent(output_csv=output_file)
 
-            return jsonify({"message": f"OpenRent scraping complete -> {output_file}"}), 200
+@app.route('/trends', methods=['GET'])
+def trends():
+    """
+    Rent and rent per sqm per group and week, from the incremental rollups.
+    Query parameters (optional):
+      by=week,area            any of week, area (postcode district), property_type, site
+      since, until            ISO dates, rounded out to whole weeks
+      site, area, property_type   restrict to one value
+      quantiles=0.25,0.5,0.75 quantiles to report besides count and mean (default median)
+    """
+    args = request.args
+    by = tuple(field for field in args.get('by', 'week,area').split(',') if field)
+    if not by or any(field not in ROLLUP_GROUPS for field in by):
+        return jsonify({"error": f"'by' must be a comma-separated subset of {', '.join(ROLLUP_GROUPS)}"}), 400
+    try:
+        quantiles = tuple(float(q) for q in args.get('quantiles', '0.5').split(','))
+        if not all(0 < q < 1 for q in quantiles):
+            raise ValueError
+        for name in ('since', 'until'):
+            if name in args:
+                date.fromisoformat(args[name])
+    except ValueError:
+        return jsonify({"error": "'quantiles' must be numbers between 0 and 1 and 'since'/'until' ISO dates"}), 400
+    filters = {name: args.get(name) for name in ('since', 'until', 'site', 'area', 'property_type')}
+    return cached_json(lambda: {"by": list(by),
+                                "groups": get_store().market_stats(by=by, quantiles=quantiles, **filters)})
 
-        elif site == 'all':
-            # Scrape both
-            from scrapers.rightmove_scraper import scrape_rightmove
-            from scrapers.openrent_scraper import scrape_openrent
 
-            rm_file = 'rightmove_data.csv'
-            or_file = 'openrent_data.csv'
-            scrape_rightmove(output_csv=rm_file)
-            scrape_openrent(output_csv=or_file)
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Scrape telemetry (latency histograms and counters) in the Prometheus text format"""
+    return Response(get_metrics().render_prometheus(), mimetype='text/plain; version=0.0.4')
 
-            return jsonify({
-                "message": "Scraping for both sites complete",
-                "files": [rm_file, or_file]
-            }), 200
-        else:
-            return jsonify({"error": "Invalid site specified"}), 400
 
-    except subprocess.CalledProcessError as e:
-        return jsonify({"error": str(e)}), 500
-    except Exception as ex:
-        return jsonify({"error": str(ex)}), 500
+@app.route('/metrics/runs', methods=['GET'])
+def run_reports():
+    """JSON reports of the most recently finished site scrapes, newest last"""
+    return jsonify({"runs": recent_reports()}), 200
 
 
 if __name__ == '__main__':
     # Run the Flask server in debug mode (for development)
     # Access the endpoint with POST requests at http://localhost:5000/scrape
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # The reloader would start a second process with its own job queue
+    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the scrapers. Run from the repository root, e.g.
+`python -m benchmarks.bench_parser`.
+"""
@@ -0,0 +1,76 @@
+"""
+Benchmark for cleaning a historical backfill of raw listing fields.
+
+Times clean_batch over a column-oriented backfill and checks it against
+the scalar data_cleaner helpers applied row by row. Raw values are
+sampled from formats seen on the sites, including weekly prices, prices
+quoting both pcm and pw, and mixed sq ft / sq m sizes.
+
+    python -m benchmarks.bench_cleaning [--rows 100000]
+"""
+
+import argparse
+import random
+import time
+
+from utils.batch_cleaner import DEPOSIT_MULTIPLIER, clean_batch
+from utils.data_cleaner import clean_address, clean_price, extract_size, normalize_postcode
+
+PRICES = ["£{:,} pcm", "£{:,} per month", "£{:,}", "£{:,} pcm (£{:,} pw)", "£{:,} pw", "£{:,} per week"]
+SIZES = ["{} sq m", "{:,} sq ft", "{:,} sq ft ({} sq m)", "", "Ask agent"]
+STREETS = ["Mare Street", "Camden Road", "Brixton Hill", "Fulham Palace Road", "Caledonian Road"]
+POSTCODES = ["E8 1EA", "NW1 9LT", "SW2 1RW", "SW6 6SP", "n7 6lj", ""]
+
+
+def raw_batch(rows, seed=0):
+    rng = random.Random(seed)
+    batch = {field: [] for field in ("address", "price", "size", "property_type", "available_from")}
+    for _ in range(rows):
+        sqm = rng.randint(25, 150)
+        weekly = rng.random() < 0.2
+        monthly = rng.randint(800, 5000)
+        batch["price"].append(rng.choice(PRICES[4:]).format(rng.randint(200, 900)) if weekly
+                              else rng.choice(PRICES[:4]).format(monthly, round(monthly * 12 / 52)))
+        batch["size"].append(rng.choice(SIZES).format(round(sqm * 10.764), sqm))
+        batch["address"].append(f"  {rng.choice(STREETS)},\n  London, {rng.choice(POSTCODES)} ")
+        batch["property_type"].append(f"{rng.randint(1, 4)} bedroom flat")
+        batch["available_from"].append("Available Now")
+    return batch
+
+
+def clean_rowwise(batch):
+    listings = []
+    for address, price, size, property_type, available_from in zip(
+            batch["address"], batch["price"], batch["size"],
+            batch["property_type"], batch["available_from"]):
+        monthly = clean_price(price)
+        listings.append({
+            "address": clean_address(address),
+            "monthly_price": monthly,
+            "size_sqm": extract_size(size),
+            "property_type": clean_address(property_type),
+            "available_from": clean_address(available_from),
+            "deposit": monthly * DEPOSIT_MULTIPLIER if monthly is not None else None,
+            "postcode": normalize_postcode(address),
+        })
+    return listings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    batch = raw_batch(args.rows)
+    rowwise = clean_rowwise(batch)
+
+    start = time.perf_counter()
+    columns = clean_batch(batch)
+    elapsed = time.perf_counter() - start
+
+    for field in ("monthly_price", "size_sqm", "deposit", "postcode", "address"):
+        assert columns[field] == [listing[field] for listing in rowwise], field
+    print(f"{args.rows} rows  {elapsed:.2f}s  {args.rows / elapsed:,.0f} rows/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark for results-page card parsing over the fixture corpus.
+
+"before" is the original approach: html.parser trees and every selector
+fallback tried in turn with select_one. "after" is the current
+parse_results_page (compiled SelectorPlans on an lxml tree when available).
+
+    python -m benchmarks.bench_parser [--repeat N]
+"""
+
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+from bs4 import BeautifulSoup
+
+from benchmarks.fixture_adapter import FIXTURE_DIR
+from scrapers.core import get_adapter, parse_results_page
+from utils.card_parser import HTML_PARSER
+
+
+def legacy_parse(html, card_selectors, field_plans):
+    """Original-style parse: html.parser, uncompiled fallbacks in fixed order"""
+    soup = BeautifulSoup(html, "html.parser")
+    cards = []
+    for selector in card_selectors:
+        cards = soup.select(selector)
+        if cards:
+            break
+    parsed = 0
+    for card in cards:
+        for plan in field_plans:
+            for selector in plan.selectors:
+                if card.select_one(selector):
+                    break
+        parsed += 1
+    return parsed
+
+
+def site_bench(name, page):
+    adapter = get_adapter(name)
+    return SimpleNamespace(
+        page=page,
+        parse=lambda response: parse_results_page(adapter, response),
+        cards=adapter.card_plan.selectors,
+        fields=list(adapter.field_plans.values()),
+    )
+
+
+SITES = {
+    'rightmove': site_bench('rightmove', 'rightmove/page_001.html'),
+    'openrent': site_bench('openrent', 'openrent/page_001.html'),
+}
+
+
+def cards_per_second(fn, repeat):
+    cards = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cards += fn()
+    return cards / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"tree builder: {HTML_PARSER}")
+    for name, site in SITES.items():
+        with open(os.path.join(FIXTURE_DIR, site.page), encoding='utf-8') as f:
+            response = SimpleNamespace(text=f.read())
+        before = cards_per_second(
+            lambda: legacy_parse(response.text, site.cards, site.fields), args.repeat)
+        after = cards_per_second(lambda: len(site.parse(response)), args.repeat)
+        print(f"{name:10s} before {before:8.0f} cards/s   after {after:8.0f} cards/s   "
+              f"x{after / before:.2f}")
+
+
+if __name__ == '__main__':
+    main()
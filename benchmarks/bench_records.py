@@ -0,0 +1,47 @@
+"""
+Benchmark for the memory of cleaned listings held in a long crawl.
+
+"before" keeps each cleaned listing as a dict; "after" keeps the
+Listing records clean_listing_batch produces. Both hold the same
+backfill of raw listings (see bench_cleaning); peak traced memory is
+compared.
+
+    python -m benchmarks.bench_records [--rows 100000]
+"""
+
+import argparse
+import tracemalloc
+
+from benchmarks.bench_cleaning import raw_batch
+from utils.batch_cleaner import clean_listing_batch
+
+
+def traced(build):
+    tracemalloc.start()
+    result = build()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    batch = raw_batch(args.rows)
+    batch["url"] = [f"https://example.com/properties/{n}" for n in range(args.rows)]
+
+    dicts, dict_bytes, dict_peak = traced(
+        lambda: [listing.to_dict() for listing in clean_listing_batch(batch)])
+    records, record_bytes, record_peak = traced(
+        lambda: clean_listing_batch(batch).listings())
+
+    assert [listing.to_dict() for listing in records] == dicts
+    print(f"{args.rows} listings  dicts {dict_bytes / 2**20:.1f} MiB (peak {dict_peak / 2**20:.1f})  "
+          f"records {record_bytes / 2**20:.1f} MiB (peak {record_peak / 2**20:.1f})  "
+          f"x{dict_bytes / record_bytes:.2f}")
+
+
+if __name__ == '__main__':
+    main()
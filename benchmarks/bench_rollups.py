@@ -0,0 +1,85 @@
+"""
+Benchmark for weekly rent reports over a year of stored listings.
+
+"before" rescans every observation, grouping by postcode district and
+week and taking exact medians; "after" is ListingStore.market_stats()
+over the incremental rollups. Medians are checked to agree within the
+sketches' relative accuracy.
+
+    python -m benchmarks.bench_rollups [--weeks 52] [--listings 2000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from utils.data_cleaner import extract_postcode_district
+from utils.listing_store import ListingStore
+from utils.rollups import DEFAULT_RELATIVE_ACCURACY, week_of
+
+DISTRICTS = ["E1", "E2", "E8", "N1", "N7", "NW1", "NW5", "SE1", "SE15", "SW2", "SW6", "W2", "W9", "WC1"]
+TYPES = ["Studio", "1 bedroom flat", "2 bedroom flat", "3 bedroom house"]
+
+
+def load(store, weeks, listings, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 6)
+    for week in range(weeks):
+        batch = []
+        for n in range(listings):
+            # Half of each week's listings were already up the week before
+            listing_id = week * listings // 2 + n
+            batch.append({
+                "url": f"https://example.com/properties/{listing_id}",
+                "address": f"{listing_id} High Street, London {DISTRICTS[listing_id % len(DISTRICTS)]} 1AA",
+                "monthly_price": float(rng.randint(900, 5000)),
+                "property_type": TYPES[listing_id % len(TYPES)],
+                "size_sqm": float(rng.randint(25, 120)) if rng.random() < 0.7 else None,
+            })
+        store.upsert("rightmove", batch, seen_at=start + timedelta(weeks=week, days=rng.randint(0, 6)))
+
+
+def rescan(store):
+    groups = defaultdict(list)
+    for row in store.iter_observations():
+        if row["monthly_price"] is not None:
+            groups[(week_of(row["scrape_date"]), extract_postcode_district(row["address"]))].append(
+                row["monthly_price"])
+    return {group: statistics.median_low(prices) for group, prices in groups.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--weeks', type=int, default=52)
+    parser.add_argument('--listings', type=int, default=2000, help='listings scraped per week')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = ListingStore(os.path.join(work_dir, "listings.db"))
+        start = time.perf_counter()
+        load(store, args.weeks, args.listings)
+        loaded = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exact = rescan(store)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        groups = store.market_stats(by=("week", "area"))
+        after = time.perf_counter() - start
+        store.close()
+
+    for group in groups:
+        true_median = exact[(group["week"], group["area"])]
+        assert abs(group["median_rent"] - true_median) <= 2 * DEFAULT_RELATIVE_ACCURACY * true_median, group
+    print(f"{args.weeks} weeks x {args.listings} listings (loaded in {loaded:.1f}s)  {len(groups)} groups  "
+          f"before {before * 1000:.0f}ms  after {after * 1000:.1f}ms  x{before / after:.0f}")
+
+
+if __name__ == '__main__':
+    main()
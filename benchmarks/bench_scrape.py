@@ -0,0 +1,110 @@
+"""
+End-to-end scrape benchmark against the offline fixture corpus.
+
+Runs a full scrape_rightmove / scrape_openrent with FixtureAdapter mounted
+in place of the network and reports pages/s, cards/s, parse time vs fetch
+time and peak RSS. Each site runs in its own process so RSS is per site.
+
+    python -m benchmarks.bench_scrape [--site rightmove|openrent|all]
+                                      [--concurrency 4] [--latency 0.05]
+                                      [--rpm 0] [--json]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.fixture_adapter import FixtureAdapter
+
+# No rate limit unless asked for: the benchmark measures our own overhead
+UNLIMITED_RPM = 10 ** 9
+
+
+def run_site(site, concurrency, latency, rpm):
+    from scrapers import core
+    from utils.host_scheduler import HostScheduler, RateLimiter
+    from utils.proxy_captcha_handler import ProxyCaptchaHandler
+
+    # Keep scrape_rightmove from opening a log file per run
+    logging.basicConfig(level=logging.WARNING)
+
+    site_adapter = core.get_adapter(site)
+    adapter = FixtureAdapter(latency=latency)
+    handler = ProxyCaptchaHandler('UNUSED')
+    # Overrides the site's own budget, which would otherwise be registered
+    budget = rpm or UNLIMITED_RPM
+    handler.scheduler = HostScheduler(RateLimiter(requests_per_minute=budget, host_rpm={site_adapter.host: budget}),
+                                      jitter=0, rate_headroom=1)
+    handler.mount('https://', adapter)
+
+    stats = {'parse_seconds': 0.0, 'cards': 0}
+    parse_results_page = core.parse_results_page
+
+    def timed_parse(site_adapter, response):
+        start = time.perf_counter()
+        listings = parse_results_page(site_adapter, response)
+        stats['parse_seconds'] += time.perf_counter() - start
+        stats['cards'] += len(listings)
+        return listings
+
+    core.parse_results_page = timed_parse
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, f'{site}.csv')
+        start = time.perf_counter()
+        core.scrape_site(site_adapter, output, concurrency=concurrency, max_listings=None,
+                         resume=False, handler=handler)
+        wall = time.perf_counter() - start
+
+    return {
+        'site': site,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 4),
+        'pages': adapter.requests,
+        'cards': stats['cards'],
+        'pages_per_second': round(adapter.requests / wall, 1),
+        'cards_per_second': round(stats['cards'] / wall, 1),
+        'parse_seconds': round(stats['parse_seconds'], 4),
+        # Summed across fetch threads, so it can exceed wall time
+        'fetch_seconds': round(adapter.fetch_seconds, 4),
+        # ru_maxrss is reported in KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--site', choices=['rightmove', 'openrent', 'all'], default='all')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='simulated round trip per request, in seconds')
+    parser.add_argument('--rpm', type=int, default=0,
+                        help='apply a RateLimiter budget (0 = unlimited)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    sites = ['rightmove', 'openrent'] if args.site == 'all' else [args.site]
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for site in sites:
+        # Fresh process per site so peak RSS is not shared between runs
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_site, (site, args.concurrency, args.latency, args.rpm)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['site']:10s} {r['pages']:4d} pages {r['cards']:5d} cards in {r['wall_seconds']:.2f}s  "
+              f"{r['pages_per_second']:7.1f} pages/s {r['cards_per_second']:8.1f} cards/s  "
+              f"parse {r['parse_seconds']:.2f}s fetch {r['fetch_seconds']:.2f}s  "
+              f"peak RSS {r['peak_rss_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark for startup and per-scrape setup costs.
+
+Cold start: wall time of fresh interpreters importing the Flask app, the
+scraping core, and running the CLI's --help (best of --runs), and
+whether the 2captcha client was imported along the way. Setup: building
+a ProxyCaptchaHandler and its first per-host session for every scrape
+(as each scrape used to) against reusing the shared default_handler().
+
+    python -m benchmarks.bench_startup [--runs 5] [--scrapes 200]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_STARTS = {
+    "import app": ["-c", "import sys, app; print('twocaptcha' in sys.modules)"],
+    "import scrapers.core": ["-c", "import sys, scrapers.core; print('twocaptcha' in sys.modules)"],
+    "python -m scrapers --help": ["-m", "scrapers", "--help"],
+}
+
+
+def cold_start(args, runs):
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    best, output = None, ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True,
+                                check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        output = result.stdout.strip()
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scrapes', type=int, default=200)
+    args = parser.parse_args()
+
+    for name, command in COLD_STARTS.items():
+        seconds, output = cold_start(command, args.runs)
+        twocaptcha = f"  twocaptcha imported: {output}" if output in ('True', 'False') else ''
+        print(f"{name:28s} {seconds * 1000:6.0f}ms{twocaptcha}")
+
+    from scrapers.core import default_handler
+    from utils.proxy_captcha_handler import ProxyCaptchaHandler
+
+    url = "https://www.rightmove.co.uk/property-to-rent/find.html"
+    start = time.perf_counter()
+    for _ in range(args.scrapes):
+        handler = ProxyCaptchaHandler('UNUSED')
+        handler.session_for(url)
+        handler.captcha_pool.close()
+    before = (time.perf_counter() - start) / args.scrapes
+
+    default_handler().session_for(url)
+    start = time.perf_counter()
+    for _ in range(args.scrapes):
+        default_handler().session_for(url)
+    after = (time.perf_counter() - start) / args.scrapes
+    print(f"setup per scrape            before {before * 1e6:.0f}us  after {after * 1e6:.1f}us  x{before / after:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+requests transport adapter that serves captured results pages from disk.
+
+Mount it on a requests.Session, or on a ProxyCaptchaHandler (which mounts
+it on every per-host session), to run the scrapers end to end without
+touching rightmove.co.uk or openrent.co.uk:
+
+    adapter = FixtureAdapter()
+    handler.mount('https://', adapter)
+
+Pages are looked up as fixtures/<site>/page_NNN.html; requests past the end
+of the corpus get fixtures/<site>/empty.html, like a real search that has
+run out of results.
+"""
+
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+RIGHTMOVE_PAGE_SIZE = 24
+
+
+def rightmove_page(query):
+    return int(query.get('index', ['0'])[0]) // RIGHTMOVE_PAGE_SIZE + 1
+
+
+def openrent_page(query):
+    return int(query.get('page', ['1'])[0])
+
+
+# host -> (fixture subdirectory, query -> 1-based page number)
+ROUTES = {
+    'www.rightmove.co.uk': ('rightmove', rightmove_page),
+    'www.openrent.co.uk': ('openrent', openrent_page),
+}
+
+
+class FixtureAdapter(BaseAdapter):
+    def __init__(self, fixture_dir=FIXTURE_DIR, latency=0.0):
+        """latency (seconds) is slept per request to mimic network round trips"""
+        super().__init__()
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.requests = 0
+        self.bytes = 0
+        self.fetch_seconds = 0.0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(request.url)
+        route = ROUTES.get(url.netloc)
+        if route is None:
+            body, status = b'', 404
+        else:
+            site, page_of = route
+            body, status = self._load(site, page_of(parse_qs(url.query))), 200
+
+        response = Response()
+        response.status_code = status
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict({'Content-Type': 'text/html; charset=utf-8'})
+        response.encoding = 'utf-8'
+        response._content = body
+        response.reason = 'OK' if status == 200 else 'Not Found'
+
+        with self._lock:
+            self.requests += 1
+            self.bytes += len(body)
+            self.fetch_seconds += time.perf_counter() - start
+        return response
+
+    def close(self):
+        pass
+
+    def _load(self, site, page):
+        path = os.path.join(self.fixture_dir, site, f'page_{page:03d}.html')
+        if not os.path.exists(path):
+            path = os.path.join(self.fixture_dir, site, 'empty.html')
+        if path not in self._cache:
+            with open(path, 'rb') as f:
+                self._cache[path] = f.read()
+        return self._cache[path]
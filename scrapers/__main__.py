@@ -0,0 +1,105 @@
+"""
+Command-line entry point for cron jobs and one-off scrapes.
+
+    python -m scrapers rightmove --max-listings 500 -o rightmove.jsonl.gz
+    python -m scrapers all --incremental --store-db listings.db --dedupe
+    python -m scrapers openrent --shards --processes 4
+
+Arguments are parsed before anything heavy is imported, so --help and
+mistakes come back at once. Sites run one after another in this process
+and share one handler (sessions, proxies, CAPTCHA tokens). The exit
+status is 1 if any site failed.
+"""
+
+import argparse
+import logging
+import os
+import pkgutil
+import sys
+
+
+def available_sites():
+    """Sites with a scrapers/<site>_scraper.py adapter module, found without importing them"""
+    return sorted(module.name[:-len('_scraper')]
+                  for module in pkgutil.iter_modules([os.path.dirname(__file__)])
+                  if module.name.endswith('_scraper'))
+
+
+def build_parser(sites):
+    parser = argparse.ArgumentParser(prog='python -m scrapers',
+                                     description='Scrape rental listings into CSV/JSONL files.')
+    parser.add_argument('sites', nargs='+', choices=[*sites, 'all'], metavar='site',
+                        help=f"one or more of {', '.join(sites)}, or all")
+    parser.add_argument('-o', '--output',
+                        help="output file (.csv, .jsonl, optionally .gz); may contain {site}. "
+                             "Defaults to each site's own file")
+    parser.add_argument('-n', '--max-listings', type=int, default=None,
+                        help='stop after this many listings per site (0 = no cap; default 1000)')
+    parser.add_argument('-c', '--concurrency', type=int, default=None, help='results pages in flight per site')
+    parser.add_argument('--incremental', action='store_true', help='write only new or changed listings')
+    parser.add_argument('--store-db', help='also upsert listings into this SQLite listing store')
+    parser.add_argument('--enrich', action='store_true', help='fill missing fields from detail pages')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='after scraping, mark listings of the same property across sites in --store-db')
+    parser.add_argument('--report-file', help="write the run's JSON telemetry report here; may contain {site}")
+    parser.add_argument('--run-id', help='checkpoint run id (default: today), to resume an interrupted run')
+    parser.add_argument('--no-resume', action='store_true', help='start afresh instead of resuming')
+    parser.add_argument('--shards', action='store_true', help='crawl in shards on a process pool')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes with --shards')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log debug messages')
+    return parser
+
+
+def main(argv=None):
+    sites = available_sites()
+    parser = build_parser(sites)
+    args = parser.parse_args(argv)
+    selected = sites if 'all' in args.sites else list(dict.fromkeys(args.sites))
+    if args.output and len(selected) > 1 and '{site}' not in args.output:
+        parser.error("--output needs a {site} placeholder when scraping several sites")
+    if args.dedupe and not args.store_db:
+        parser.error("--dedupe needs --store-db")
+    if args.shards and (args.incremental or args.enrich or args.no_resume or args.report_file):
+        parser.error("--shards cannot be combined with --incremental, --enrich, --no-resume or "
+                     "--report-file (start a sharded crawl afresh with a new --run-id)")
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from scrapers.core import MAX_LISTINGS, get_adapter, scrape_site
+    from utils.fetch_engine import DEFAULT_CONCURRENCY
+
+    max_listings = MAX_LISTINGS if args.max_listings is None else (args.max_listings or None)
+    concurrency = args.concurrency or DEFAULT_CONCURRENCY
+    failed = []
+    for site in selected:
+        output = args.output.format(site=site) if args.output else None
+        report_file = args.report_file.format(site=site) if args.report_file else None
+        try:
+            if args.shards:
+                from scrapers.shards import crawl_shards
+                written = crawl_shards(site, output, processes=args.processes, run_id=args.run_id,
+                                       concurrency=concurrency, max_listings_per_shard=max_listings,
+                                       store_db=args.store_db)
+            else:
+                written = scrape_site(get_adapter(site), output, concurrency=concurrency,
+                                      max_listings=max_listings, resume=not args.no_resume,
+                                      run_id=args.run_id, incremental=args.incremental,
+                                      store_db=args.store_db, enrich=args.enrich, report_file=report_file)
+        except Exception as e:
+            logging.exception(f"{site} scrape failed: {e}")
+            failed.append(site)
+            continue
+        print(f"{site}: {written} listings written to {output or get_adapter(site).default_output}")
+    if args.dedupe:
+        from utils.listing_store import ListingStore
+        store = ListingStore(args.store_db)
+        try:
+            print(f"{store.find_duplicates()} duplicate listings marked in {args.store_db}")
+        finally:
+            store.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,442 @@
+"""
+Shared scraping core: declarative site adapters and a single crawl loop.
+
+A SiteAdapter describes everything site-specific about a results crawl:
+how pages are addressed, which selectors find cards and fields, where the
+coordinates live and which fields a listing must have. Everything else
+(pooled per-host sessions, proxies, retries, rate limiting, the response
+cache, concurrent fetching, checkpoints, incremental filtering and output
+sinks) is shared, so adding a site means writing one adapter module.
+
+Adapters may also give detail_field_selectors for the listing's own page,
+which optional enrichment uses to fill in what the card left out.
+"""
+
+import copy
+import importlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from utils.card_parser import SelectorPlan, make_soup, select_first
+from utils.checkpoint import CheckpointStore, DEFAULT_CHECKPOINT_DB, default_run_id
+from utils.batch_cleaner import clean_listing_batch, RAW_FIELDS
+from utils.data_cleaner import get_request_headers
+from utils.enrichment import DetailEnricher, DEFAULT_ENRICH_WORKERS
+from utils.fetch_engine import PageFetchEngine, DEFAULT_CONCURRENCY
+from utils.listing_store import ListingStore, StoreSink, DEFAULT_STORE_DB
+from utils.proxy_captcha_handler import ProxyCaptchaHandler
+from utils.records import Listing
+from utils.seen_index import SeenIndex, IncrementalFilter, DEFAULT_INDEX_DB, DEFAULT_STOP_AFTER_SEEN_PAGES
+from utils.sinks import TeeSink, open_sink
+from utils.telemetry import RunReport, get_metrics
+
+MAX_LISTINGS = 1000
+
+FIELDS = ("address", "price", "property_type", "size", "url", "available_from")
+DETAIL_FIELDS = ("size", "available_from")
+
+COUNT_RE = re.compile(r'\d[\d,]*')
+
+# Detail pages embed coordinates in their page JSON (or map data attributes)
+DETAIL_LATITUDE_RE = re.compile(r'\b(?:latitude|lat)\b["\']?\s*[:=]\s*["\']?(-?\d{1,2}\.\d+)')
+DETAIL_LONGITUDE_RE = re.compile(r'\b(?:longitude|lng|lon)\b["\']?\s*[:=]\s*["\']?(-?\d{1,3}\.\d+)')
+
+
+def offset_pagination(param: str, page_size: int) -> Callable[[int], Dict]:
+    """Pages addressed by result offset, e.g. ?index=0,24,48"""
+    return lambda page: {param: (page - 1) * page_size}
+
+
+def page_number_pagination(param: str = 'page') -> Callable[[int], Dict]:
+    """Pages addressed by 1-based page number, e.g. ?page=1,2,3"""
+    return lambda page: {param: page}
+
+
+class SiteAdapter:
+    def __init__(self, name: str, base_url: str, pagination: Callable[[int], Dict],
+                 card_selectors: List[str], field_selectors: Dict[str, List[str]],
+                 url_prefix: str, base_params: Dict = None,
+                 coordinate_attrs: List[str] = None,
+                 latitude_attrs: List[str] = None, longitude_attrs: List[str] = None,
+                 required_fields=("address", "price"),
+                 newest_first_params: Dict = None,
+                 requests_per_minute: int = 20,
+                 max_requests_per_minute: int = None,
+                 default_output: str = None,
+                 detail_field_selectors: Dict[str, List[str]] = None,
+                 page_size: int = None, max_pages: int = None,
+                 result_count_selectors: List[str] = None,
+                 last_page_selectors: List[str] = None):
+        """
+        field_selectors maps each of FIELDS to its CSS selector fallbacks.
+        Coordinates come either from one "lat,lng" attribute
+        (coordinate_attrs) or from separate latitude/longitude attributes.
+        newest_first_params are added for incremental runs so results come
+        newest first. detail_field_selectors maps DETAIL_FIELDS to selector
+        fallbacks on the listing's detail page. requests_per_minute is the
+        site's starting rate; max_requests_per_minute, if set, lets the
+        scheduler raise it that far while the site keeps up.
+
+        The last results page is read from a results page, either from the
+        pagination's last page number (last_page_selectors, the last number
+        in the element, so "Page 2 of 5" reads 5) or from the
+        total result count (result_count_selectors) and page_size. A site
+        that stops paging after max_pages never goes past it.
+        """
+        self.name = name
+        self.base_url = base_url
+        self.host = urlparse(base_url).netloc
+        self.pagination = pagination
+        self.base_params = base_params or {}
+        self.url_prefix = url_prefix
+        self.coordinate_attrs = coordinate_attrs or []
+        self.latitude_attrs = latitude_attrs or []
+        self.longitude_attrs = longitude_attrs or []
+        self.required_fields = required_fields
+        self.newest_first_params = newest_first_params or {}
+        self.requests_per_minute = requests_per_minute
+        self.max_requests_per_minute = max_requests_per_minute
+        self.default_output = default_output or f'{name}_data.csv'
+        # Selector fallbacks are compiled once and reordered as the layout is learned
+        self.card_plan = SelectorPlan(card_selectors)
+        self.field_plans = {field: SelectorPlan(field_selectors.get(field, [])) for field in FIELDS}
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.result_count_plan = SelectorPlan(result_count_selectors or [])
+        self.last_page_plan = SelectorPlan(last_page_selectors or [])
+        detail_field_selectors = detail_field_selectors or {}
+        self.detail_plans = {field: SelectorPlan(detail_field_selectors.get(field, []))
+                             for field in DETAIL_FIELDS}
+
+    def with_params(self, params: Dict) -> 'SiteAdapter':
+        """The same site searched with extra query parameters (e.g. one crawl shard)"""
+        narrowed = copy.copy(self)
+        narrowed.base_params = {**self.base_params, **params}
+        return narrowed
+
+    def page_params(self, page: int, newest_first: bool = False) -> Dict:
+        params = dict(self.base_params)
+        if newest_first:
+            params.update(self.newest_first_params)
+        params.update(self.pagination(page))
+        return params
+
+    @property
+    def max_results(self) -> Optional[int]:
+        """Most results a single search can page through, if the site caps it"""
+        return self.max_pages * self.page_size if self.max_pages and self.page_size else None
+
+    @property
+    def knows_last_page(self) -> bool:
+        return bool(self.last_page_plan.selectors or (self.result_count_plan.selectors and self.page_size))
+
+    def result_count(self, soup) -> Optional[int]:
+        """Total results of the search, as stated on a results page"""
+        return _number(select_first(soup, self.result_count_plan))
+
+    def last_page(self, soup) -> Optional[int]:
+        """Number of the last results page, from a results page, capped at max_pages"""
+        last = None
+        if self.last_page_plan.selectors:
+            last = _number(select_first(soup, self.last_page_plan), last=True)
+        if last is None and self.page_size:
+            count = self.result_count(soup)
+            if count is not None:
+                last = max(1, -(-count // self.page_size))
+        if last is not None and self.max_pages:
+            last = min(last, self.max_pages)
+        return last
+
+    def coordinates(self, card):
+        for attr in self.coordinate_attrs:
+            if card.get(attr):
+                lat, lng = card[attr].split(',')
+                return float(lat), float(lng)
+        lat = next((card[attr] for attr in self.latitude_attrs if card.get(attr)), '0')
+        lng = next((card[attr] for attr in self.longitude_attrs if card.get(attr)), '0')
+        return float(lat), float(lng)
+
+
+def _number(element, last=False) -> Optional[int]:
+    matches = COUNT_RE.findall(element.text) if element is not None else []
+    return int(matches[-1 if last else 0].replace(',', '')) if matches else None
+
+
+def get_adapter(site: str) -> SiteAdapter:
+    """Adapter for a site, loaded from scrapers/<site>_scraper.py (its ADAPTER)"""
+    return importlib.import_module(f'scrapers.{site}_scraper').ADAPTER
+
+
+def extract_text(element, selectors):
+    """Try multiple selectors to extract text"""
+    found = select_first(element, selectors)
+    return found.text.strip() if found else None
+
+
+def extract_url(element, selectors, prefix):
+    """Extract listing URL with fallbacks"""
+    link = select_first(element, selectors)
+    if link and link.get('href'):
+        return f"{prefix}{link['href']}"
+    return None
+
+
+def extract_card(adapter: SiteAdapter, card) -> Optional[Dict]:
+    """Raw field text of one card, or None if essential fields are missing"""
+    plans = adapter.field_plans
+    raw = {
+        "address": extract_text(card, plans['address']),
+        "price": extract_text(card, plans['price']),
+        "url": extract_url(card, plans['url'], adapter.url_prefix),
+    }
+    if not all(raw.get(field) for field in adapter.required_fields):
+        return None
+    raw["property_type"] = extract_text(card, plans['property_type'])
+    raw["size"] = extract_text(card, plans['size'])
+    raw["available_from"] = extract_text(card, plans['available_from'])
+    raw["latitude"], raw["longitude"] = adapter.coordinates(card)
+    return raw
+
+
+def clean_page(adapter: SiteAdapter, raw_cards: List[Dict]) -> List[Listing]:
+    """Clean a page's raw cards as one batch, dropping those whose price does not parse"""
+    if not raw_cards:
+        return []
+    batch = clean_listing_batch({field: [raw[field] for raw in raw_cards] for field in RAW_FIELDS})
+    required = [{"price": "monthly_price"}.get(field, field) for field in adapter.required_fields]
+    return [listing for listing in batch if all(listing[field] for field in required)]
+
+
+def parse_card(adapter: SiteAdapter, card) -> Optional[Listing]:
+    """Extract a listing from one card, or None if essential fields are missing"""
+    raw = extract_card(adapter, card)
+    listings = clean_page(adapter, [raw]) if raw else []
+    return listings[0] if listings else None
+
+
+def parse_results_page(adapter: SiteAdapter, response) -> List[Listing]:
+    """
+    Parse every property card on a results page, cleaning the fields
+    page-wide. The page's tree is released as soon as the raw card text
+    is out of it.
+    """
+    metrics = get_metrics()
+    failed = cards = 0
+    with metrics.timer('scrape_stage_seconds', site=adapter.name, stage='parse'):
+        soup = make_soup(response.text)
+        raw_cards = []
+        for card in adapter.card_plan.select(soup):
+            cards += 1
+            try:
+                raw = extract_card(adapter, card)
+                if raw:
+                    raw_cards.append(raw)
+            except Exception as e:
+                failed += 1
+                logging.error(f"Error parsing {adapter.name} property card: {e}")
+        soup.decompose()
+    with metrics.timer('scrape_stage_seconds', site=adapter.name, stage='clean'):
+        listings = clean_page(adapter, raw_cards)
+    metrics.inc('scrape_cards_total', len(listings), site=adapter.name, outcome='parsed')
+    metrics.inc('scrape_cards_total', failed, site=adapter.name, outcome='failed')
+    metrics.inc('scrape_cards_total', cards - failed - len(listings), site=adapter.name, outcome='incomplete')
+    return listings
+
+
+def read_last_page(adapter: SiteAdapter, response) -> Optional[int]:
+    """Last results page of the search a results page belongs to, if it says"""
+    soup = make_soup(response.text)
+    last = adapter.last_page(soup)
+    soup.decompose()
+    return last
+
+
+def parse_detail_page(adapter: SiteAdapter, response) -> Dict:
+    """Cleaned size_sqm, available_from and coordinates found on a listing's detail page"""
+    soup = make_soup(response.text)
+    raw = {field: extract_text(soup, adapter.detail_plans[field]) for field in DETAIL_FIELDS}
+    soup.decompose()
+    latitude = DETAIL_LATITUDE_RE.search(response.text)
+    longitude = DETAIL_LONGITUDE_RE.search(response.text)
+    if latitude and longitude:
+        raw["latitude"], raw["longitude"] = latitude.group(1), longitude.group(1)
+    cleaned = next(iter(clean_listing_batch({field: [value] for field, value in raw.items()})))
+    return {field: cleaned[field] for field in ("size_sqm", "available_from", "latitude", "longitude")
+            if cleaned[field]}
+
+
+_shared_handler = None
+_shared_handler_lock = threading.Lock()
+
+
+def default_handler() -> ProxyCaptchaHandler:
+    """
+    Process-wide handler used by every scrape that is not given one, so
+    its per-host sessions (and their open connections), proxy health and
+    CAPTCHA tokens carry over from one scrape to the next. Set
+    TWOCAPTCHA_API_KEY for CAPTCHA solving and HTTP_CACHE_DIR to fetch
+    through the on-disk response cache.
+    """
+    global _shared_handler
+    with _shared_handler_lock:
+        if _shared_handler is None:
+            _shared_handler = ProxyCaptchaHandler(os.environ.get('TWOCAPTCHA_API_KEY', 'YOUR_2CAPTCHA_API_KEY'))
+        return _shared_handler
+
+
+def iter_listings(adapter: SiteAdapter, handler: ProxyCaptchaHandler = None,
+                  concurrency=DEFAULT_CONCURRENCY, max_listings=MAX_LISTINGS,
+                  checkpoint=None, progress=None, incremental=None):
+    """
+    Generator of parsed listings for a site, fetched page by page through
+    the handler's pooled session, proxies, host scheduler and cache.
+    incremental is an optional IncrementalFilter limiting output to new or
+    changed listings.
+    """
+    if handler is None:
+        handler = default_handler()
+    handler.scheduler.configure(adapter.host, adapter.requests_per_minute, adapter.max_requests_per_minute)
+    newest_first = incremental is not None
+
+    metrics = get_metrics()
+
+    def fetch_page(page):
+        try:
+            with metrics.timer('scrape_stage_seconds', site=adapter.name, stage='fetch'):
+                return handler.handle_request(
+                    adapter.base_url,
+                    params=adapter.page_params(page, newest_first),
+                    headers=get_request_headers()
+                )
+        except Exception:
+            metrics.inc('scrape_pages_total', site=adapter.name, outcome='failed')
+            raise
+
+    def parse_page(response):
+        listings = parse_results_page(adapter, response)
+        metrics.inc('scrape_pages_total', site=adapter.name, outcome='ok' if listings else 'empty')
+        return listings
+
+    page_count = (lambda response: read_last_page(adapter, response)) if adapter.knows_last_page else None
+    engine = PageFetchEngine(fetch_page, parse_page, concurrency=concurrency, progress=progress,
+                             page_count=page_count)
+    try:
+        for listing in engine.iter_listings(max_listings=max_listings, checkpoint=checkpoint,
+                                            incremental=incremental):
+            # Per-listing detail; run-level numbers are in the telemetry
+            logging.debug(f"Scraped {adapter.name} property: {listing['address']}")
+            yield listing
+    finally:
+        if engine.failed_pages:
+            logging.warning(f"{adapter.name} failed pages: {engine.failed_pages}")
+
+
+def scrape_site(adapter: SiteAdapter, output_csv=None, concurrency=DEFAULT_CONCURRENCY,
+                max_listings=MAX_LISTINGS, flush_every=100,
+                resume=True, run_id=None, checkpoint_db=DEFAULT_CHECKPOINT_DB,
+                handler=None, progress=None,
+                incremental=False, seen_index_db=DEFAULT_INDEX_DB,
+                stop_after_seen_pages=DEFAULT_STOP_AFTER_SEEN_PAGES,
+                store_db=None, enrich=False, enrich_workers=DEFAULT_ENRICH_WORKERS,
+                report_file=None, claim=None) -> int:
+    """
+    Scrape a site and stream its listings into output_csv, returning the
+    number written.
+
+    The output format follows the extension (.csv, .jsonl, optionally .gz).
+    Pass max_listings=None to crawl until the results run out. With resume
+    enabled an interrupted run (same run_id, by default the same day)
+    continues from its checkpoint and appends to output_csv.
+
+    With incremental enabled only listings that are new or changed since
+    earlier runs are written (output_csv is then the run's delta file),
+    and paging stops after stop_after_seen_pages pages with nothing new.
+    Incremental runs page newest first, so they keep a checkpoint of their
+    own (run_id + ":incremental") apart from full runs of the same day.
+
+    With store_db set, listings are also upserted into that ListingStore.
+    With enrich enabled, listings missing fields are also fetched from
+    their detail pages by enrich_workers threads sharing the handler (and
+    so its proxies and rate limit), and what they find is merged into the
+    store (the default one if store_db is unset) as it arrives; the output
+    file keeps the card fields. Listings unchanged since they were last
+    enriched are not fetched again.
+
+    Stage timings and counters go to the shared telemetry registry, and a
+    RunReport of the run is logged (and written to report_file if given).
+
+    claim(url), if given, decides whether a listing is written at all; a
+    sharded crawl uses it to write each listing from only one shard.
+    """
+    output_csv = output_csv or adapter.default_output
+    logging.info(f"Starting {adapter.name} scraping...")
+    metrics = get_metrics()
+    report = RunReport(adapter.name, adapter.host).start()
+    run_id = run_id or default_run_id()
+    if incremental:
+        run_id = f"{run_id}:incremental"
+    # SQLite stores opened for this run, closed when it ends however it ends
+    opened = []
+    enricher = None
+    completed = False
+    try:
+        checkpoint = None
+        if resume:
+            checkpoints = CheckpointStore(checkpoint_db)
+            opened.append(checkpoints)
+            checkpoint = checkpoints.open_run(adapter.name, run_id)
+        seen = None
+        if incremental:
+            index = SeenIndex(seen_index_db)
+            opened.append(index)
+            seen = IncrementalFilter(index, adapter.name, stop_after_seen_pages)
+
+        # A resumed run appends to what the interrupted one already wrote
+        append = checkpoint is not None and checkpoint.resuming
+        sink = open_sink(output_csv, flush_every=flush_every, append=append)
+        if enrich:
+            handler = handler or default_handler()
+            store_db = store_db or DEFAULT_STORE_DB
+        if store_db:
+            store = ListingStore(store_db)
+            opened.append(store)
+            if enrich:
+                enricher = DetailEnricher(
+                    lambda url: parse_detail_page(adapter, handler.handle_request(url, headers=get_request_headers())),
+                    lambda listing, fields: store.enrich(adapter.name, listing, fields),
+                    workers=enrich_workers
+                )
+            sink = TeeSink(sink, StoreSink(store, adapter.name, flush_every, enricher=enricher))
+        with sink:
+            if checkpoint is not None:
+                checkpoint.before_commit = sink.flush
+            for listing in iter_listings(
+                    adapter, handler=handler, concurrency=concurrency, max_listings=max_listings,
+                    checkpoint=checkpoint, progress=progress, incremental=seen):
+                if claim is not None and not claim(listing.get('url')):
+                    continue
+                with metrics.timer('scrape_stage_seconds', site=adapter.name, stage='write'):
+                    sink.write(listing)
+                metrics.inc('scrape_listings_written_total', site=adapter.name)
+            total = sink.count
+        completed = True
+    finally:
+        if enricher is not None:
+            # A failed crawl drops its queued detail fetches instead of waiting on them
+            enricher.close(wait=completed)
+            logging.info(f"{adapter.name} enrichment: {enricher.stats()}")
+        # After the enricher, whose workers write into the listing store
+        for db in opened:
+            db.close()
+
+    logging.info(f"Finished scraping {adapter.name}. {total} listings saved to {output_csv}")
+    logging.info(f"{adapter.name} run report: {json.dumps(report.finish(report_file))}")
+    if seen is not None:
+        logging.info(f"Incremental run: {seen.new} new, {seen.changed} changed, "
+                     f"{seen.unchanged} unchanged listings")
+    return total
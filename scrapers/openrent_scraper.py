@@ -1,130 +1,97 @@
-import requests
-from utils.data_cleaner import clean_price, clean_address, extract_size
-from bs4 import BeautifulSoup
-import csv
-import time
-from utils.data_cleaner import clean_price, clean_address, extract_size
+from scrapers.core import (SiteAdapter, page_number_pagination, iter_listings, scrape_site,
+                           parse_results_page as parse_site_page, MAX_LISTINGS)
+from scrapers.shards import ShardSpace
+from utils.fetch_engine import DEFAULT_CONCURRENCY
 
-def scrape_openrent(output_csv='openrent_data.csv'):
-    print("Starting OpenRent scraping...")
-    listings = []
-    page = 1
-    
-    base_url = "https://www.openrent.co.uk/properties-to-rent/london"
-    
-    while len(listings) < 1000:
-        response = requests.get(base_url, params={"page": page})
-        time.sleep(2)
-
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
-            # Use multiple selectors to find property cards
-            property_cards = (
-                soup.select("div.property") or 
-                soup.select("[data-listing]") or
-                soup.select(".listing-item")
-            )
-
-            for card in property_cards:
-                if len(listings) >= 1000:
-                    break
-
-                # Extract data with multiple fallback selectors
-                address = extract_text(card, [
-                    "div.location", 
-                    ".listing-address",
-                    "[data-address]"
-                ])
-                
-                price = extract_price(card, [
-                    "div.price strong",
-                    ".listing-price",
-                    "[data-price]"
-                ])
-                
-                property_type = extract_text(card, [
-                    "div.property-type",
-                    ".listing-type",
-                    "[data-property-type]"
-                ])
-                
-                size = extract_size_from_element(card, [
-                    "div.size",
-                    ".listing-size",
-                    "[data-size]"
-                ])
-                
-                # Get coordinates with fallbacks
-                lat = (
-                    card.get('data-latitude') or 
-                    card.get('data-lat') or 
-                    '0'
-                )
-                lng = (
-                    card.get('data-longitude') or 
-                    card.get('data-lng') or 
-                    '0'
-                )
-                
-                # Only add listing if we have essential data
-                if address and price:
-                    listings.append({
-                        "url": extract_url(card),
-                        "address": clean_address(address),
-                        "monthly_price": price,
-                        "property_type": property_type,
-                        "size_sqm": size,
-                        "latitude": float(lat),
-                        "longitude": float(lng),
-                        "deposit": price * 5 if price else None,
-                        "available_from": extract_text(card, [
-                            "div.available-date",
-                            ".listing-available-date",
-                            "[data-available-date]"
-                        ])
-                    })
+ADAPTER = SiteAdapter(
+    name='openrent',
+    base_url="https://www.openrent.co.uk/properties-to-rent/london",
+    pagination=page_number_pagination("page"),
+    card_selectors=[
+        "div.property",
+        "[data-listing]",
+        ".listing-item"
+    ],
+    field_selectors={
+        "address": [
+            "div.location",
+            ".listing-address",
+            "[data-address]"
+        ],
+        "price": [
+            "div.price strong",
+            ".listing-price",
+            "[data-price]"
+        ],
+        "property_type": [
+            "div.property-type",
+            ".listing-type",
+            "[data-property-type]"
+        ],
+        "size": [
+            "div.size",
+            ".listing-size",
+            "[data-size]"
+        ],
+        "url": [
+            "h2 a",
+            ".listing-title a",
+            "[data-listing-url]"
+        ],
+        "available_from": [
+            "div.available-date",
+            ".listing-available-date",
+            "[data-available-date]"
+        ],
+    },
+    url_prefix="https://www.openrent.co.uk",
+    # "Page 1 of N" in the pagination bar
+    last_page_selectors=["nav.pagination span.pagination-pageInfo"],
+    latitude_attrs=['data-latitude', 'data-lat'],
+    longitude_attrs=['data-longitude', 'data-lng'],
+    required_fields=("address", "price"),
+    # Replaces the old fixed 2s sleep between pages
+    requests_per_minute=30,
+    default_output='openrent_data.csv',
+    detail_field_selectors={
+        "size": [
+            "td.size",
+            ".property-size",
+            "[data-size]"
+        ],
+        "available_from": [
+            "td.available-from",
+            ".available-from",
+            "[data-available-date]"
+        ],
+    },
+)
 
-            page += 1
-        else:
-            print(f"Failed to retrieve page {page}. Status code: {response.status_code}")
-            break
+SHARD_SPACE = ShardSpace(
+    price_params=("prices_min", "prices_max"),
+    price_bands=[(0, 1000), (1000, 1500), (1500, 2000), (2000, 2500),
+                 (2500, 3000), (3000, 4000), (4000, 5000), (5000, 20000)],
+    property_types={
+        "studio": {"bedrooms_min": 0, "bedrooms_max": 0},
+        "1bed": {"bedrooms_min": 1, "bedrooms_max": 1},
+        "2bed": {"bedrooms_min": 2, "bedrooms_max": 2},
+        "3bed": {"bedrooms_min": 3, "bedrooms_max": 3},
+        "4bed": {"bedrooms_min": 4},
+    },
+)
 
-    fieldnames = ["url", "address", "monthly_price", "property_type", "size_sqm", 
-                 "latitude", "longitude", "deposit", "available_from"]
-    with open(output_csv, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(listings[:1000])
-
-    print(f"Finished scraping OpenRent. Results saved to {output_csv}")
-
-def extract_text(element, selectors):
-    """Try multiple selectors to extract text"""
-    for selector in selectors:
-        found = element.select_one(selector)
-        if found:
-            return found.text.strip()
-    return None
-
-def extract_price(element, selectors):
-    """Try multiple selectors to extract and clean price"""
-    price_text = extract_text(element, selectors)
-    return clean_price(price_text) if price_text else None
+def scrape_openrent(output_csv='openrent_data.csv', concurrency=DEFAULT_CONCURRENCY,
+                    max_listings=MAX_LISTINGS, **kwargs):
+    """Scrape OpenRent into output_csv; see scrapers.core.scrape_site for options"""
+    print("Starting OpenRent scraping...")
+    total = scrape_site(ADAPTER, output_csv, concurrency=concurrency, max_listings=max_listings, **kwargs)
+    print(f"Finished scraping OpenRent. {total} listings saved to {output_csv}")
+    return total
 
-def extract_size_from_element(element, selectors):
-    """Try multiple selectors to extract size"""
-    size_text = extract_text(element, selectors)
-    return extract_size(size_text) if size_text else None
+def iter_openrent_listings(concurrency=DEFAULT_CONCURRENCY, max_listings=MAX_LISTINGS, **kwargs):
+    """Generator of parsed OpenRent listings, fetched page by page"""
+    return iter_listings(ADAPTER, concurrency=concurrency, max_listings=max_listings, **kwargs)
 
-def extract_url(card):
-    """Extract listing URL with fallbacks"""
-    link = (
-        card.select_one('h2 a') or
-        card.select_one('.listing-title a') or
-        card.select_one('[data-listing-url]')
-    )
-    if link:
-        href = link.get('href')
-        if href:
-            return f"https://www.openrent.co.uk{href}"
-    return None
\ No newline at end of file
+def parse_results_page(response):
+    """Parse every property card on a results page"""
+    return parse_site_page(ADAPTER, response)
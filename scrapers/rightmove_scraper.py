@@ -1,183 +1,118 @@
-import requests
-from utils.data_cleaner import clean_price, clean_address, extract_size, get_random_user_agent, get_request_headers, random_delay
-from bs4 import BeautifulSoup
-import csv
-import time
-from utils.proxy_captcha_handler import ProxyCaptchaHandler
+from scrapers.core import (SiteAdapter, offset_pagination, iter_listings, scrape_site,
+                           parse_results_page as parse_site_page, parse_card, MAX_LISTINGS)
+from scrapers.shards import ShardSpace
+from utils.fetch_engine import DEFAULT_CONCURRENCY
 import logging
 from datetime import datetime
 
-def scrape_rightmove(output_csv='rightmove_data.csv'):
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        filename=f'rightmove_scraping_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
-    )
-    
-    logging.info("Starting Rightmove scraping...")
-    listings = []
-    failed_pages = []
-    
-    # Initialize handler with your 2captcha API key
-    handler = ProxyCaptchaHandler('YOUR_2CAPTCHA_API_KEY')
-    
-    base_url = "https://www.rightmove.co.uk/property-to-rent/find.html"
-    params = {
+RESULTS_PER_PAGE = 24
+# Rightmove will not page a search beyond this
+MAX_RESULTS_PAGES = 42
+
+ADAPTER = SiteAdapter(
+    name='rightmove',
+    base_url="https://www.rightmove.co.uk/property-to-rent/find.html",
+    base_params={
         "locationIdentifier": "REGION^93917",
         "propertyType": "flat",
         "maxPrice": 5000,
-        "index": 0
-    }
-
-    while len(listings) < 1000:
-        try:
-            response = handler.handle_request(
-                base_url,
-                params=params,
-                headers=get_request_headers()
-            )
-            
-            soup = BeautifulSoup(response.text, "html.parser")
-            property_cards = soup.select("div.propertyCard")
-            
-            if not property_cards:
-                logging.warning(f"No properties found on page {params['index']//24 + 1}")
-                failed_pages.append(params['index']//24 + 1)
-                params["index"] += 24
-                continue
-
-            for card in property_cards:
-                try:
-                    if len(listings) >= 1000:
-                        break
-
-                    listing = parse_property_card(card)
-                    if listing:
-                        listings.append(listing)
-                        logging.info(f"Scraped property: {listing['address']}")
-                except Exception as e:
-                    logging.error(f"Error parsing property card: {e}")
-                    continue
-
-            params["index"] += 24
-
-        except Exception as e:
-            logging.error(f"Error during scraping: {e}")
-            failed_pages.append(params['index']//24 + 1)
-            continue
-
-    # Save results
-    save_results(listings, output_csv)
-    
-    # Log summary
-    logging.info(f"Scraping completed. Total listings: {len(listings)}")
-    if failed_pages:
-        logging.warning(f"Failed pages: {failed_pages}")
-
-def parse_property_card(card):
-    """Extract data from a property card with multiple fallback selectors"""
-    try:
-        # Extract address with fallbacks
-        address = extract_text(card, [
+    },
+    pagination=offset_pagination("index", RESULTS_PER_PAGE),
+    card_selectors=["div.propertyCard"],
+    field_selectors={
+        "address": [
             "address.propertyCard-address",
             ".property-address",
             "[data-test='address']",
             "[itemprop='address']"
-        ])
-
-        # Extract price with fallbacks
-        price = extract_price(card, [
+        ],
+        "price": [
             "div.propertyCard-priceValue",
             ".property-price",
             "[data-test='price']",
             "[itemprop='price']"
-        ])
-
-        # Extract property type with fallbacks
-        property_type = extract_text(card, [
+        ],
+        "property_type": [
             "h2.propertyCard-title",
             ".property-type",
             "[data-test='property-type']"
-        ])
-
-        # Extract size with fallbacks
-        size = extract_size_from_element(card, [
+        ],
+        "size": [
             "div.propertyCard-size",
             ".property-size",
             "[data-test='size']"
-        ])
-
-        # Extract coordinates with fallbacks
-        coordinates = (
-            card.get('data-lat-lng') or
-            card.get('data-coordinates') or
-            '0,0'
-        ).split(',')
-
-        # Extract URL with fallbacks
-        url = extract_url(card, [
+        ],
+        "url": [
             "a.propertyCard-link",
             ".property-link",
             "[data-test='property-link']"
-        ])
-
-        # Only return listing if we have essential data
-        if address and price and url:
-            return {
-                "url": url,
-                "address": clean_address(address),
-                "monthly_price": price,
-                "property_type": property_type,
-                "size_sqm": size,
-                "latitude": float(coordinates[0]),
-                "longitude": float(coordinates[1]),
-                "deposit": price * 5 if price else None,
-                "available_from": extract_text(card, [
-                    "div.propertyCard-available",
-                    ".property-available",
-                    "[data-test='available-from']"
-                ])
-            }
-    except Exception as e:
-        logging.error(f"Error parsing property card: {e}")
-    return None
-
-def extract_url(card, selectors):
-    """Extract listing URL with fallbacks"""
-    for selector in selectors:
-        link = card.select_one(selector)
-        if link and link.get('href'):
-            return f"https://www.rightmove.co.uk{link['href']}"
-    return None
-
-def extract_text(element, selectors):
-    """Try multiple selectors to extract text"""
-    for selector in selectors:
-        found = element.select_one(selector)
-        if found:
-            return found.text.strip()
-    return None
+        ],
+        "available_from": [
+            "div.propertyCard-available",
+            ".property-available",
+            "[data-test='available-from']"
+        ],
+    },
+    url_prefix="https://www.rightmove.co.uk",
+    coordinate_attrs=['data-lat-lng', 'data-coordinates'],
+    required_fields=("address", "price", "url"),
+    # Newest listed first, so already-seen pages mean an incremental run is caught up
+    newest_first_params={"sortType": 6},
+    requests_per_minute=20,
+    default_output='rightmove_data.csv',
+    page_size=RESULTS_PER_PAGE,
+    max_pages=MAX_RESULTS_PAGES,
+    result_count_selectors=["span.searchHeader-resultCount", "[data-test='result-count']"],
+    detail_field_selectors={
+        "size": [
+            "[data-testid='info-reel-SIZE']",
+            ".property-size"
+        ],
+        "available_from": [
+            "[data-testid='letting-details'] dd",
+            ".property-available"
+        ],
+    },
+)
+
+# Add borough regions (their locationIdentifier) to split London further
+SHARD_SPACE = ShardSpace(
+    price_params=("minPrice", "maxPrice"),
+    price_bands=[(0, 1000), (1000, 1500), (1500, 2000), (2000, 2500),
+                 (2500, 3000), (3000, 4000), (4000, 5000)],
+    regions={"london": {"locationIdentifier": "REGION^93917"}},
+    property_types={
+        "studio": {"minBedrooms": 0, "maxBedrooms": 0},
+        "1bed": {"minBedrooms": 1, "maxBedrooms": 1},
+        "2bed": {"minBedrooms": 2, "maxBedrooms": 2},
+        "3bed": {"minBedrooms": 3, "maxBedrooms": 3},
+        "4bed": {"minBedrooms": 4},
+    },
+)
+
+def scrape_rightmove(output_csv='rightmove_data.csv', concurrency=DEFAULT_CONCURRENCY,
+                     max_listings=MAX_LISTINGS, **kwargs):
+    """Scrape Rightmove into output_csv; see scrapers.core.scrape_site for options"""
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filename=f'rightmove_scraping_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+    )
+    return scrape_site(ADAPTER, output_csv, concurrency=concurrency, max_listings=max_listings, **kwargs)
 
-def extract_price(element, selectors):
-    """Try multiple selectors to extract and clean price"""
-    price_text = extract_text(element, selectors)
-    return clean_price(price_text) if price_text else None
+def iter_rightmove_listings(concurrency=DEFAULT_CONCURRENCY, max_listings=MAX_LISTINGS, **kwargs):
+    """Generator of parsed Rightmove listings, fetched page by page"""
+    return iter_listings(ADAPTER, concurrency=concurrency, max_listings=max_listings, **kwargs)
 
-def extract_size_from_element(element, selectors):
-    """Try multiple selectors to extract size"""
-    size_text = extract_text(element, selectors)
-    return extract_size(size_text) if size_text else None
+def parse_results_page(response):
+    """Parse every property card on a results page"""
+    return parse_site_page(ADAPTER, response)
 
-def save_results(listings, output_csv):
-    """Save results to CSV file"""
-    fieldnames = ["url", "address", "monthly_price", "property_type", "size_sqm", 
-                 "latitude", "longitude", "deposit", "available_from"]
+def parse_property_card(card):
+    """Extract data from a property card with multiple fallback selectors"""
     try:
-        with open(output_csv, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(listings[:1000])
-        logging.info(f"Results saved to {output_csv}")
+        return parse_card(ADAPTER, card)
     except Exception as e:
-        logging.error(f"Error saving results: {e}")
\ No newline at end of file
+        logging.error(f"Error parsing property card: {e}")
+    return None
@@ -0,0 +1,263 @@
+"""
+Sharded crawling across a local process pool.
+
+A single search only pages so deep (Rightmove stops at 42 results
+pages), so one crawl of all of London misses listings and runs on a
+single cursor. A site's ShardSpace splits the search into shards of
+region x property type (bedrooms) x price band. plan_shards() can probe
+each shard's result count and halve the price band of any shard that
+is still over the site's results ceiling.
+
+crawl_shards() runs the shards on a process pool, each shard through
+scrape_site into its own file with its own checkpoint. All processes
+share the per-host rate limit (through RATE_LIMIT_STATE_FILE) and a
+SharedSeenSet, so a listing that several shards find is written once.
+The shard files are then merged into the output. A rerun with the same
+run_id skips finished shards and resumes the rest.
+"""
+
+import importlib
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+from scrapers.core import SiteAdapter, get_adapter, default_handler, scrape_site
+from utils.card_parser import make_soup
+from utils.checkpoint import CheckpointStore, default_run_id
+from utils.data_cleaner import get_request_headers
+from utils.fetch_engine import DEFAULT_CONCURRENCY
+from utils.seen_index import SharedSeenSet
+from utils.sinks import open_sink, read_listings
+
+# Bands narrower than this are not split further, however many results they have
+MIN_BAND_WIDTH = 50
+
+DONE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS finished_shards (
+    name TEXT PRIMARY KEY,
+    written INTEGER NOT NULL
+);
+"""
+
+
+class ShardSpace:
+    def __init__(self, price_params: Tuple[str, str], price_bands: List[Tuple[int, int]],
+                 regions: Dict[str, Dict] = None, property_types: Dict[str, Dict] = None):
+        """
+        price_params names the min and max price query parameters;
+        regions and property_types map a shard label to the query
+        parameters selecting it. Shards are split to fit under the
+        adapter's results ceiling (max_pages x page_size), using the
+        result count its result_count_selectors read.
+        """
+        self.price_params = price_params
+        self.price_bands = price_bands
+        self.regions = regions or {'all': {}}
+        self.property_types = property_types or {'all': {}}
+
+
+class Shard:
+    __slots__ = ('region', 'property_type', 'min_price', 'max_price', 'params', 'results')
+
+    def __init__(self, region: str, property_type: str, min_price: int, max_price: int, params: Dict):
+        self.region = region
+        self.property_type = property_type
+        self.min_price = min_price
+        self.max_price = max_price
+        self.params = params
+        # Result count found by probing, if any
+        self.results = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.region}-{self.property_type}-{self.min_price}-{self.max_price}"
+
+    def split(self, space: ShardSpace) -> List['Shard']:
+        """The two halves of this shard's price band"""
+        middle = (self.min_price + self.max_price) // 2
+        return [_shard(space, self.region, self.property_type, low, high)
+                for low, high in ((self.min_price, middle), (middle, self.max_price))]
+
+    def __repr__(self):
+        return f"Shard({self.name}, results={self.results})"
+
+
+def _shard(space: ShardSpace, region: str, property_type: str, min_price: int, max_price: int) -> Shard:
+    min_param, max_param = space.price_params
+    params = {**space.regions[region], **space.property_types[property_type],
+              min_param: min_price, max_param: max_price}
+    return Shard(region, property_type, min_price, max_price, params)
+
+
+def get_shard_space(site: str) -> ShardSpace:
+    """Shard space for a site, from scrapers/<site>_scraper.py (its SHARD_SPACE)"""
+    return importlib.import_module(f'scrapers.{site}_scraper').SHARD_SPACE
+
+
+def count_results(adapter: SiteAdapter, shard: Shard, handler) -> Optional[int]:
+    """Total results of a shard's search, read from its first results page"""
+    response = handler.handle_request(adapter.base_url,
+                                      params=adapter.with_params(shard.params).page_params(1),
+                                      headers=get_request_headers())
+    return adapter.result_count(make_soup(response.text))
+
+
+def plan_shards(site: str, probe: bool = True, handler=None) -> List[Shard]:
+    """
+    Shards covering a site's search space. With probe, each shard's result
+    count is fetched and shards over the results ceiling are split by
+    price until they fit (or the band is MIN_BAND_WIDTH wide).
+    """
+    adapter, space = get_adapter(site), get_shard_space(site)
+    pending = [_shard(space, region, property_type, low, high)
+               for region, property_type, (low, high)
+               in product(space.regions, space.property_types, space.price_bands)]
+    if not probe or not adapter.max_results or not adapter.result_count_plan.selectors:
+        return pending
+
+    handler = handler or default_handler()
+    handler.scheduler.configure(adapter.host, adapter.requests_per_minute, adapter.max_requests_per_minute)
+    shards = []
+    while pending:
+        shard = pending.pop()
+        try:
+            shard.results = count_results(adapter, shard, handler)
+        except Exception as e:
+            logging.warning(f"Could not probe {site} shard {shard.name}: {e}")
+        if (shard.results or 0) > adapter.max_results and shard.max_price - shard.min_price > MIN_BAND_WIDTH:
+            pending.extend(shard.split(space))
+        else:
+            shards.append(shard)
+    shards.sort(key=lambda s: (s.region, s.property_type, s.min_price))
+    logging.info(f"Planned {len(shards)} {site} shards")
+    return shards
+
+
+def _init_worker(rate_limit_state_file: str, log_level: int):
+    # Every worker process draws from the same per-host request budget
+    os.environ['RATE_LIMIT_STATE_FILE'] = rate_limit_state_file
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+
+
+def _crawl_shard(site: str, shard: Shard, output: str, seen_db: str, run_id: str,
+                 options: Dict) -> Tuple[int, bool]:
+    """
+    One shard's crawl, in a worker process. Returns the listings written
+    and whether the shard's checkpoint completed with no failed pages.
+    """
+    adapter = get_adapter(site).with_params(shard.params)
+    owner = f"{run_id}:{shard.name}"
+    seen = SharedSeenSet(seen_db)
+    try:
+        written = scrape_site(adapter, output, run_id=owner, claim=lambda url: seen.claim(url, owner),
+                              **options)
+    finally:
+        seen.close()
+    checkpoints = CheckpointStore(options['checkpoint_db'])
+    try:
+        return written, checkpoints.is_complete(adapter.name, owner)
+    finally:
+        checkpoints.close()
+
+
+def merge_outputs(paths: List[str], output: str, flush_every: int = 1000) -> int:
+    """Concatenate shard files into output, dropping any URL seen twice"""
+    urls = set()
+
+    def unique():
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            for listing in read_listings(path):
+                url = listing.get('url')
+                if url:
+                    if url in urls:
+                        continue
+                    urls.add(url)
+                yield listing
+
+    with open_sink(output, flush_every=flush_every) as sink:
+        return sink.write_all(unique())
+
+
+def crawl_shards(site: str, output: str = None, processes: int = None, shards: List[Shard] = None,
+                 probe: bool = True, run_id: str = None, work_dir: str = None,
+                 concurrency: int = DEFAULT_CONCURRENCY, max_listings_per_shard: int = None,
+                 store_db: str = None, keep_shard_files: bool = False) -> int:
+    """
+    Crawl a site shard by shard on a pool of processes (one per CPU by
+    default) and merge the shards into output, returning the number of
+    listings written. Shard files, checkpoints and the shared seen set
+    live in work_dir (output + ".shards" by default) and are removed once
+    every shard has finished, unless keep_shard_files.
+    """
+    adapter = get_adapter(site)
+    output = output or adapter.default_output
+    run_id = run_id or default_run_id()
+    work_dir = work_dir or f"{output}.shards"
+    os.makedirs(work_dir, exist_ok=True)
+    shards = shards if shards is not None else plan_shards(site, probe=probe)
+
+    base, ext = os.path.splitext(os.path.basename(output[:-3] if output.endswith('.gz') else output))
+    ext += '.gz' if output.endswith('.gz') else ''
+    shard_outputs = {shard.name: os.path.join(work_dir, f"{base}.{shard.name}{ext}") for shard in shards}
+    seen_db = os.path.join(work_dir, f"seen_{run_id}.db")
+    rate_limit_state_file = os.environ.get('RATE_LIMIT_STATE_FILE') or os.path.join(work_dir, 'rate_limit.json')
+    options = {
+        "concurrency": concurrency,
+        "max_listings": max_listings_per_shard,
+        "checkpoint_db": os.path.join(work_dir, 'checkpoints.db'),
+        "store_db": store_db,
+    }
+
+    # Schemas and the journal mode are set up here, before the workers open
+    # these files all at once: under WAL a write that started as a read can
+    # fail as locked at once, without waiting out the busy timeout
+    SharedSeenSet(seen_db).close()
+    CheckpointStore(options['checkpoint_db']).close()
+    done_conn = sqlite3.connect(seen_db, timeout=60, isolation_level='IMMEDIATE')
+    done_conn.executescript(DONE_SCHEMA)
+    finished = {name for (name,) in done_conn.execute("SELECT name FROM finished_shards")}
+    todo = [shard for shard in shards if shard.name not in finished]
+    if finished:
+        logging.info(f"{len(finished)} {site} shards already finished in run {run_id}")
+
+    failed = []
+    # Spawned rather than forked: workers start clean, without this process's
+    # threads, connections or already-built rate limiter
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker,
+                             initargs=(rate_limit_state_file, logging.getLogger().getEffectiveLevel())) as pool:
+        futures = {pool.submit(_crawl_shard, site, shard, shard_outputs[shard.name], seen_db, run_id, options): shard
+                   for shard in todo}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                written, completed = future.result()
+            except Exception as e:
+                logging.error(f"{site} shard {shard.name} failed: {e}")
+                failed.append(shard.name)
+                continue
+            if not completed:
+                # Left unfinished so a rerun resumes its checkpoint and retries the failed pages
+                logging.warning(f"{site} shard {shard.name}: {written} listings, with failed pages")
+                failed.append(shard.name)
+                continue
+            with done_conn:
+                done_conn.execute("INSERT OR REPLACE INTO finished_shards VALUES (?, ?)", (shard.name, written))
+            logging.info(f"{site} shard {shard.name}: {written} listings")
+    done_conn.close()
+
+    total = merge_outputs([shard_outputs[shard.name] for shard in shards], output)
+    logging.info(f"Merged {len(shards)} {site} shards into {output}: {total} listings")
+    if failed:
+        logging.warning(f"{len(failed)} {site} shards failed and will resume on a rerun "
+                        f"with run_id {run_id}: {failed}")
+    elif not keep_shard_files:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return total
@@ -0,0 +1,50 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+from utils.listing_store import ListingStore
+from utils.query_cache import QueryCache
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'STORE_DB', str(tmp_path / 'store.db'))
+    monkeypatch.setattr(app_module, '_store', None)
+    monkeypatch.setattr(app_module, 'query_cache', QueryCache())
+    return app_module.app.test_client()
+
+
+def listing(number, price):
+    return {'url': f'https://www.rightmove.co.uk/properties/{number}', 'monthly_price': price,
+            'address': f'{number} Mare Street, London E8 1EA', 'property_type': 'flat'}
+
+
+def test_listings_pages_through_listings_without_a_price(client):
+    store = ListingStore(app_module.STORE_DB)
+    store.upsert('rightmove', [listing(1, None), listing(2, 1500.0), listing(3, None), listing(4, 1200.0)],
+                 seen_at=datetime(2026, 10, 12))
+
+    urls, cursor = [], None
+    while True:
+        response = client.get('/listings', query_string={'limit': 1, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        urls.extend(row['url'] for row in response.json['listings'])
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+    assert [url.rsplit('/', 1)[1] for url in urls] == ['1', '3', '4', '2']
+
+
+@pytest.mark.parametrize('query', [{'min_price': 'nan'}, {'max_size': 'inf'}, {'bbox': '51.5,51.6,nan,0.1'},
+                                   {'cursor': base64.urlsafe_b64encode(b'[NaN, 1]').decode()}])
+def test_listings_rejects_non_finite_numbers(client, query):
+    assert client.get('/listings', query_string=query).status_code == 400
+
+
+@pytest.mark.parametrize('body', [{'site': 1}, {'site': None}, {'site': ['rightmove']}, ['rightmove'], {}])
+def test_scrape_rejects_a_missing_or_non_string_site(client, body):
+    response = client.post('/scrape', json=body)
+    assert response.status_code == 400
+    assert 'site' in response.json['error']
@@ -0,0 +1,83 @@
+from urllib.parse import parse_qs, urlparse
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+
+from utils.host_scheduler import HostScheduler, RateLimiter
+from utils.proxy_captcha_handler import CaptchaSolverPool, FakeSolver, ProxyCaptchaHandler, ProxyRotator
+
+HOST = 'www.example.com'
+URL = f'https://{HOST}/search'
+CHALLENGE = b'<html><div class="g-recaptcha" data-sitekey="site-key"></div>captcha</html>'
+
+
+class ChallengeAdapter(BaseAdapter):
+    """Answers 403 with a reCAPTCHA challenge unless the request carries an accepted token"""
+
+    def __init__(self, rejected=()):
+        super().__init__()
+        self.rejected = set(rejected)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        token = parse_qs(urlparse(request.url).query).get('g-recaptcha-response', [None])[0]
+        self.requests.append(token)
+        response = Response()
+        response.url = request.url
+        response.request = request
+        if token is None or token in self.rejected:
+            response.status_code, response._content = 403, CHALLENGE
+        else:
+            response.status_code, response._content = 200, b'<html>results</html>'
+        return response
+
+    def close(self):
+        pass
+
+
+def challenged_handler(adapter, solver):
+    handler = ProxyCaptchaHandler('test-key', cache=None, solver=solver)
+    handler.scheduler = HostScheduler(RateLimiter(host_rpm={HOST: 10 ** 6}), jitter=0)
+    handler.proxy_rotator = ProxyRotator([{'host': 'gw.example', 'port': '8000',
+                                           'username': 'alice', 'password': 'pw'}])
+    handler.mount('https://', adapter)
+    return handler
+
+
+def test_challenge_is_solved_once_and_its_token_reused():
+    adapter, solver = ChallengeAdapter(), FakeSolver()
+    handler = challenged_handler(adapter, solver)
+
+    assert handler.handle_request(URL, params={'page': 1}).status_code == 200
+    assert solver.solved == 1
+    assert adapter.requests == [None, 'fake-token-1']
+
+    # The next page is challenged too, but the proxy's token is still good
+    assert handler.handle_request(URL, params={'page': 2}).status_code == 200
+    assert solver.solved == 1
+    assert adapter.requests[2:] == [None, 'fake-token-1']
+
+
+def test_rejected_token_is_invalidated_and_solved_afresh():
+    adapter, solver = ChallengeAdapter(rejected={'fake-token-1'}), FakeSolver()
+    handler = challenged_handler(adapter, solver)
+
+    assert handler.handle_request(URL).status_code == 200
+    assert solver.solved == 2
+    assert adapter.requests == [None, 'fake-token-1', 'fake-token-2']
+    assert handler.captcha_pool.token(HOST, 'alice@gw.example:8000') == 'fake-token-2'
+
+
+def test_tokens_are_kept_per_host_and_proxy():
+    solver = FakeSolver()
+    pool = CaptchaSolverPool(solver)
+    try:
+        token = pool.solve('site-key', URL, 'alice@gw.example:8000').result(timeout=5)
+        assert pool.token(HOST, 'alice@gw.example:8000') == token
+        # Same gateway, another account: another exit IP, so no shared token
+        assert pool.token(HOST, 'bob@gw.example:8000') is None
+        assert pool.solve('site-key', URL, 'bob@gw.example:8000').result(timeout=5) != token
+        assert pool.token('www.other.example', 'alice@gw.example:8000') is None
+        assert solver.solved == 2
+    finally:
+        pool.close()
@@ -0,0 +1,31 @@
+from utils.checkpoint import CheckpointStore
+from utils.fetch_engine import PageFetchEngine
+
+
+def parse(page):
+    return [{'url': f'https://example.com/{page}/{n}'} for n in range(2)] if page else []
+
+
+def crawl(db, fetch):
+    checkpoint = CheckpointStore(db).open_run('site', 'run')
+    listings = list(PageFetchEngine(fetch, parse, concurrency=2).iter_listings(checkpoint=checkpoint))
+    return listings, checkpoint
+
+
+def test_failed_page_that_comes_back_empty_is_cleared(tmp_path):
+    db = str(tmp_path / 'checkpoints.db')
+
+    def first(page):
+        if page == 3:
+            raise IOError('down')
+        return page if page <= 6 else None
+
+    listings, checkpoint = crawl(db, first)
+    assert len(listings) == 10 and checkpoint.failed_pages == {3}
+    assert not CheckpointStore(db).is_complete('site', 'run')
+
+    # By the resume page 3 has emptied out and two more pages have appeared
+    listings, checkpoint = crawl(db, lambda page: None if page == 3 else (page if page <= 8 else None))
+    assert {listing['url'].split('/')[3] for listing in listings} == {'7', '8'}
+    assert checkpoint.failed_pages == set()
+    assert CheckpointStore(db).is_complete('site', 'run')
@@ -0,0 +1,52 @@
+import pytest
+
+from utils.batch_cleaner import clean_batch
+from utils.data_cleaner import clean_price, extract_size
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("£1,200 pcm", 1200.0),
+    ("£1,200", 1200.0),
+    ("£300 pw", 1300.0),
+    ("£300pw", 1300.0),
+    ("£350 per week", 1516.67),
+    ("£1,500 per calendar month", 1500.0),
+    # Both periods quoted: the monthly figure is used as it is
+    ("£2,000.50 pcm (£461 pw)", 2000.5),
+    ("£461 pw (£2,000 pcm)", 2000.0),
+    # A bare first figure is not made weekly by a pw figure after it
+    ("£2,000 (£461 pw)", 2000.0),
+    ("Weekly rent: £300", 1300.0),
+    ("POA", None),
+    ("", None),
+    (None, None),
+])
+def test_clean_price(text, expected):
+    assert clean_price(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("83 sq m", 83.0),
+    ("1,200 sq ft (111 sq m)", 111.0),
+    ("1,200 sq ft", 111.48),
+    ("646 sq. ft.", 60.02),
+    ("75", 75.0),
+    ("Ask agent", None),
+    (None, None),
+])
+def test_extract_size(text, expected):
+    assert extract_size(text) == expected
+
+
+def test_clean_batch_matches_scalar_helpers():
+    prices = ["£2,000.50 pcm (£461 pw)", "£300 pw", None, "£1,200"]
+    sizes = ["1,200 sq ft (111 sq m)", "646 sq ft", "", None]
+    columns = clean_batch({"price": prices, "size": sizes,
+                           "address": ["  1 Mare Street,\n London e8 1ea ", None, "Flat 2", "N1"]})
+    assert columns["monthly_price"] == [clean_price(text) for text in prices]
+    assert columns["monthly_price"][0] == 2000.5
+    assert columns["size_sqm"] == [extract_size(text) for text in sizes]
+    assert columns["deposit"] == [10002.5, 6500.0, None, 6000.0]
+    assert columns["address"][0] == "1 Mare Street, London e8 1ea"
+    assert columns["postcode"] == ["E8 1EA", None, None, None]
+    assert columns["latitude"] == [0.0] * 4
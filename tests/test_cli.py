@@ -0,0 +1,91 @@
+import pytest
+
+from scrapers import core, shards
+from scrapers.__main__ import available_sites, main
+from scrapers.core import MAX_LISTINGS
+
+
+class Scrapes:
+    """Stands in for scrape_site and crawl_shards, recording (site, output, options) per call"""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = set()
+
+    def scrape_site(self, adapter, output, **options):
+        self.calls.append((adapter.name, output, options))
+        if adapter.name in self.failing:
+            raise RuntimeError("blocked")
+        return 10
+
+    def crawl_shards(self, site, output, **options):
+        self.calls.append((site, output, {'shards': True, **options}))
+        return 20
+
+
+@pytest.fixture
+def scrapes(monkeypatch):
+    recorded = Scrapes()
+    monkeypatch.setattr(core, 'scrape_site', recorded.scrape_site)
+    monkeypatch.setattr(shards, 'crawl_shards', recorded.crawl_shards)
+    return recorded
+
+
+def test_sites_are_found_from_the_adapter_modules():
+    assert available_sites() == ['openrent', 'rightmove']
+
+
+@pytest.mark.parametrize('argv', [
+    ['zoopla'],
+    ['all', '-o', 'out.csv'],
+    ['rightmove', '--dedupe'],
+    ['rightmove', '--shards', '--incremental'],
+    ['rightmove', '--shards', '--no-resume'],
+    ['rightmove', '--max-listings', 'many'],
+])
+def test_invalid_arguments_exit_with_a_usage_error(argv, scrapes, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+    assert exit_info.value.code == 2
+    assert 'usage:' in capsys.readouterr().err
+    assert scrapes.calls == []
+
+
+def test_options_reach_each_selected_site(scrapes, capsys):
+    assert main(['all', '-o', '{site}.jsonl', '-n', '0', '-c', '8', '--incremental', '--no-resume',
+                 '--report-file', 'reports/{site}.json']) == 0
+    assert [(site, output) for site, output, _ in scrapes.calls] == [('openrent', 'openrent.jsonl'),
+                                                                    ('rightmove', 'rightmove.jsonl')]
+    options = scrapes.calls[1][2]
+    # --max-listings 0 lifts the cap
+    assert (options['max_listings'], options['concurrency']) == (None, 8)
+    assert (options['incremental'], options['resume']) == (True, False)
+    assert options['report_file'] == 'reports/rightmove.json'
+    assert 'rightmove: 10 listings written to rightmove.jsonl' in capsys.readouterr().out
+
+
+def test_defaults_and_repeated_sites(scrapes):
+    assert main(['rightmove', 'rightmove']) == 0
+    [(site, output, options)] = scrapes.calls
+    assert (site, output) == ('rightmove', None)
+    assert (options['max_listings'], options['resume'], options['incremental']) == (MAX_LISTINGS, True, False)
+
+
+def test_a_failed_site_fails_the_run_after_the_others_finish(scrapes):
+    scrapes.failing = {'openrent'}
+    assert main(['openrent', 'rightmove']) == 1
+    assert [site for site, _, _ in scrapes.calls] == ['openrent', 'rightmove']
+
+
+def test_shards_option_crawls_on_the_process_pool(scrapes):
+    assert main(['rightmove', '--shards', '--processes', '3', '--run-id', 'r1']) == 0
+    [(site, _, options)] = scrapes.calls
+    assert site == 'rightmove'
+    assert (options.get('shards'), options['processes'], options['run_id']) == (True, 3, 'r1')
+
+
+def test_dedupe_marks_duplicates_in_the_store_after_scraping(scrapes, tmp_path, capsys):
+    store_db = str(tmp_path / 'store.db')
+    assert main(['rightmove', '--store-db', store_db, '--dedupe']) == 0
+    assert scrapes.calls[0][2]['store_db'] == store_db
+    assert f"0 duplicate listings marked in {store_db}" in capsys.readouterr().out
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from utils.dedup import deduplicate
+from utils.listing_store import ListingStore
+
+FLAT = {'address': 'Flat 3, 12 Mare Street, London E8 1EA', 'monthly_price': 2000.0,
+        'property_type': '2 bedroom flat', 'latitude': 51.5412, 'longitude': -0.0551}
+
+
+def relisted():
+    """One flat on both sites (abbreviated address, slightly different price) and one other"""
+    return {
+        'rightmove': [{**FLAT, 'url': 'https://www.rightmove.co.uk/properties/1', 'size_sqm': 60.0},
+                      {**FLAT, 'url': 'https://www.rightmove.co.uk/properties/2',
+                       'address': '40 Amhurst Road, London E8 2AH', 'monthly_price': 1500.0}],
+        'openrent': [{**FLAT, 'url': 'https://www.openrent.co.uk/property/9',
+                      'address': 'Flat 3, 12 Mare St, London E8 1EA', 'monthly_price': 2050.0}],
+    }
+
+
+def test_deduplicate_keeps_the_most_complete_listing():
+    listings = [listing for site in relisted().values() for listing in site]
+    kept = deduplicate(listings)
+    assert [listing['url'] for listing in kept] == ['https://www.rightmove.co.uk/properties/1',
+                                                     'https://www.rightmove.co.uk/properties/2']
+    assert kept[0]['duplicate_ids'] == ['https://www.openrent.co.uk/property/9']
+
+
+def test_store_counts_each_property_once_when_deduped(tmp_path):
+    store = ListingStore(str(tmp_path / 'store.db'))
+    for site, listings in relisted().items():
+        store.upsert(site, listings, seen_at=datetime(2026, 10, 12))
+    assert store.find_duplicates() == 1
+
+    assert len(store.query()) == 3
+    assert [row['url'] for row in store.query(dedupe=True)] == ['https://www.rightmove.co.uk/properties/2',
+                                                                'https://www.rightmove.co.uk/properties/1']
+    assert sum(group['count'] for group in store.rent_stats(by=('area',), dedupe=True)) == 2
+
+    # Rerunning replaces the recorded duplicates rather than adding to them
+    assert store.find_duplicates() == 1
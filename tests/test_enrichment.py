@@ -0,0 +1,94 @@
+import threading
+
+from utils.enrichment import DetailEnricher
+
+COMPLETE = {'size_sqm': 60.0, 'available_from': '01/12/2026', 'latitude': 51.54, 'longitude': -0.05}
+
+
+class Details:
+    """Detail pages by URL; the first fetch waits for the gate so later offers queue up"""
+
+    def __init__(self, failing=()):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.failing = set(failing)
+        self.fetched = []
+        self.results = {}
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        if not self.started.is_set():
+            self.started.set()
+            assert self.gate.wait(5)
+        if url in self.failing:
+            raise ConnectionError("detail page timed out")
+        return {'size_sqm': 50.0}
+
+    def merge(self, listing, fields):
+        self.results[listing['url']] = fields
+
+
+def listing(url, **fields):
+    return {'url': url, 'monthly_price': 1500.0, **fields}
+
+
+def enricher(details, **kwargs):
+    """A one-worker pool already busy on a listing called 'first'"""
+    pool = DetailEnricher(details.fetch, details.merge, workers=1, **kwargs)
+    pool.offer(listing('first'))
+    assert details.started.wait(5)
+    return pool
+
+
+def test_listings_missing_most_fields_are_fetched_first_new_before_known():
+    details = Details()
+    pool = enricher(details)
+    pool.offer(listing('one-missing', size_sqm=None, **{k: v for k, v in COMPLETE.items() if k != 'size_sqm'}))
+    pool.offer(listing('known'), stored={'url': 'known', 'monthly_price': 1400.0})
+    pool.offer(listing('new'))
+    details.gate.set()
+    pool.close()
+    assert details.fetched == ['first', 'new', 'known', 'one-missing']
+    assert details.results['one-missing'] == {'size_sqm': 50.0}
+    assert pool.stats() == {"enriched": 4, "failed": 0, "dropped": 0, "skipped": 0, "pending": 0}
+
+
+def test_listings_with_nothing_to_gain_are_skipped():
+    details = Details()
+    pool = enricher(details)
+    enriched_before = {'monthly_price': 1500.0, 'enriched_at': '2026-10-11T09:00:00'}
+    assert not pool.offer(listing('complete', **COMPLETE))
+    assert not pool.offer({'monthly_price': 1500.0})
+    assert not pool.offer(listing('unchanged'), stored=enriched_before)
+    # A new price is worth another look
+    assert pool.offer(listing('repriced', monthly_price=1600.0), stored=enriched_before)
+    details.gate.set()
+    pool.close()
+    assert details.fetched == ['first', 'repriced']
+    assert pool.stats()['skipped'] == 3
+
+
+def test_full_queue_drops_the_least_useful_listing():
+    details = Details()
+    pool = enricher(details, max_pending=2)
+    pool.offer(listing('known'), stored={'url': 'known'})
+    pool.offer(listing('new-1'))
+    # Full: the known listing goes to make room for a new one...
+    assert pool.offer(listing('new-2'))
+    # ...and another known one is not let in at all
+    assert not pool.offer(listing('known-2'), stored={'url': 'known-2'})
+    details.gate.set()
+    pool.close()
+    assert details.fetched == ['first', 'new-1', 'new-2']
+    assert pool.stats()['dropped'] == 2
+
+
+def test_failures_are_counted_and_close_without_wait_discards_the_queue():
+    details = Details(failing={'first'})
+    pool = enricher(details)
+    pool.offer(listing('queued'))
+    # The busy fetch finishes only after close has discarded the queue
+    threading.Timer(0.1, details.gate.set).start()
+    pool.close(wait=False)
+    assert details.fetched == ['first']
+    assert pool.stats() == {"enriched": 0, "failed": 1, "dropped": 1, "skipped": 0, "pending": 0}
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from utils.fetch_engine import PageFetchEngine
+
+
+class Site:
+    """Results pages of two listings each up to last_page, counting fetches in flight"""
+
+    def __init__(self, last_page=20, delay=0.01):
+        self.last_page = last_page
+        self.delay = delay
+        self.fetched = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, page):
+        with self._lock:
+            self.fetched.append(page)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            self.wait(page)
+            if page > self.last_page:
+                return []
+            return [{'url': f'https://example.com/{page}/{n}'} for n in range(2)]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def wait(self, page):
+        time.sleep(self.delay)
+
+    def page_count(self, response):
+        return self.last_page
+
+
+def crawl(site, **kwargs):
+    engine = PageFetchEngine(site.fetch, lambda listings: listings, **kwargs)
+    return engine, [page for page, _ in engine.iter_pages()]
+
+
+def test_pages_are_fetched_concurrently_up_to_the_limit_and_yielded_in_order():
+    site = Site()
+    _, pages = crawl(site, concurrency=4)
+    assert pages == list(range(1, 21))
+    assert site.peak == 4
+
+
+def test_first_page_is_probed_alone_and_nothing_past_the_last_page_is_fetched():
+    site = Site(last_page=5)
+    probe_alone = []
+
+    def wait(page):
+        time.sleep(site.delay)
+        if page == 1:
+            probe_alone.append(site.in_flight == 1)
+    site.wait = wait
+    engine, pages = crawl(site, concurrency=4, page_count=site.page_count)
+    assert pages == [1, 2, 3, 4, 5]
+    assert engine.last_page == 5
+    assert sorted(site.fetched) == [1, 2, 3, 4, 5]
+    assert probe_alone == [True]
+
+
+def test_a_slow_page_holds_up_only_its_own_slot():
+    site = Site(last_page=10)
+    later_pages_done = threading.Event()
+
+    def wait(page):
+        if page == 2:
+            # Released only once later pages got fetched around the stuck one
+            assert later_pages_done.wait(5)
+        elif page == 6:
+            later_pages_done.set()
+    site.wait = wait
+    _, pages = crawl(site, concurrency=4)
+    assert pages == list(range(1, 11))
+
+
+def test_crawl_stops_at_the_first_empty_page():
+    site = Site(last_page=3)
+    _, pages = crawl(site, concurrency=2)
+    assert pages == [1, 2, 3]
+
+
+def test_crawl_gives_up_after_consecutive_failures():
+    failed = []
+
+    def fetch(page):
+        raise ConnectionError("proxy down")
+    engine = PageFetchEngine(fetch, lambda listings: listings, concurrency=2,
+                             max_consecutive_failures=3, on_page_failed=failed.append)
+    assert list(engine.iter_pages()) == []
+    assert failed == engine.failed_pages == [1, 2, 3]
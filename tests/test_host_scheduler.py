@@ -0,0 +1,67 @@
+import json
+import time
+
+import pytest
+
+from utils.host_scheduler import OK, HostScheduler, RateLimiter, fcntl
+
+
+def clean_responses(scheduler, host, n=1000):
+    for _ in range(n):
+        scheduler.record(host, OK)
+    return scheduler.stats(host)['rpm']
+
+
+def test_configured_rate_is_the_ceiling_by_default():
+    scheduler = HostScheduler(RateLimiter())
+    scheduler.configure('a.example', 30)
+    assert clean_responses(scheduler, 'a.example') == 30
+
+
+def test_site_can_opt_into_a_higher_rate():
+    scheduler = HostScheduler(RateLimiter())
+    scheduler.configure('b.example', 30, 45)
+    assert clean_responses(scheduler, 'b.example') == 45
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_host_rate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    limiter = RateLimiter(requests_per_minute=60, burst=3)
+    assert [limiter.reserve('a.example') for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Past the burst each token is borrowed from the future, one second apart at 60 rpm
+    assert limiter.reserve('a.example') == 1.0
+    assert limiter.reserve('a.example') == 2.0
+    assert limiter.reserve('b.example') == 0.0
+
+    clock.now += 5.0
+    assert limiter.reserve('a.example') == 0.0
+    # A long idle spell refills no more than the burst
+    clock.now += 100.0
+    assert [limiter.reserve('a.example') for _ in range(4)] == [0.0, 0.0, 0.0, 1.0]
+
+
+@pytest.mark.skipif(fcntl is None, reason="needs fcntl file locks")
+def test_limiters_sharing_a_state_file_draw_from_one_budget(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    state_file = str(tmp_path / 'rate.json')
+    first = RateLimiter(requests_per_minute=60, state_file=state_file)
+    second = RateLimiter(requests_per_minute=60, state_file=state_file)
+
+    assert first.reserve('a.example') == 0.0
+    assert second.reserve('a.example') == 1.0
+    assert first.reserve('a.example') == 2.0
+    assert second.reserve('b.example') == 0.0
+    assert set(json.loads(open(state_file).read())) == {'a.example', 'b.example'}
+
+    clock.now += 3.0
+    assert second.reserve('a.example') == 0.0
@@ -0,0 +1,66 @@
+import pytest
+
+from benchmarks.fixture_adapter import FixtureAdapter
+from scrapers.core import get_adapter, scrape_site
+from utils.checkpoint import CheckpointStore
+from utils.listing_store import ListingStore
+from utils.proxy_captcha_handler import ProxyCaptchaHandler
+from utils.seen_index import SeenIndex
+
+
+def fixture_handler(adapter):
+    handler = ProxyCaptchaHandler('test-key', cache=None)
+    handler.mount('https://', FixtureAdapter())
+    handler.rate_limiter.host_rpm[adapter.host] = 10 ** 6
+    return handler
+
+
+def test_incremental_run_does_not_resume_a_full_runs_checkpoint(tmp_path):
+    adapter = get_adapter('rightmove')
+    checkpoint_db = str(tmp_path / 'checkpoints.db')
+    # A full run of the same day, interrupted after page 3
+    full = CheckpointStore(checkpoint_db).open_run(adapter.name, '20261018')
+    for page in (1, 2, 3):
+        full.page_done(page, [f'https://www.rightmove.co.uk/properties/full-{page}'])
+
+    written = scrape_site(adapter, str(tmp_path / 'delta.csv'), handler=fixture_handler(adapter),
+                          run_id='20261018', checkpoint_db=checkpoint_db, incremental=True,
+                          seen_index_db=str(tmp_path / 'seen.db'), max_listings=None)
+    assert written == 120
+
+    # The full run's checkpoint is left for it to resume
+    resumed = CheckpointStore(checkpoint_db).open_run(adapter.name, '20261018')
+    assert (resumed.last_page, resumed.emitted_count) == (3, 3)
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_run_closes_the_stores_it_opened(tmp_path, monkeypatch, fail):
+    closed = []
+
+    def record_close(store_class):
+        close = store_class.close
+
+        def recording_close(self):
+            closed.append(store_class.__name__)
+            close(self)
+        monkeypatch.setattr(store_class, 'close', recording_close)
+
+    for store_class in (CheckpointStore, SeenIndex, ListingStore):
+        record_close(store_class)
+
+    def claim(url):
+        if fail:
+            raise RuntimeError("claim failed")
+        return True
+
+    adapter = get_adapter('rightmove')
+    run = lambda: scrape_site(adapter, str(tmp_path / 'out.csv'), handler=fixture_handler(adapter),
+                              checkpoint_db=str(tmp_path / 'checkpoints.db'), incremental=True,
+                              seen_index_db=str(tmp_path / 'seen.db'), store_db=str(tmp_path / 'store.db'),
+                              max_listings=None, claim=claim)
+    if fail:
+        with pytest.raises(RuntimeError):
+            run()
+    else:
+        assert run() == 120
+    assert sorted(closed) == ['CheckpointStore', 'ListingStore', 'SeenIndex']
@@ -0,0 +1,89 @@
+import threading
+
+from utils.jobs import JobQueue
+
+
+class Scrape:
+    """A site scrape that reports one page and then waits until released"""
+
+    def __init__(self, error=None):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.error = error
+        self.runs = 0
+
+    def __call__(self, progress):
+        self.runs += 1
+        self.started.set()
+        assert self.release.wait(5)
+        progress.page_done(1, 25)
+        if self.error:
+            raise self.error
+
+
+def wait(job):
+    for task in job.tasks:
+        task.future.exception(timeout=5)
+
+
+def test_job_runs_through_queued_running_and_succeeded():
+    queue = JobQueue(max_workers=1)
+    first, second = Scrape(), Scrape()
+    job, created = queue.submit('first', {'rightmove': ('rightmove.csv', first)})
+    queued, _ = queue.submit('second', {'openrent': ('openrent.csv', second)})
+    assert created
+    assert first.started.wait(5)
+    assert (job.status, queued.status) == ('running', 'queued')
+
+    first.release.set()
+    second.release.set()
+    wait(job)
+    wait(queued)
+    assert (job.status, queued.status) == ('succeeded', 'succeeded')
+    site = job.as_dict()['sites'][0]
+    assert site['progress'] == {'pages': 1, 'listings': 25, 'failures': 0}
+    assert site['started_at'] and site['finished_at']
+    assert [job.id for job in queue.list()] == [job.id, queued.id]
+    assert queue.get(job.id) is job
+
+
+def test_failed_scrape_fails_its_job_with_the_error():
+    queue = JobQueue()
+    scrape = Scrape(error=RuntimeError("blocked by the site"))
+    scrape.release.set()
+    job, _ = queue.submit('key', {'rightmove': ('rightmove.csv', scrape)})
+    wait(job)
+    assert job.status == 'failed'
+    assert job.as_dict()['sites'][0]['error'] == "blocked by the site"
+
+
+def test_identical_request_in_flight_gets_the_existing_job():
+    queue = JobQueue()
+    scrape = Scrape()
+    job, created = queue.submit('key', {'rightmove': ('rightmove.csv', scrape)})
+    duplicate, duplicate_created = queue.submit('key', {'rightmove': ('rightmove.csv', scrape)})
+    assert created and not duplicate_created
+    assert duplicate is job
+
+    scrape.release.set()
+    wait(job)
+    # Once it has finished the same request starts a new job
+    rerun, created = queue.submit('key', {'rightmove': ('rightmove.csv', scrape)})
+    assert created and rerun is not job
+    wait(rerun)
+    assert scrape.runs == 2
+
+
+def test_jobs_writing_the_same_file_share_its_task():
+    queue = JobQueue()
+    rightmove, openrent = Scrape(), Scrape()
+    job, _ = queue.submit('rightmove', {'rightmove': ('rightmove.csv', rightmove)})
+    both, created = queue.submit('all', {'rightmove': ('rightmove.csv', rightmove),
+                                         'openrent': ('openrent.csv', openrent)})
+    assert created
+    assert both.tasks[0] is job.tasks[0]
+
+    rightmove.release.set()
+    openrent.release.set()
+    wait(both)
+    assert (rightmove.runs, openrent.runs) == (1, 1)
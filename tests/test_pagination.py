@@ -0,0 +1,23 @@
+import os
+
+from benchmarks.fixture_adapter import FIXTURE_DIR
+from scrapers.core import get_adapter
+from utils.card_parser import make_soup
+
+
+def fixture_soup(site, name):
+    with open(os.path.join(FIXTURE_DIR, site, name), encoding='utf-8') as f:
+        return make_soup(f.read())
+
+
+def test_openrent_reads_last_page_from_pagination_marker():
+    adapter = get_adapter('openrent')
+    assert adapter.knows_last_page
+    assert adapter.last_page(fixture_soup('openrent', 'page_001.html')) == 5
+    assert adapter.last_page(fixture_soup('openrent', 'page_003.html')) == 5
+
+
+def test_rightmove_reads_last_page_from_result_count():
+    adapter = get_adapter('rightmove')
+    assert adapter.knows_last_page
+    assert adapter.last_page(fixture_soup('rightmove', 'page_001.html')) == 5
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from utils.proxy_captcha_handler import ProxyRotator
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def pool(*users):
+    return [{'host': 'gw.example', 'port': '8000', 'username': user, 'password': 'pw'} for user in users]
+
+
+def user_of(rotator, proxy):
+    return rotator.key_of(proxy).split('@')[0]
+
+
+def test_proxies_on_one_gateway_get_their_own_keys():
+    rotator = ProxyRotator(pool('alice', 'bob'))
+    first, second = rotator.get_proxy(), rotator.get_proxy()
+    assert {rotator.key_of(first), rotator.key_of(second)} == {'alice@gw.example:8000', 'bob@gw.example:8000'}
+    # Metrics still group by gateway, without credentials
+    assert rotator.proxy_label(first) == rotator.proxy_label(second) == 'gw.example:8000'
+
+
+def test_fastest_proxy_is_picked_first_and_load_spreads_requests():
+    proxies = pool('slow', 'fast', 'medium')
+    rotator = ProxyRotator(proxies)
+    for proxy, latency in zip(proxies, (2.0, 0.1, 0.5)):
+        rotator.mark_proxy_success(proxy, latency)
+
+    assert user_of(rotator, rotator.get_proxy()) == 'fast'
+    # With a request in flight the fast proxy costs twice as much, so the next one goes elsewhere
+    assert user_of(rotator, rotator.get_proxy()) == 'medium'
+
+
+def test_failing_proxy_drops_behind_a_healthy_one():
+    proxies = pool('flaky', 'steady')
+    rotator = ProxyRotator(proxies)
+    rotator.mark_proxy_failure(proxies[0])
+    assert user_of(rotator, rotator.get_proxy()) == 'steady'
+
+
+def test_proxy_cools_down_after_repeated_failures_and_rejoins_later(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    proxies = pool('flaky', 'steady')
+    rotator = ProxyRotator(proxies)
+    for _ in range(rotator.max_failures):
+        rotator.mark_proxy_failure(proxies[0])
+
+    # Cooling down, it is neither picked nor honoured as a preference
+    assert {user_of(rotator, rotator.get_proxy()) for _ in range(5)} == {'steady'}
+    assert user_of(rotator, rotator.get_proxy(prefer=proxies[0])) == 'steady'
+    for _ in range(rotator.max_failures):
+        rotator.mark_proxy_failure(proxies[1])
+    with pytest.raises(Exception, match="No working proxies"):
+        rotator.get_proxy()
+
+    clock.now += rotator.cooldown_minutes * 60
+    assert user_of(rotator, rotator.get_proxy(prefer=proxies[0])) == 'flaky'
+    assert 'flaky' in {user_of(rotator, rotator.get_proxy()) for _ in range(4)}
@@ -0,0 +1,113 @@
+import hashlib
+import os
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utils import response_cache
+from utils.response_cache import CacheMiss, ResponseCache
+
+URL = 'https://www.example.com/search'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    return clock
+
+
+def response(status=200, body=b'', **headers):
+    result = requests.Response()
+    result.status_code = status
+    result._content = body
+    result.encoding = 'utf-8'
+    result.headers = CaseInsensitiveDict({'Content-Type': 'text/html', **headers})
+    return result
+
+
+def cache_key(page):
+    return hashlib.sha256(response_cache.normalize_url(URL, {'page': page}).encode('utf-8')).hexdigest()
+
+
+class Origin:
+    """send() callable for ResponseCache.fetch, recording the validators of each request"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def __call__(self, validators):
+        self.sent.append(validators)
+        return self.responses.pop(0)
+
+
+def test_fresh_entries_are_served_until_the_ttl_passes(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    origin = Origin(response(body=b'v1'), response(body=b'v2'))
+
+    assert cache.fetch(URL, {'page': 1}, origin).content == b'v1'
+    clock.now += 59
+    assert cache.fetch(URL, {'page': 1}, origin).content == b'v1'
+    assert len(origin.sent) == 1 and cache.hits == 1
+
+    clock.now += 2
+    assert cache.fetch(URL, {'page': 1}, origin).content == b'v2'
+    assert len(origin.sent) == 2
+
+
+def test_stale_entry_revalidated_with_a_304_serves_the_stored_body(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    origin = Origin(response(body=b'results', ETag='"abc"', **{'Last-Modified': 'Sat, 17 Oct 2026 10:00:00 GMT'}),
+                    response(status=304))
+    cache.fetch(URL, {'page': 1}, origin)
+    clock.now += 120
+
+    revalidated = cache.fetch(URL, {'page': 1}, origin)
+    assert origin.sent[1] == {'If-None-Match': '"abc"', 'If-Modified-Since': 'Sat, 17 Oct 2026 10:00:00 GMT'}
+    assert (revalidated.status_code, revalidated.content) == (200, b'results')
+    assert revalidated.from_cache and cache.revalidated == 1
+
+    # The 304 made the entry fresh again
+    clock.now += 30
+    assert cache.fetch(URL, {'page': 1}, origin).content == b'results'
+    assert len(origin.sent) == 2
+
+
+def test_replay_mode_raises_cache_miss_instead_of_fetching(tmp_path, clock):
+    ResponseCache(str(tmp_path)).fetch(URL, {'page': 1}, Origin(response(body=b'page 1')))
+    replay = ResponseCache(str(tmp_path), ttl=0, replay=True)
+    origin = Origin()
+
+    # Replay serves even stale entries
+    assert replay.fetch(URL, {'page': 1}, origin).content == b'page 1'
+    with pytest.raises(CacheMiss):
+        replay.fetch(URL, {'page': 2}, origin)
+    assert origin.sent == []
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_cap(tmp_path, clock):
+    # Random bytes do not compress, so each entry is a little over 1 KiB on disk
+    bodies = {page: os.urandom(1024) for page in (1, 2, 3)}
+    cache = ResponseCache(str(tmp_path), max_bytes=2600)
+    for page in (1, 2):
+        cache.fetch(URL, {'page': page}, Origin(response(body=bodies[page])))
+        clock.now += 1
+    # Page 1 is used again, so page 2 is now the least recently used
+    cache.fetch(URL, {'page': 1}, Origin())
+    clock.now += 1
+    cache.fetch(URL, {'page': 3}, Origin(response(body=bodies[3])))
+
+    cached = {page for page in (1, 2, 3)
+              if cache._meta(cache_key(page)) is not None and os.path.exists(cache._path(cache_key(page)))}
+    assert cached == {1, 3}
+    assert cache._total_bytes <= cache.max_bytes
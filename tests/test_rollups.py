@@ -0,0 +1,77 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from utils.listing_store import ListingStore
+from utils.rollups import RentRollups
+
+MONDAY = datetime(2026, 10, 12, 9)
+
+
+def listing(n, size_sqm=None):
+    return {'url': f'https://example.com/{n}', 'address': f'{n} Mare Street, London E8 1EA',
+            'monthly_price': 2000.0, 'property_type': 'flat', 'size_sqm': size_sqm}
+
+
+def week_stats(store):
+    [stats] = store.market_stats(by=('week',))
+    return stats
+
+
+def test_size_from_enrichment_reaches_the_weeks_per_sqm(tmp_path):
+    store = ListingStore(str(tmp_path / 'store.db'))
+    store.upsert('site', [listing(1), listing(2, size_sqm=40.0)], seen_at=MONDAY)
+    assert week_stats(store)['sized_count'] == 1
+
+    store.rollups.add_size('https://example.com/1', 50.0, MONDAY)
+    stats = week_stats(store)
+    assert (stats['count'], stats['sized_count'], stats['mean_rent_per_sqm']) == (2, 2, 45.0)
+
+    # Counted once: a second size, or a re-scrape with the size, changes nothing
+    store.rollups.add_size('https://example.com/1', 50.0, MONDAY)
+    store.upsert('site', [listing(1, size_sqm=50.0)], seen_at=MONDAY + timedelta(days=1))
+    assert week_stats(store)['sized_count'] == 2
+
+
+def test_enrich_adds_the_stored_size(tmp_path):
+    store = ListingStore(str(tmp_path / 'store.db'))
+    store.upsert('site', [listing(1)], seen_at=datetime.now())
+    store.enrich('site', listing(1), {'size_sqm': 50.0})
+    assert week_stats(store)['sized_count'] == 1
+
+
+def test_weeks_ingested_out_of_order_count_each_listing_once(tmp_path):
+    store = ListingStore(str(tmp_path / 'store.db'))
+    store.upsert('site', [listing(1), listing(2)], seen_at=MONDAY)
+    store.upsert('site', [listing(1)], seen_at=MONDAY + timedelta(days=7))
+    # A late batch for the earlier week
+    store.upsert('site', [listing(1), listing(2)], seen_at=MONDAY + timedelta(days=2))
+    counts = {row['week']: row['count'] for row in store.market_stats(by=('week',))}
+    assert counts == {'2026-10-12': 2, '2026-10-19': 1}
+
+
+def test_closed_weeks_are_pruned_and_not_added_to(tmp_path):
+    store = ListingStore(str(tmp_path / 'store.db'))
+    store.upsert('site', [listing(1)], seen_at=MONDAY)
+    later = MONDAY + timedelta(weeks=store.rollups.open_weeks + 1)
+    store.upsert('site', [listing(1)], seen_at=later)
+    weeks = store._conn.execute("SELECT DISTINCT week FROM rolled_up").fetchall()
+    assert [week for (week,) in weeks] == [later.date().isoformat()]
+
+    # Its membership is gone, so a late batch for it would be double counted
+    assert store.rollups.add('site', [('https://example.com/1', listing(1))], MONDAY) == 0
+    counts = {row['week']: row['count'] for row in store.market_stats(by=('week',))}
+    assert counts[MONDAY.date().isoformat()] == 1
+    # A rebuild still counts every observation once
+    assert store.rebuild_rollups() == 2
+
+
+def test_old_rolled_up_table_is_migrated(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'old.db'))
+    conn.execute("CREATE TABLE rolled_up (key TEXT NOT NULL, week TEXT NOT NULL, "
+                 "PRIMARY KEY (key, week)) WITHOUT ROWID")
+    conn.execute("INSERT INTO rolled_up VALUES ('https://example.com/1', '2026-10-12')")
+    rollups = RentRollups(conn)
+    # Its rows have no cell, so a late size is ignored rather than misfiled
+    rollups.add_size('https://example.com/1', 50.0, MONDAY)
+    assert rollups.is_empty()
+    assert rollups.add('site', [('https://example.com/2', listing(2, size_sqm=40.0))], MONDAY) == 1
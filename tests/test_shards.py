@@ -0,0 +1,72 @@
+import csv
+import multiprocessing
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fixture_adapter import FixtureAdapter
+from scrapers import core, shards
+from scrapers.core import get_adapter
+from utils.proxy_captcha_handler import ProxyCaptchaHandler
+
+
+def fixture_handler():
+    handler = ProxyCaptchaHandler('test-key', cache=None)
+    handler.mount('https://', FixtureAdapter())
+    handler.rate_limiter.host_rpm[get_adapter('rightmove').host] = 10 ** 6
+    return handler
+
+
+@pytest.fixture
+def forked_fixture_pool(monkeypatch):
+    """Shard workers forked from the test process, so they see the fixture handler"""
+    monkeypatch.setattr(core, 'default_handler', fixture_handler)
+    monkeypatch.setattr(shards, 'multiprocessing',
+                        SimpleNamespace(get_context=lambda method: multiprocessing.get_context('fork')))
+
+
+def urls(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row['url'] for row in csv.DictReader(f)]
+
+
+def test_big_shards_are_split_by_price_until_they_fit(monkeypatch):
+    adapter = get_adapter('rightmove')
+    monkeypatch.setattr(shards, 'count_results', lambda adapter_, shard, handler: (
+        adapter.max_results + 1 if shard.max_price - shard.min_price > 250 else 100))
+    planned = shards.plan_shards('rightmove', handler=fixture_handler())
+    # Per property type: 0-1000, 3000-4000 and 4000-5000 split in four, the four 500-wide bands in two
+    assert len(planned) == 5 * (3 * 4 + 4 * 2)
+    assert all(shard.max_price - shard.min_price <= 250 and shard.results == 100 for shard in planned)
+    studio = [(shard.min_price, shard.max_price) for shard in planned if shard.property_type == 'studio']
+    assert studio[:4] == [(0, 250), (250, 500), (500, 750), (750, 1000)]
+
+
+def test_shards_crawl_in_worker_processes_and_write_each_listing_once(tmp_path, forked_fixture_pool):
+    output = str(tmp_path / 'rightmove.csv')
+    plan = shards.plan_shards('rightmove', probe=False)[:4]
+    total = shards.crawl_shards('rightmove', output, processes=2, shards=plan, run_id='run',
+                                keep_shard_files=True)
+
+    # Every shard pages through the same fixture listings, but only one shard claims each
+    written = urls(output)
+    assert total == len(written) == len(set(written)) == 120
+    shard_files = [os.path.join(output + '.shards', name) for name in os.listdir(output + '.shards')
+                   if name.endswith('.csv')]
+    assert len(shard_files) == 4
+    assert sum(len(urls(path)) for path in shard_files) == 120
+
+
+def test_rerun_skips_finished_shards(tmp_path, forked_fixture_pool, monkeypatch):
+    output = str(tmp_path / 'rightmove.csv')
+    plan = shards.plan_shards('rightmove', probe=False)[:2]
+    assert shards.crawl_shards('rightmove', output, processes=2, shards=plan, run_id='run',
+                               keep_shard_files=True) == 120
+
+    def unreachable():
+        raise AssertionError("a finished shard was crawled again")
+    monkeypatch.setattr(core, 'default_handler', unreachable)
+    assert shards.crawl_shards('rightmove', output, processes=2, shards=plan, run_id='run') == 120
+    # With every shard finished the work directory is cleaned up
+    assert not os.path.exists(output + '.shards')
@@ -0,0 +1,50 @@
+import pytest
+
+from utils.records import FIELDS, Listing
+from utils.sinks import TeeSink, open_sink, read_listings
+
+LISTINGS = [{'url': f'https://example.com/{n}', 'address': f'{n} Mare Street, London E8 1EA',
+             'monthly_price': 1000.0 + n} for n in range(5)]
+
+
+@pytest.mark.parametrize('name', ['out.csv', 'out.csv.gz', 'out.jsonl', 'out.jsonl.gz'])
+def test_sink_round_trips_dicts_and_records(tmp_path, name):
+    path = str(tmp_path / name)
+    with open_sink(path) as sink:
+        sink.write(LISTINGS[0])
+        sink.write(Listing(*(LISTINGS[1].get(field) for field in FIELDS)))
+    rows = list(read_listings(path))
+    assert [row['url'] for row in rows] == ['https://example.com/0', 'https://example.com/1']
+    # CSV hands values back as strings
+    assert [float(row['monthly_price']) for row in rows] == [1000.0, 1001.0]
+
+
+def test_sink_flushes_every_n_listings(tmp_path):
+    path = str(tmp_path / 'out.jsonl')
+    with open_sink(path, flush_every=2) as sink:
+        sink.write_all(LISTINGS[:3])
+        # The first two reached the file before the sink was closed
+        assert [row['url'] for row in read_listings(path)] == [row['url'] for row in LISTINGS[:2]]
+    assert len(list(read_listings(path))) == 3
+
+
+def test_appending_csv_keeps_one_header(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    with open_sink(path) as sink:
+        sink.write_all(LISTINGS[:2])
+    with open_sink(path, append=True) as sink:
+        sink.write_all(LISTINGS[2:])
+    assert [row['url'] for row in read_listings(path)] == [row['url'] for row in LISTINGS]
+
+
+def test_tee_writes_every_listing_to_each_sink(tmp_path):
+    paths = [str(tmp_path / 'out.csv'), str(tmp_path / 'out.jsonl')]
+    with TeeSink(*(open_sink(path) for path in paths)) as sink:
+        assert sink.write_all(LISTINGS) == 5
+    for path in paths:
+        assert [row['url'] for row in read_listings(path)] == [row['url'] for row in LISTINGS]
+
+
+def test_unknown_extension_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / 'out.xml'))
@@ -0,0 +1,54 @@
+import app as app_module
+from utils.telemetry import Metrics, RunReport, get_metrics
+
+
+def test_counters_and_histograms_render_in_prometheus_text_format():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.inc('scrape_pages_total', site='rightmove', outcome='ok')
+    metrics.inc('scrape_pages_total', site='rightmove', outcome='ok')
+    metrics.inc('scrape_cards_total', 3, site='say "hi"\n')
+    for seconds in (0.05, 0.5, 5.0):
+        metrics.observe('scrape_request_seconds', seconds, host='www.rightmove.co.uk')
+
+    lines = metrics.render_prometheus().splitlines()
+    assert '# TYPE scrape_pages_total counter' in lines
+    assert 'scrape_pages_total{outcome="ok",site="rightmove"} 2' in lines
+    assert 'scrape_cards_total{site="say \\"hi\\"\\n"} 3' in lines
+    assert '# TYPE scrape_request_seconds histogram' in lines
+    assert [line for line in lines if line.startswith('scrape_request_seconds')] == [
+        'scrape_request_seconds_bucket{host="www.rightmove.co.uk",le="0.1"} 1',
+        'scrape_request_seconds_bucket{host="www.rightmove.co.uk",le="1.0"} 2',
+        'scrape_request_seconds_bucket{host="www.rightmove.co.uk",le="+Inf"} 3',
+        'scrape_request_seconds_sum{host="www.rightmove.co.uk"} 5.550000',
+        'scrape_request_seconds_count{host="www.rightmove.co.uk"} 3',
+    ]
+
+
+def test_run_report_counts_only_its_own_site_since_it_started(tmp_path):
+    metrics = Metrics()
+    metrics.inc('scrape_listings_written_total', 10, site='rightmove')
+    report = RunReport('rightmove', 'www.rightmove.co.uk', metrics).start()
+    metrics.inc('scrape_listings_written_total', 5, site='rightmove')
+    metrics.inc('scrape_listings_written_total', 7, site='openrent')
+    metrics.inc('scrape_pages_total', site='rightmove', outcome='ok')
+    metrics.inc('scrape_responses_total', host='www.rightmove.co.uk', status='200')
+    metrics.observe('scrape_stage_seconds', 0.25, site='rightmove', stage='parse')
+
+    summary = report.finish(str(tmp_path / 'report.json'))
+    assert summary['listings_written'] == 5
+    assert summary['pages'] == {'ok': 1}
+    assert summary['status_codes'] == {'200': 1}
+    assert summary['stages'] == {'parse': {'count': 1, 'total_seconds': 0.25, 'mean_seconds': 0.25}}
+    assert (tmp_path / 'report.json').exists()
+
+
+def test_metrics_endpoints_serve_the_shared_registry():
+    get_metrics().inc('scrape_blocked_total', host='metrics-test.example')
+    RunReport('metrics-test', 'metrics-test.example').start().finish()
+    client = app_module.app.test_client()
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'scrape_blocked_total{host="metrics-test.example"} 1' in response.get_data(as_text=True).splitlines()
+    assert client.get('/metrics/runs').json['runs'][-1]['site'] == 'metrics-test'
@@ -0,0 +1,175 @@
+"""
+Resumable scrape checkpoints stored in a local SQLite database.
+
+For every (site, run_id) we keep the last completed results page, the pages
+that failed, and the listing URLs already emitted, so a run that dies part
+way through picks up where it stopped instead of re-fetching from page 1.
+"""
+
+import itertools
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+DEFAULT_CHECKPOINT_DB = 'scrape_checkpoints.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    site TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    last_page INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (site, run_id)
+);
+CREATE TABLE IF NOT EXISTS failed_pages (
+    site TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    PRIMARY KEY (site, run_id, page)
+);
+CREATE TABLE IF NOT EXISTS emitted_urls (
+    site TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (site, run_id, url)
+) WITHOUT ROWID;
+"""
+
+
+def default_run_id():
+    """Runs are keyed by day, so a restarted scrape on the same day resumes"""
+    return datetime.now().strftime('%Y%m%d')
+
+
+class CheckpointStore:
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def open_run(self, site: str, run_id: str = None, before_commit=None) -> 'RunCheckpoint':
+        """
+        Load (or start) the checkpoint for a run. A run that previously
+        completed is reset, so reusing its id starts a fresh crawl.
+        """
+        run_id = run_id or default_run_id()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT last_page, completed FROM runs WHERE site = ? AND run_id = ?",
+                (site, run_id)
+            ).fetchone()
+            if row and row[1]:
+                self._reset(site, run_id)
+                row = None
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO runs (site, run_id, updated_at) VALUES (?, ?, ?)",
+                    (site, run_id, datetime.now().isoformat())
+                )
+                last_page = 0
+            else:
+                last_page = row[0]
+            failed = {page for (page,) in self._conn.execute(
+                "SELECT page FROM failed_pages WHERE site = ? AND run_id = ?", (site, run_id)
+            )}
+            emitted = self._conn.execute(
+                "SELECT COUNT(*) FROM emitted_urls WHERE site = ? AND run_id = ?", (site, run_id)
+            ).fetchone()[0]
+        return RunCheckpoint(self, site, run_id, last_page, failed, emitted, before_commit)
+
+    def is_complete(self, site: str, run_id: str) -> bool:
+        """Whether the run finished with no failed pages left to retry"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT completed FROM runs WHERE site = ? AND run_id = ?", (site, run_id)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def close(self):
+        self._conn.close()
+
+    def _reset(self, site, run_id):
+        for table in ('runs', 'failed_pages', 'emitted_urls'):
+            self._conn.execute(f"DELETE FROM {table} WHERE site = ? AND run_id = ?", (site, run_id))
+
+
+class RunCheckpoint:
+    """Checkpoint state for a single (site, run_id)"""
+
+    def __init__(self, store, site, run_id, last_page, failed_pages, emitted_count, before_commit=None):
+        self.store = store
+        self.site = site
+        self.run_id = run_id
+        self.last_page = last_page
+        self.failed_pages = set(failed_pages)
+        self.emitted_count = emitted_count
+        # Called before each commit, e.g. to flush the output sink so nothing
+        # is recorded as emitted that has not reached disk
+        self.before_commit = before_commit
+
+    @property
+    def resuming(self) -> bool:
+        return bool(self.last_page or self.failed_pages or self.emitted_count)
+
+    def pages(self):
+        """Pages still to crawl: earlier failures first, then onwards from the cursor"""
+        if self.resuming:
+            logging.info(f"Resuming {self.site} run {self.run_id} after page {self.last_page} "
+                         f"({len(self.failed_pages)} failed pages to retry)")
+        return itertools.chain(sorted(self.failed_pages), itertools.count(self.last_page + 1))
+
+    def seen(self, url) -> bool:
+        if not url:
+            return False
+        with self.store._lock:
+            return self.store._conn.execute(
+                "SELECT 1 FROM emitted_urls WHERE site = ? AND run_id = ? AND url = ?",
+                (self.site, self.run_id, url)
+            ).fetchone() is not None
+
+    def page_done(self, page, urls):
+        """Record a completed page and the listing URLs emitted from it"""
+        if self.before_commit:
+            self.before_commit()
+        urls = [url for url in urls if url]
+        with self.store._lock, self.store._conn as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO emitted_urls (site, run_id, url) VALUES (?, ?, ?)",
+                [(self.site, self.run_id, url) for url in urls]
+            )
+            conn.execute(
+                "DELETE FROM failed_pages WHERE site = ? AND run_id = ? AND page = ?",
+                (self.site, self.run_id, page)
+            )
+            conn.execute(
+                "UPDATE runs SET last_page = MAX(last_page, ?), updated_at = ? WHERE site = ? AND run_id = ?",
+                (page, datetime.now().isoformat(), self.site, self.run_id)
+            )
+        self.failed_pages.discard(page)
+        self.last_page = max(self.last_page, page)
+        self.emitted_count += len(urls)
+
+    def page_failed(self, page):
+        with self.store._lock, self.store._conn as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO failed_pages (site, run_id, page) VALUES (?, ?, ?)",
+                (self.site, self.run_id, page)
+            )
+            # Keep the cursor moving past the failure; the page is retried on resume
+            conn.execute(
+                "UPDATE runs SET last_page = MAX(last_page, ?), updated_at = ? WHERE site = ? AND run_id = ?",
+                (page, datetime.now().isoformat(), self.site, self.run_id)
+            )
+        self.failed_pages.add(page)
+        self.last_page = max(self.last_page, page)
+
+    def complete(self):
+        """Mark the run finished; the next run with this id starts over"""
+        with self.store._lock, self.store._conn as conn:
+            conn.execute(
+                "UPDATE runs SET completed = 1, updated_at = ? WHERE site = ? AND run_id = ?",
+                (datetime.now().isoformat(), self.site, self.run_id)
+            )
@@ -3,34 +3,92 @@ Contains helper functions for cleaning and transforming scraped data.
 """
 
 import random
-import requests
-import time
+import re
+
+# Outward code of a UK postcode (e.g. "SW1A" of "SW1A 1AA"), optionally followed by the inward code
+POSTCODE_DISTRICT_RE = re.compile(r'\b([A-Z]{1,2}[0-9][A-Z0-9]?)(?:\s*[0-9][A-Z]{2})?\b', re.IGNORECASE)
+POSTCODE_RE = re.compile(r'\b([A-Z]{1,2}[0-9][A-Z0-9]?)\s*([0-9][A-Z]{2})\b', re.IGNORECASE)
+
+NUMBER = r'([0-9][0-9,]*(?:\.[0-9]+)?)'
+WEEKLY_UNIT = r'(?:pw|p/w|p\.w\.?|per\s+week|a\s+week|weekly)'
+MONTHLY_UNIT = r'(?:pcm|p\.c\.m\.?|p/m|pm|per\s+(?:calendar\s+)?month|a\s+month|monthly)'
+WEEKLY = rf'\b{WEEKLY_UNIT}\b'
+SQM_UNIT = r'(?:sq\.?\s*m(?:etres?|eters?)?\b|sqm\b|m²|m2\b|square\s+met)'
+SQFT_UNIT = r'(?:sq\.?\s*f(?:ee)?t\b|sqft\b|ft²|ft2\b|square\s+f)'
+PRICE_RE = re.compile(NUMBER)
+WEEKLY_RE = re.compile(WEEKLY, re.IGNORECASE)
+# A price and the period written right after it, e.g. "£461 pw" or "£2,000pcm"
+PRICE_PERIOD_RE = re.compile(rf'{NUMBER}\s*(?:({MONTHLY_UNIT})|({WEEKLY_UNIT}))?(?![a-z])', re.IGNORECASE)
+SQM_RE = re.compile(NUMBER + r'\s*' + SQM_UNIT, re.IGNORECASE)
+SQFT_RE = re.compile(NUMBER + r'\s*' + SQFT_UNIT, re.IGNORECASE)
+
+WEEKS_PER_MONTH = 52 / 12
+SQFT_TO_SQM = 0.092903
+
+def _number(text):
+    return float(text.replace(',', ''))
 
 def clean_price(price_str):
+    """
+    Monthly price from text like "£1,200 pcm" or "£300 pw". The period is
+    the one written after the number: with both, as in "£2,000 pcm (£461
+    pw)", the monthly figure is taken as it is; a weekly figure is
+    converted. A number with no period of its own is weekly only if the
+    text says so somewhere ("Weekly rent: £300").
+    """
     if not price_str:
         return None
-    return float(
-        price_str.replace('£', '')
-                 .replace(',', '')
-                 .split()[0]
-    )
+    matches = PRICE_PERIOD_RE.findall(price_str)
+    if not matches:
+        return None
+    for number, monthly, _ in matches:
+        if monthly:
+            return _number(number)
+    number, _, weekly = matches[0]
+    price = _number(number)
+    # Only weekly periods are left to check once no figure is monthly
+    if weekly or (not any(w for _, _, w in matches) and WEEKLY_RE.search(price_str)):
+        price = round(price * WEEKS_PER_MONTH, 2)
+    return price
 
 def clean_address(address_str):
     if not address_str:
         return None
-    return address_str.strip()
+    return ' '.join(address_str.split()).strip(' ,') or None
+
+def normalize_postcode(address_str):
+    """Full postcode in an address as "OUT IN" (e.g. "SW1A 1AA"), or None"""
+    if not address_str:
+        return None
+    matches = POSTCODE_RE.findall(address_str)
+    if not matches:
+        return None
+    outward, inward = matches[-1]
+    return f"{outward.upper()} {inward.upper()}"
+
+def extract_postcode_district(address_str):
+    """Postcode district of an address (the last one mentioned), or None"""
+    if not address_str:
+        return None
+    matches = POSTCODE_DISTRICT_RE.findall(address_str)
+    return matches[-1].upper() if matches else None
 
 def extract_size(size_str):
+    """
+    Size in square metres from text like "83 sq m" or "1,200 sq ft (111 sq m)".
+    A stated square-metre figure wins; square feet are converted; a bare
+    number is taken as square metres.
+    """
     if not size_str:
         return None
-    try:
-        # Extract numeric value and convert to sqm
-        numeric = float(''.join(filter(str.isdigit, size_str)))
-        if 'sq ft' in size_str.lower():
-            return round(numeric * 0.092903, 2)  # Convert sq ft to sqm
-        return numeric
-    except:
-        return None
+    match = SQM_RE.search(size_str)
+    if match:
+        return _number(match.group(1))
+    match = SQFT_RE.search(size_str)
+    if match:
+        return round(_number(match.group(1)) * SQFT_TO_SQM, 2)
+    match = PRICE_RE.search(size_str)
+    return _number(match.group(1)) if match else None
 
 def get_random_user_agent():
     user_agents = [
@@ -48,6 +106,3 @@ def get_request_headers():
         'Accept-Language': 'en-US,en;q=0.5',
         'Connection': 'keep-alive',
     }
-
-def random_delay():
-    time.sleep(random.uniform(2, 5))
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""
+Duplicate listing detection across sites and agents.
+
+The same flat often appears on both Rightmove and OpenRent, or several
+times on Rightmove through different agents. Comparing every pair of
+listings is quadratic, so candidates are blocked first: a listing is
+indexed under (geohash cell, price band, bedrooms), and only listings in
+its own or a neighbouring cell and band are compared. Listings are also
+blocked by postcode, so those without coordinates still meet their
+duplicates. Candidate addresses are compared with MinHash signatures of
+their character trigrams (and must not give conflicting house or flat
+numbers), and matches are merged with union-find into clusters, each
+with a canonical listing.
+"""
+
+import math
+import re
+from collections import defaultdict
+from itertools import combinations, product
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.data_cleaner import clean_address, normalize_postcode
+
+# Geohash cells of ~1.2 km x 0.6 km; neighbouring cells are probed too
+DEFAULT_GEOHASH_PRECISION = 6
+# Prices within one band of each other (about 10% apart) are compared
+PRICE_BAND_RATIO = 1.1
+DEFAULT_THRESHOLD = 0.6
+NUM_PERM = 64
+SHINGLE_SIZE = 3
+# Texts per vectorized signature batch (bounds the NUM_PERM x trigrams matrix)
+SIGNATURE_CHUNK = 2048
+# Candidate pairs compared per vectorized step
+PAIR_CHUNK = 65536
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+ABBREVIATIONS = {
+    'st': 'street', 'rd': 'road', 'ave': 'avenue', 'ln': 'lane', 'sq': 'square',
+    'ct': 'court', 'pl': 'place', 'gdns': 'gardens', 'cres': 'crescent', 'apt': 'flat',
+}
+# Words every London address shares add nothing to the comparison
+STOP_WORDS = {'london', 'uk', 'united', 'kingdom'}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+NUMBER_TOKEN_RE = re.compile(r'\b[0-9]+[a-z]?\b')
+BEDROOMS_RE = re.compile(r'(\d+)\s*(?:-\s*)?(?:bed|bedroom|br)\b', re.IGNORECASE)
+
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, MERSENNE_PRIME, NUM_PERM, dtype=np.int64)
+_PERM_B = _rng.integers(0, MERSENNE_PRIME, NUM_PERM, dtype=np.int64)
+
+
+def geohash_cell(latitude: float, longitude: float,
+                 precision: int = DEFAULT_GEOHASH_PRECISION) -> Tuple[int, int]:
+    """
+    (row, column) of the geohash cell containing a point. Geohash cells of
+    a given precision form a regular grid, so neighbouring cells are just
+    adjacent indices and no string encoding is needed for blocking.
+    """
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return (int((latitude + 90.0) / 180.0 * (1 << lat_bits)),
+            int((longitude + 180.0) / 360.0 * (1 << lng_bits)))
+
+
+def price_band(price: Optional[float]) -> Optional[int]:
+    if not price or price <= 0:
+        return None
+    return int(math.log(price) / math.log(PRICE_BAND_RATIO))
+
+
+def bedrooms(property_type: Optional[str]) -> Optional[int]:
+    """Bedroom count from e.g. "2 bedroom flat"; studios count as 0"""
+    if not property_type:
+        return None
+    match = BEDROOMS_RE.search(property_type)
+    if match:
+        return int(match.group(1))
+    return 0 if 'studio' in property_type.lower() else None
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """Lowercased address tokens with common abbreviations expanded"""
+    address = clean_address(address) or ''
+    tokens = (ABBREVIATIONS.get(token, token) for token in TOKEN_RE.findall(address.lower()))
+    return ' '.join(token for token in tokens if token not in STOP_WORDS)
+
+
+def address_numbers(normalized: str) -> frozenset:
+    """House and flat numbers of a normalized address"""
+    return frozenset(NUMBER_TOKEN_RE.findall(normalized))
+
+
+def numbers_conflict(a: frozenset, b: frozenset) -> bool:
+    """True when two addresses give different numbers (one omitting some is fine)"""
+    return bool(a) and bool(b) and not (a <= b or b <= a)
+
+
+def minhash_signatures(texts: Sequence[str]) -> np.ndarray:
+    """
+    MinHash signatures (one row of NUM_PERM values per text) over the
+    byte trigrams of each text, computed a chunk of texts at a time.
+    Texts shorter than a trigram get an all-maximum signature.
+    """
+    signatures = np.full((len(texts), NUM_PERM), MERSENNE_PRIME, dtype=np.int64)
+    for chunk_start in range(0, len(texts), SIGNATURE_CHUNK):
+        encoded = [text.encode('utf-8') for text in texts[chunk_start:chunk_start + SIGNATURE_CHUNK]]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.int64)
+        if data.size < SHINGLE_SIZE:
+            continue
+        # Trigram codes at every offset; keep those that start and end inside one text
+        codes = data[:-2] << 16 | data[1:-1] << 8 | data[2:]
+        rows = np.repeat(np.arange(len(encoded)), lengths)[:codes.size]
+        offsets = np.arange(codes.size) - (np.cumsum(lengths) - lengths)[rows]
+        valid = offsets <= lengths[rows] - SHINGLE_SIZE
+        codes, rows = codes[valid], rows[valid]
+        if not codes.size:
+            continue
+        hashed = (_PERM_A[:, None] * codes[None, :] + _PERM_B[:, None]) % MERSENNE_PRIME
+        starts = np.flatnonzero(np.diff(rows, prepend=-1))
+        signatures[chunk_start + rows[starts]] = np.minimum.reduceat(hashed, starts, axis=1).T
+    # Values stay below 2**31, so int32 halves the memory of large batches
+    return signatures.astype(np.int32)
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of one text"""
+    return minhash_signatures([text])[0]
+
+
+def similarity(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return float(np.count_nonzero(signature_a == signature_b)) / NUM_PERM
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # The smaller index stays root, so roots are stable and deterministic
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            self.parent[root_b] = root_a
+
+
+def listing_id(listing: Dict, index: int) -> str:
+    return listing.get('url') or f"#{index}"
+
+
+def _completeness(listing: Dict) -> int:
+    return sum(1 for value in listing.values() if value not in (None, '', 0, 0.0))
+
+
+def _block_keys(listing: Dict, precision: int) -> List[tuple]:
+    """
+    Blocks a listing belongs to: its geohash cell when it has coordinates
+    and its postcode when it has one, each with price band and bedrooms.
+    Being in both lets a listing without coordinates meet its duplicates.
+    """
+    band = price_band(listing.get('monthly_price'))
+    if band is None:
+        return []
+    # -1 for unknown keeps keys orderable
+    beds = bedrooms(listing.get('property_type'))
+    beds = -1 if beds is None else beds
+    keys = []
+    latitude, longitude = listing.get('latitude'), listing.get('longitude')
+    if latitude or longitude:
+        keys.append(('geo', *geohash_cell(latitude, longitude, precision), band, beds))
+    postcode = listing.get('postcode') or normalize_postcode(listing.get('address'))
+    if postcode:
+        keys.append(('postcode', postcode, band, beds))
+    return keys
+
+
+def _neighbour_keys(key):
+    """Blocks next to this one (adjacent price band, and cell for geo blocks), itself included"""
+    if key[0] == 'geo':
+        _, row, column, band, beds = key
+        return [('geo', row + i, column + j, band + k, beds)
+                for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)]
+    _, postcode, band, beds = key
+    return [('postcode', postcode, band + k, beds) for k in (-1, 0, 1)]
+
+
+def find_clusters(listings: Sequence[Dict], threshold: float = DEFAULT_THRESHOLD,
+                  precision: int = DEFAULT_GEOHASH_PRECISION) -> List[Dict]:
+    """
+    Clusters of listings that look like the same property, as dicts with
+    canonical_id (the most complete member's id, its URL where it has
+    one) and member_ids. Singletons are not returned.
+    """
+    addresses = [normalize_address(listing.get('address')) for listing in listings]
+    blocks = defaultdict(list)
+    for index, listing in enumerate(listings):
+        # An empty address has nothing to compare
+        if addresses[index]:
+            for key in _block_keys(listing, precision):
+                blocks[key].append(index)
+
+    # Candidate pairs: within a block, and across neighbouring blocks (each
+    # pair of blocks once, from the lower key)
+    pairs_a, pairs_b = [], []
+    for key, members in blocks.items():
+        for neighbour in _neighbour_keys(key):
+            if neighbour < key or neighbour not in blocks:
+                continue
+            pairs = combinations(members, 2) if neighbour == key else product(members, blocks[neighbour])
+            for a, b in pairs:
+                pairs_a.append(a)
+                pairs_b.append(b)
+    pairs_a = np.array(pairs_a, dtype=np.int64)
+    pairs_b = np.array(pairs_b, dtype=np.int64)
+
+    signatures = minhash_signatures(addresses)
+    numbers = [address_numbers(address) for address in addresses]
+    min_matches = int(np.ceil(threshold * NUM_PERM))
+    uf = UnionFind(len(listings))
+    for start in range(0, pairs_a.size, PAIR_CHUNK):
+        a, b = pairs_a[start:start + PAIR_CHUNK], pairs_b[start:start + PAIR_CHUNK]
+        similar = (signatures[a] == signatures[b]).sum(axis=1) >= min_matches
+        for i, j in zip(a[similar].tolist(), b[similar].tolist()):
+            if i != j and not numbers_conflict(numbers[i], numbers[j]):
+                uf.union(i, j)
+
+    members = defaultdict(list)
+    for index in range(len(listings)):
+        members[uf.find(index)].append(index)
+
+    clusters = []
+    for indices in members.values():
+        if len(indices) < 2:
+            continue
+        canonical = max(indices, key=lambda i: (_completeness(listings[i]), -i))
+        clusters.append({
+            "canonical_id": listing_id(listings[canonical], canonical),
+            "member_ids": [listing_id(listings[i], i) for i in indices],
+        })
+    return clusters
+
+
+def deduplicate(listings: Iterable[Dict], threshold: float = DEFAULT_THRESHOLD,
+                precision: int = DEFAULT_GEOHASH_PRECISION) -> List[Dict]:
+    """
+    Listings with duplicates collapsed: each cluster keeps only its
+    canonical listing, annotated with duplicate_ids of the others.
+    """
+    listings = list(listings)
+    clusters = find_clusters(listings, threshold=threshold, precision=precision)
+    ids = [listing_id(listing, index) for index, listing in enumerate(listings)]
+    canonical_of = {}
+    for cluster in clusters:
+        for member in cluster["member_ids"]:
+            canonical_of[member] = cluster
+    result = []
+    for listing, id_ in zip(listings, ids):
+        cluster = canonical_of.get(id_)
+        if cluster is None:
+            result.append(listing)
+        elif cluster["canonical_id"] == id_:
+            result.append({**listing, "duplicate_ids": [m for m in cluster["member_ids"] if m != id_]})
+    return result
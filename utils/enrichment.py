@@ -0,0 +1,140 @@
+"""
+Detail-page enrichment of listings the results crawl left incomplete.
+
+Result cards often lack size, availability and coordinates, which the
+listing's own page usually has. DetailEnricher takes listings as the
+crawl produces them and fetches their detail pages on a small pool of
+worker threads, so the crawl never waits on it: offer() only queues.
+The queue is bounded and prioritized, listings missing the most fields
+(then new ones) first; when it is full the least useful listing is
+dropped. Results are handed to on_result as they arrive.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_ENRICH_WORKERS = 2
+DEFAULT_MAX_PENDING = 1000
+
+# Fields a detail page can fill in
+ENRICH_FIELDS = ("size_sqm", "available_from", "latitude", "longitude")
+
+
+def missing_fields(listing: Dict) -> List[str]:
+    """Enrichable fields a listing lacks (coordinates of 0 count as missing)"""
+    return [field for field in ENRICH_FIELDS if not listing.get(field)]
+
+
+class DetailEnricher:
+    def __init__(self, fetch_detail: Callable[[str], Dict],
+                 on_result: Callable[[Dict, Dict], None],
+                 workers: int = DEFAULT_ENRICH_WORKERS,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        """
+        fetch_detail(url) returns the fields found on a listing's detail
+        page (or raises); on_result(listing, fields) merges them in and is
+        called from the worker threads.
+        """
+        self.fetch_detail = fetch_detail
+        self.on_result = on_result
+        self.max_pending = max(1, max_pending)
+        self.enriched = 0
+        self.failed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued = set()
+        self._closing = False
+        self._cond = threading.Condition()
+        self._workers = [threading.Thread(target=self._work, name=f'enrich-{n}', daemon=True)
+                         for n in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def offer(self, listing: Dict, stored: Optional[Dict] = None) -> bool:
+        """
+        Queue a listing for enrichment unless it has nothing to gain.
+        stored is what the store held for it before this crawl (None if it
+        is new); a listing whose price and address have not changed since
+        it was last enriched is skipped.
+        """
+        missing = missing_fields(listing)
+        unchanged = (stored is not None and stored.get('enriched_at')
+                     and stored.get('monthly_price') == listing.get('monthly_price')
+                     and stored.get('address') == listing.get('address'))
+        if not listing.get('url') or not missing or unchanged:
+            with self._cond:
+                self.skipped += 1
+            return False
+        return self.submit(listing, len(missing), is_new=stored is None)
+
+    def submit(self, listing: Dict, priority: int, is_new: bool = False) -> bool:
+        """Queue a listing; higher priority first, new listings first among equals"""
+        with self._cond:
+            if self._closing or listing['url'] in self._queued:
+                return False
+            heapq.heappush(self._heap, (-priority, 0 if is_new else 1, next(self._seq), listing))
+            self._queued.add(listing['url'])
+            if len(self._heap) > self.max_pending:
+                # The heap's last leaf is not necessarily the worst, so find it
+                worst = max(range(len(self._heap)), key=lambda i: self._heap[i][:3])
+                dropped = self._heap[worst][3]
+                self._heap[worst] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                self._queued.discard(dropped['url'])
+                self.dropped += 1
+                if dropped is listing:
+                    return False
+            self._cond.notify()
+        return True
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closing:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                listing = heapq.heappop(self._heap)[3]
+                self._queued.discard(listing['url'])
+            try:
+                fields = self.fetch_detail(listing['url'])
+                self.on_result(listing, fields)
+            except Exception as e:
+                logging.warning(f"Enrichment failed for {listing['url']}: {e}")
+                with self._cond:
+                    self.failed += 1
+            else:
+                with self._cond:
+                    self.enriched += 1
+
+    def close(self, wait: bool = True):
+        """
+        Stop accepting listings. With wait, queued listings are still
+        enriched before returning; otherwise they are discarded.
+        """
+        with self._cond:
+            self._closing = True
+            if not wait:
+                self.dropped += len(self._heap)
+                self._heap.clear()
+                self._queued.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {"enriched": self.enriched, "failed": self.failed,
+                    "dropped": self.dropped, "skipped": self.skipped, "pending": len(self._heap)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(wait=exc_type is None)
@@ -0,0 +1,230 @@
+"""
+Async page fetch engine shared by the scrapers.
+
+Results pages are fetched concurrently with a bounded number of requests in
+flight per site. The fetch functions themselves stay blocking (requests /
+ProxyCaptchaHandler) and run in worker threads, so the HostScheduler they go
+through still decides how fast requests actually leave the process.
+"""
+
+import asyncio
+import itertools
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_CONCURRENCY = 4
+
+
+class PageFetchEngine:
+    def __init__(self, fetch_page: Callable[[int], Any],
+                 parse_page: Callable[[Any], List[Dict]],
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_consecutive_failures: int = 5,
+                 on_page_failed: Callable[[int], None] = None,
+                 progress=None, max_ahead: int = None,
+                 page_count: Callable[[Any], Optional[int]] = None):
+        """
+        fetch_page(page) performs the blocking request for a 1-based page
+        number and returns the response (or raises). parse_page(response)
+        returns the listings found on that page. progress, if given, gets
+        page_done(page, listings) and page_failed(page) calls. max_ahead
+        (default twice the concurrency) bounds how many pages may be
+        fetched or held ahead of the next page handed out.
+
+        page_count(response), if given, reads the number of the last
+        results page from a response (None if the page does not say).
+        fetch_page does its own retrying (ProxyCaptchaHandler retries
+        each request), so a page whose fetch raises counts as failed.
+        """
+        self.fetch_page = fetch_page
+        self.parse_page = parse_page
+        self.concurrency = max(1, concurrency)
+        self.max_ahead = max(self.concurrency, max_ahead or 2 * self.concurrency)
+        self.max_consecutive_failures = max_consecutive_failures
+        self.on_page_failed = on_page_failed
+        self.progress = progress
+        self.page_count = page_count
+        # Known once page_count has read it from a response
+        self.last_page = None
+        self.failed_pages = []
+
+    async def crawl(self, pages: Iterable[int] = None, revisits: Iterable[int] = ()):
+        """
+        Async generator yielding (page, listings) in page order.
+
+        Up to `concurrency` fetches run at once, and a finished fetch starts
+        the next one straight away, so a slow page (say one parked on a
+        CAPTCHA) holds up only its own slot while later pages are fetched
+        and buffered, up to max_ahead.
+
+        With page_count set, the first page is fetched alone and the last
+        page read from it, so no page past the end is ever requested.
+        Crawling stops at the last page, the first empty page, a page
+        repeating an earlier one, after too many consecutive failures, or
+        when the caller stops iterating; outstanding fetches are then
+        cancelled. revisits are pages fetched again (failed pages retried
+        on resume): one that comes back empty is yielded with no listings,
+        so the caller can clear it, and the crawl carries on.
+        """
+        revisits = set(revisits)
+        pages = iter(pages if pages is not None else itertools.count(1))
+        in_flight = deque()
+        running = 0
+        stopped = False
+        exhausted = False
+        # Until the last page is known, probe with a single fetch
+        probing = self.page_count is not None and self.last_page is None
+
+        def fetched(_task):
+            nonlocal running
+            running -= 1
+            schedule()
+
+        def start(page):
+            nonlocal running
+            task = asyncio.ensure_future(self._fetch(page))
+            running += 1
+            task.add_done_callback(fetched)
+            return task
+
+        def schedule():
+            nonlocal exhausted
+            limit = 1 if probing else self.concurrency
+            while not stopped and not exhausted and running < limit and len(in_flight) < self.max_ahead:
+                page = next(pages, None)
+                if page is None or (self.last_page is not None and page > self.last_page):
+                    exhausted = True
+                    return
+                in_flight.append((page, start(page)))
+
+        consecutive_failures = 0
+        seen_pages = {}
+        schedule()
+        try:
+            while in_flight:
+                page, task = in_flight[0]
+                try:
+                    response = await task
+                except Exception as e:
+                    in_flight.popleft()
+                    logging.error(f"Error fetching page {page}: {e}")
+                    self.failed_pages.append(page)
+                    if self.on_page_failed:
+                        self.on_page_failed(page)
+                    if self.progress is not None:
+                        self.progress.page_failed(page)
+                    consecutive_failures += 1
+                    if consecutive_failures >= self.max_consecutive_failures:
+                        logging.error(f"Giving up after {consecutive_failures} consecutive failed pages")
+                        return
+                    schedule()
+                    continue
+
+                in_flight.popleft()
+                consecutive_failures = 0
+                if self.last_page is not None and page > self.last_page:
+                    # Fetched before the last page was known
+                    continue
+                if probing:
+                    self.last_page = self.page_count(response)
+                    probing = False
+                    if self.last_page is not None:
+                        logging.info(f"Results end at page {self.last_page}")
+                listings = self.parse_page(response)
+                if not listings and page in revisits:
+                    logging.info(f"No listings on retried page {page}")
+                    schedule()
+                    yield page, listings
+                    continue
+                if not listings:
+                    logging.info(f"No listings on page {page}, stopping")
+                    return
+                signature = hash(tuple(sorted(str(listing.get('url') or listing.get('address'))
+                                              for listing in listings)))
+                if signature in seen_pages:
+                    logging.info(f"Page {page} repeats page {seen_pages[signature]}, stopping")
+                    return
+                seen_pages[signature] = page
+
+                # Top the window back up before handing control to the caller
+                schedule()
+                yield page, listings
+        finally:
+            stopped = True
+            for _, task in in_flight:
+                task.cancel()
+
+    async def _fetch(self, page: int):
+        return await asyncio.to_thread(self.fetch_page, page)
+
+    def iter_pages(self, pages: Iterable[int] = None,
+                   revisits: Iterable[int] = ()) -> Iterator[Tuple[int, List[Dict]]]:
+        """Synchronous wrapper around crawl() for non-async callers"""
+        loop = asyncio.new_event_loop()
+        agen = self.crawl(pages, revisits)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(agen.aclose())
+            # Wait for fetches already handed to worker threads
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    def iter_listings(self, max_listings: int = None, checkpoint=None, incremental=None) -> Iterator[Dict]:
+        """
+        Generator of listings across pages, stopping at max_listings.
+
+        With a RunCheckpoint the crawl resumes from its cursor, skips URLs
+        already emitted in the run and commits each page once all of its
+        listings have been handed to the caller. With an IncrementalFilter
+        only new or changed listings are emitted, and paging stops after
+        enough consecutive pages with nothing new.
+        """
+        pages = None
+        revisits = ()
+        emitted = 0
+        if checkpoint is not None:
+            pages = checkpoint.pages()
+            # An earlier failure that now comes back empty still clears through page_done
+            revisits = set(checkpoint.failed_pages)
+            emitted = checkpoint.emitted_count
+            self.on_page_failed = checkpoint.page_failed
+        if max_listings is not None and emitted >= max_listings:
+            return
+
+        for page, listings in self.iter_pages(pages, revisits):
+            if incremental is not None and listings:
+                listings = incremental.filter_page(listings)
+            urls = []
+            emitted_listings = []
+            capped = False
+            for listing in listings:
+                url = listing.get('url')
+                if checkpoint is not None and checkpoint.seen(url):
+                    continue
+                emitted += 1
+                urls.append(url)
+                emitted_listings.append(listing)
+                yield listing
+                if max_listings is not None and emitted >= max_listings:
+                    capped = True
+                    break
+            if checkpoint is not None:
+                checkpoint.page_done(page, urls)
+            if incremental is not None:
+                incremental.commit(emitted_listings)
+            if self.progress is not None:
+                self.progress.page_done(page, len(urls))
+            if capped:
+                break
+            if incremental is not None and incremental.exhausted:
+                logging.info(f"No new listings for {incremental.consecutive_seen_pages} pages, stopping")
+                break
+
+        if checkpoint is not None and not checkpoint.failed_pages:
+            checkpoint.complete()
@@ -0,0 +1,295 @@
+"""
+Per-host request scheduling: rate, concurrency, Retry-After and jitter.
+
+Every outgoing request goes through HostScheduler.acquire(host) /
+release(host), and its outcome is reported back with record(). Per host
+the scheduler keeps a concurrency window and a request rate and tunes
+both AIMD-style: each clean response grows the window by 1/window (one
+slot per window's worth of successes) and the rate by rate_step requests
+per minute per minute of clean traffic, up to the host's maximum rate
+(its configured rate unless the site opts into more). A 429 or 503, a
+CAPTCHA or a blocked IP halves both at once, as does a run of other
+errors once their rolling rate passes error_threshold; cuts are at most
+one per decrease_holdoff seconds, so a burst of failures from one
+overload counts once. A Retry-After header pauses the host until it has
+passed.
+
+The rate is enforced by the token-bucket RateLimiter below (shared across
+processes through RATE_LIMIT_STATE_FILE), and each request is delayed by
+a random fraction (jitter) of the host's current interval so that
+requests do not leave in lockstep. Retries are the caller's loop, one per
+request, waiting retry_delay() between attempts; nothing underneath
+(urllib3, the fetch engine) retries again.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from utils.telemetry import get_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process limiting only
+    fcntl = None
+
+DEFAULT_JITTER = 0.5
+DEFAULT_HOST_CONCURRENCY = 4
+DEFAULT_MAX_HOST_CONCURRENCY = 16
+# How far above its configured rate a host may be pushed while it keeps up,
+# for hosts configured without a maximum rate of their own
+DEFAULT_RATE_HEADROOM = 1.0
+DEFAULT_RATE_STEP = 2.0
+DEFAULT_MIN_RPM = 2.0
+DEFAULT_ERROR_THRESHOLD = 0.2
+DEFAULT_DECREASE_HOLDOFF = 5.0
+DEFAULT_RETRY_BASE = 1.0
+# Longest Retry-After honoured; anything beyond is likely a misconfigured header
+MAX_RETRY_AFTER = 600.0
+
+# Outcomes reported to HostScheduler.record()
+OK = 'ok'
+THROTTLED = 'throttled'
+CAPTCHA = 'captcha'
+BLOCKED = 'blocked'
+ERROR = 'error'
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter with one bucket per host.
+
+    Admission is O(1): each call refills the host's bucket from the elapsed
+    time and reserves a token, sleeping (outside the lock) only if the token
+    was borrowed from the future. With state_file set, bucket state lives in
+    that file under an exclusive file lock, so every worker process on the
+    machine draws from the same per-host budget.
+    """
+
+    def __init__(self, requests_per_minute: int = 20, burst: int = 1,
+                 host_rpm: Dict[str, int] = None, state_file: str = None):
+        self.requests_per_minute = requests_per_minute
+        self.burst = max(1, burst)
+        self.host_rpm = host_rpm or {}
+        self.state_file = state_file
+        if state_file and fcntl is None:
+            logging.warning("File locking unavailable, rate limits will not be shared between processes")
+            self.state_file = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def wait_if_needed(self, host: str = None):
+        """Block until a request to host is within budget"""
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reserve(self, host: str = None) -> float:
+        """Take a token for host and return how long to wait before using it"""
+        rate = self.host_rpm.get(host, self.requests_per_minute) / 60.0
+        if self.state_file:
+            return self._reserve_shared(host or '*', rate)
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(host, (self.burst, now))
+            tokens, delay = self._take(tokens, updated, now, rate)
+            self._buckets[host] = (tokens, now)
+        return delay
+
+    def _take(self, tokens, updated, now, rate):
+        tokens = min(self.burst, tokens + (now - updated) * rate) - 1
+        # A negative balance is a reservation: wait until it is paid back
+        return tokens, (-tokens / rate if tokens < 0 else 0.0)
+
+    def _reserve_shared(self, host, rate):
+        with self._lock, open(self.state_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                # Wall-clock time, since monotonic clocks are not comparable across processes
+                now = time.time()
+                tokens, updated = state.get(host, (self.burst, now))
+                tokens, delay = self._take(tokens, updated, now, rate)
+                state[host] = (tokens, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return delay
+
+
+class HostState:
+    """Adaptive limits of one host"""
+    __slots__ = ('rpm', 'min_rpm', 'max_rpm', 'limit', 'in_flight', 'paused_until',
+                 'error_rate', 'decreased_at')
+
+    def __init__(self, rpm: float, max_rpm: float, limit: float):
+        self.rpm = rpm
+        self.min_rpm = min(rpm, DEFAULT_MIN_RPM)
+        self.max_rpm = max(rpm, max_rpm)
+        self.limit = limit
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.error_rate = 0.0
+        self.decreased_at = float('-inf')
+
+
+class HostScheduler:
+    def __init__(self, rate_limiter: RateLimiter = None, jitter: float = DEFAULT_JITTER,
+                 concurrency: int = DEFAULT_HOST_CONCURRENCY,
+                 max_concurrency: int = DEFAULT_MAX_HOST_CONCURRENCY,
+                 rate_headroom: float = DEFAULT_RATE_HEADROOM, rate_step: float = DEFAULT_RATE_STEP,
+                 error_threshold: float = DEFAULT_ERROR_THRESHOLD,
+                 decrease_holdoff: float = DEFAULT_DECREASE_HOLDOFF):
+        """
+        jitter is the largest extra delay per request as a fraction of the
+        host's current interval (60 / rpm). concurrency is each host's
+        starting window. rate_headroom scales the maximum rate of hosts
+        without one of their own; the default of 1 keeps them at their
+        configured rate or below.
+        """
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.jitter = jitter
+        self.concurrency = max(1, concurrency)
+        self.max_concurrency = max(self.concurrency, max_concurrency)
+        self.rate_headroom = max(1.0, rate_headroom)
+        self.rate_step = rate_step
+        self.error_threshold = error_threshold
+        self.decrease_holdoff = decrease_holdoff
+        self.error_alpha = 0.2
+        self.metrics = get_metrics()
+        self._hosts = {}
+        self._cond = threading.Condition()
+
+    def configure(self, host: str, requests_per_minute: float, max_requests_per_minute: float = None):
+        """
+        Register a host's configured rate and the most it may be raised to
+        while the host keeps up (default: the configured rate times
+        rate_headroom), unless a rate for it is already set (on the rate
+        limiter, or by an earlier configure call)
+        """
+        with self._cond:
+            if host in self._hosts:
+                return
+            rpm = self.rate_limiter.host_rpm.setdefault(host, requests_per_minute)
+            self._hosts[host] = HostState(rpm, max_requests_per_minute or rpm * self.rate_headroom,
+                                          self.concurrency)
+
+    def _state(self, host: str) -> HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            rpm = self.rate_limiter.host_rpm.get(host, self.rate_limiter.requests_per_minute)
+            state = self._hosts[host] = HostState(rpm, rpm * self.rate_headroom, self.concurrency)
+        return state
+
+    def acquire(self, host: str):
+        """
+        Block until host has a free slot, is not paused and has a rate
+        token, then hold the slot until release(host)
+        """
+        with self._cond:
+            state = self._state(host)
+            while True:
+                wait = state.paused_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif state.in_flight >= max(1, int(state.limit)):
+                    self._cond.wait()
+                else:
+                    break
+            state.in_flight += 1
+            interval = 60.0 / state.rpm
+        delay = self.rate_limiter.reserve(host) + random.uniform(0, self.jitter * interval)
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self, host: str):
+        with self._cond:
+            state = self._state(host)
+            state.in_flight = max(0, state.in_flight - 1)
+            self._cond.notify_all()
+
+    def record(self, host: str, outcome: str, retry_after: float = None):
+        """Adapt host's limits to a request's outcome (OK, THROTTLED, CAPTCHA, BLOCKED or ERROR)"""
+        with self._cond:
+            state = self._state(host)
+            now = time.monotonic()
+            if outcome == OK:
+                state.error_rate -= self.error_alpha * state.error_rate
+                state.limit = min(self.max_concurrency, state.limit + 1 / state.limit)
+                state.rpm = min(state.max_rpm, state.rpm + self.rate_step / state.rpm)
+            else:
+                self.metrics.inc('scrape_throttled_total', host=host, reason=outcome)
+                if outcome == ERROR:
+                    state.error_rate += self.error_alpha * (1.0 - state.error_rate)
+                    congested = state.error_rate > self.error_threshold
+                else:
+                    congested = True
+                if retry_after:
+                    state.paused_until = max(state.paused_until, now + min(retry_after, MAX_RETRY_AFTER))
+                    logging.warning(f"{host} asked to retry after {retry_after:.0f}s, pausing it")
+                if congested and now - state.decreased_at >= self.decrease_holdoff:
+                    state.decreased_at = now
+                    state.limit = max(1.0, state.limit / 2)
+                    state.rpm = max(state.min_rpm, state.rpm / 2)
+                    logging.info(f"Slowing {host} to {state.rpm:.1f} rpm, "
+                                 f"{int(state.limit)} concurrent ({outcome})")
+            self.rate_limiter.host_rpm[host] = state.rpm
+            self._cond.notify_all()
+
+    def retry_delay(self, attempt: int) -> float:
+        """Backoff before retry number attempt (1-based): exponential, with full jitter"""
+        return random.uniform(0, DEFAULT_RETRY_BASE * 2 ** attempt)
+
+    def stats(self, host: str) -> Dict:
+        with self._cond:
+            state = self._state(host)
+            return {"rpm": round(state.rpm, 2), "concurrency": int(state.limit),
+                    "in_flight": state.in_flight, "error_rate": round(state.error_rate, 3),
+                    "paused_for": round(max(0.0, state.paused_until - time.monotonic()), 1)}
+
+
+_shared_scheduler = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_shared_scheduler() -> HostScheduler:
+    """
+    Process-wide scheduler used by every scraper, so running several sites or
+    scrapes at once cannot multiply the request rate against a host. Set
+    RATE_LIMIT_STATE_FILE to also share the rate budget across worker processes.
+    """
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            # Per-host budgets are registered by the site adapters
+            _shared_scheduler = HostScheduler(RateLimiter(state_file=os.environ.get('RATE_LIMIT_STATE_FILE')))
+        return _shared_scheduler
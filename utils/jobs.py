@@ -0,0 +1,165 @@
+"""
+In-process background job queue for scrape requests.
+
+A job is one /scrape request; it fans out into one task per site, and the
+sites run in parallel on a thread pool. A site task writing to an output
+file that an in-flight task is already producing is shared instead of
+started twice, and an identical in-flight request gets the existing job.
+
+State lives in the serving process, so run the Flask app with a single
+worker process (threads are fine) for job ids to resolve consistently.
+"""
+
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Tuple
+
+MAX_FINISHED_JOBS = 100
+
+
+class ScrapeProgress:
+    """Thread-safe page/listing/failure counters reported by a running scrape"""
+
+    def __init__(self):
+        self.pages = 0
+        self.listings = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def page_done(self, page: int, listings: int):
+        with self._lock:
+            self.pages += 1
+            self.listings += listings
+
+    def page_failed(self, page: int):
+        with self._lock:
+            self.failures += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {"pages": self.pages, "listings": self.listings, "failures": self.failures}
+
+
+class SiteTask:
+    def __init__(self, site: str, output_file: str):
+        self.site = site
+        self.output_file = output_file
+        self.progress = ScrapeProgress()
+        self.future = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def status(self) -> str:
+        if self.future is None or not (self.future.running() or self.future.done()):
+            return "queued"
+        if not self.future.done():
+            return "running"
+        return "failed" if self.future.exception() else "succeeded"
+
+    def as_dict(self) -> Dict:
+        result = {
+            "site": self.site,
+            "status": self.status,
+            "output_file": self.output_file,
+            "progress": self.progress.as_dict(),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "failed":
+            result["error"] = str(self.future.exception())
+        return result
+
+
+class Job:
+    def __init__(self, key: str, tasks):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.tasks = tasks
+        self.created_at = datetime.now().isoformat()
+
+    @property
+    def status(self) -> str:
+        statuses = {task.status for task in self.tasks}
+        for status in ("running", "queued", "failed"):
+            if status in statuses:
+                return status
+        return "succeeded"
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def as_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "sites": [task.as_dict() for task in self.tasks],
+            "files": [task.output_file for task in self.tasks],
+        }
+
+
+class JobQueue:
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active_jobs = {}
+        self._active_tasks = {}
+
+    def submit(self, key: str,
+               sites: Dict[str, Tuple[str, Callable[[ScrapeProgress], None]]]) -> Tuple[Job, bool]:
+        """
+        Queue a job running each site's scrape function, keyed for
+        de-duplication. `sites` maps site -> (output_file, fn(progress)).
+        Returns (job, created) where created is False for a duplicate.
+        """
+        with self._lock:
+            job = self._active_jobs.get(key)
+            if job is not None and not job.done:
+                return job, False
+
+            tasks = []
+            for site, (output_file, fn) in sites.items():
+                task = self._active_tasks.get(output_file)
+                if task is None or task.future.done():
+                    task = SiteTask(site, output_file)
+                    task.future = self._executor.submit(self._run, task, fn)
+                    self._active_tasks[output_file] = task
+                tasks.append(task)
+
+            job = Job(key, tasks)
+            self._jobs[job.id] = job
+            self._active_jobs[key] = job
+            self._prune()
+            return job, True
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, task: SiteTask, fn):
+        task.started_at = datetime.now().isoformat()
+        try:
+            fn(task.progress)
+        except Exception:
+            logging.exception(f"Scrape of {task.site} failed")
+            raise
+        finally:
+            task.finished_at = datetime.now().isoformat()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            job = self._jobs.pop(job_id)
+            if self._active_jobs.get(job.key) is job:
+                del self._active_jobs[job.key]
@@ -0,0 +1,486 @@
+"""
+Local SQLite store of scraped listings, kept alongside the CSV output.
+
+Listings are upserted by URL so history builds up across runs: the
+listings table holds the latest version of each listing, and every scrape
+date it was seen on is recorded in observations (price and availability
+at the time). Indexes cover price, property type and site, and an R-tree
+over latitude/longitude makes bounding-box and radius queries cheap.
+Fields filled in later from detail pages (see enrich) survive re-scrapes
+of cards that lack them.
+
+Each upsert also folds the batch into weekly rent rollups (see
+utils/rollups.py), which market_stats() queries over any range of weeks
+without rescanning listings; rebuild_rollups() recomputes them from the
+observations.
+
+find_duplicates() clusters stored listings that describe the same
+property (see utils/dedup.py) and records every non-canonical member in
+the duplicates table; query() and rent_stats() leave those out when
+asked to dedupe.
+
+export_parquet() writes the observations as columnar Parquet partitioned
+by site and scrape date; it needs the optional pyarrow package.
+"""
+
+import math
+import os
+import sqlite3
+import statistics
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.data_cleaner import extract_postcode_district
+from utils.dedup import DEFAULT_THRESHOLD, find_clusters, listing_id as dedup_listing_id
+from utils.rollups import RentRollups, DEFAULT_QUANTILES
+
+DEFAULT_STORE_DB = 'listings.db'
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    key TEXT NOT NULL UNIQUE,
+    url TEXT,
+    address TEXT,
+    monthly_price REAL,
+    property_type TEXT,
+    size_sqm REAL,
+    latitude REAL,
+    longitude REAL,
+    deposit REAL,
+    available_from TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    enriched_at TEXT
+);
+CREATE INDEX IF NOT EXISTS listings_price ON listings (monthly_price);
+CREATE INDEX IF NOT EXISTS listings_type_price ON listings (property_type, monthly_price);
+CREATE INDEX IF NOT EXISTS listings_site_seen ON listings (site, last_seen);
+CREATE TABLE IF NOT EXISTS observations (
+    listing_id INTEGER NOT NULL REFERENCES listings (id),
+    scrape_date TEXT NOT NULL,
+    monthly_price REAL,
+    available_from TEXT,
+    PRIMARY KEY (listing_id, scrape_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS duplicates (
+    key TEXT PRIMARY KEY,
+    canonical_key TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Listings not recorded as a duplicate of another
+NOT_DUPLICATE = "NOT EXISTS (SELECT 1 FROM duplicates d WHERE d.key = l.key)"
+
+# Listing columns compared when looking for duplicates
+DEDUP_COLUMNS = ("key", "url", "address", "monthly_price", "property_type", "size_sqm",
+                 "latitude", "longitude", "available_from")
+
+GEO_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS listings_geo USING rtree (
+    id, min_lat, max_lat, min_lng, max_lng
+);
+"""
+
+# Used instead of the R-tree where SQLite was built without it
+GEO_FALLBACK_SCHEMA = """
+CREATE INDEX IF NOT EXISTS listings_lat_lng ON listings (latitude, longitude);
+"""
+
+COLUMNS = ("url", "address", "monthly_price", "property_type", "size_sqm",
+           "latitude", "longitude", "deposit", "available_from")
+
+# Card values for these are often missing; a re-scrape must not erase what
+# detail-page enrichment filled in (coordinates of 0 count as missing)
+KEEP_STORED = {
+    "size_sqm": "COALESCE(excluded.size_sqm, size_sqm)",
+    "available_from": "COALESCE(excluded.available_from, available_from)",
+    "latitude": "CASE WHEN COALESCE(excluded.latitude, 0) = 0 THEN latitude ELSE excluded.latitude END",
+    "longitude": "CASE WHEN COALESCE(excluded.longitude, 0) = 0 THEN longitude ELSE excluded.longitude END",
+}
+
+
+def listing_key(site: str, listing: Dict) -> str:
+    """Stable identity of a listing: its URL, or site+address when it has none"""
+    return listing.get('url') or f"{site}:{listing.get('address') or ''}"
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def radius_bbox(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle around lat,lng"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+class ListingStore:
+    def __init__(self, path: str = DEFAULT_STORE_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(listings)")}
+        if 'enriched_at' not in columns:
+            self._conn.execute("ALTER TABLE listings ADD COLUMN enriched_at TEXT")
+        try:
+            self._conn.executescript(GEO_SCHEMA)
+            self.has_rtree = True
+        except sqlite3.OperationalError:
+            self._conn.executescript(GEO_FALLBACK_SCHEMA)
+            self.has_rtree = False
+        self.rollups = RentRollups(self._conn)
+        self._lock = threading.Lock()
+        if self.rollups.is_empty() and self.count():
+            # A store from before the rollups existed
+            self.rebuild_rollups()
+
+    def upsert(self, site: str, listings: List[Dict], seen_at: datetime = None) -> int:
+        """Insert or update listings and record today's observation of each"""
+        seen_at = seen_at or datetime.now()
+        now = seen_at.isoformat()
+        scrape_date = seen_at.date().isoformat()
+        with self._lock, self._conn:
+            keyed = []
+            for listing in listings:
+                key = listing_key(site, listing)
+                values = [listing.get(column) for column in COLUMNS]
+                listing_id, lat, lng, size_sqm = self._conn.execute(
+                    f"INSERT INTO listings (site, key, {', '.join(COLUMNS)}, first_seen, last_seen) "
+                    f"VALUES (?, ?, {', '.join('?' * len(COLUMNS))}, ?, ?) "
+                    f"ON CONFLICT (key) DO UPDATE SET "
+                    f"{', '.join(f'{column} = ' + KEEP_STORED.get(column, f'excluded.{column}') for column in COLUMNS)}, "
+                    f"last_seen = excluded.last_seen "
+                    f"RETURNING id, latitude, longitude, size_sqm",
+                    [site, key, *values, now, now]
+                ).fetchone()
+                # Roll up with the size enrichment may have stored where the card has none
+                keyed.append((key, listing if size_sqm == listing.get('size_sqm')
+                              else {**listing, 'size_sqm': size_sqm}))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO observations (listing_id, scrape_date, monthly_price, available_from) "
+                    "VALUES (?, ?, ?, ?)",
+                    (listing_id, scrape_date, listing.get('monthly_price'), listing.get('available_from'))
+                )
+                self._index_location(listing_id, lat, lng)
+            self.rollups.add(site, keyed, seen_at)
+        return len(listings)
+
+    def lookup(self, site: str, listings: List[Dict]) -> Dict[str, Dict]:
+        """Stored rows of the given listings by key (missing ones are new)"""
+        keys = [listing_key(site, listing) for listing in listings]
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            return {row['key']: dict(row) for row in self._conn.execute(
+                f"SELECT * FROM listings WHERE key IN ({placeholders})", keys)}
+
+    def enrich(self, site: str, listing: Dict, fields: Dict) -> bool:
+        """
+        Fill a stored listing's missing fields from its detail page and mark
+        it enriched. Values already stored are kept. A size new to this
+        week's rollups is added to its cell's rent per sqm.
+        """
+        enriched_at = datetime.now()
+        now = enriched_at.isoformat()
+        key = listing_key(site, listing)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "UPDATE listings SET "
+                "size_sqm = COALESCE(size_sqm, ?), available_from = COALESCE(available_from, ?), "
+                "latitude = CASE WHEN COALESCE(latitude, 0) = 0 THEN ? ELSE latitude END, "
+                "longitude = CASE WHEN COALESCE(longitude, 0) = 0 THEN ? ELSE longitude END, "
+                "enriched_at = ? WHERE key = ? RETURNING id, latitude, longitude, size_sqm",
+                (fields.get('size_sqm'), fields.get('available_from'),
+                 fields.get('latitude'), fields.get('longitude'), now, key)
+            ).fetchone()
+            if row is None:
+                return False
+            listing_id, lat, lng, size_sqm = row
+            self._index_location(listing_id, lat, lng)
+            self.rollups.add_size(key, size_sqm, enriched_at)
+        return True
+
+    def _index_location(self, listing_id, lat, lng):
+        """Keep the R-tree entry of a listing in step with its coordinates (lock held)"""
+        if not self.has_rtree:
+            return
+        self._conn.execute("DELETE FROM listings_geo WHERE id = ?", (listing_id,))
+        if lat or lng:
+            self._conn.execute("INSERT INTO listings_geo VALUES (?, ?, ?, ?, ?)",
+                               (listing_id, lat, lat, lng, lng))
+
+    def query(self, site: str = None, min_price: float = None, max_price: float = None,
+              property_type: str = None, min_size: float = None, max_size: float = None,
+              bbox: Tuple[float, float, float, float] = None,
+              near: Tuple[float, float, float] = None,
+              available_from: str = None, seen_since: str = None,
+              after: Tuple[float, int] = None, dedupe: bool = False,
+              limit: Optional[int] = 100) -> List[Dict]:
+        """
+        Listings matching every given filter, cheapest first.
+
+        bbox is (min_lat, max_lat, min_lng, max_lng); near is
+        (lat, lng, radius_km), and results within a radius carry a
+        distance_km and are ordered by it instead. after is the
+        (monthly_price, id) of the last row of the previous page, for
+        keyset pagination of non-radius queries; listings without a price
+        come first, and a page ending on one has a monthly_price of None. dedupe leaves out
+        listings find_duplicates() recorded as duplicates.
+        """
+        clauses, params = [], []
+        if dedupe:
+            clauses.append(NOT_DUPLICATE)
+        for clause, value in (("l.site = ?", site),
+                              ("l.monthly_price >= ?", min_price),
+                              ("l.monthly_price <= ?", max_price),
+                              ("l.property_type = ?", property_type),
+                              ("l.size_sqm >= ?", min_size),
+                              ("l.size_sqm <= ?", max_size),
+                              ("l.available_from = ?", available_from),
+                              ("l.last_seen >= ?", seen_since)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if after is not None and near is None:
+            after_price, after_id = after
+            if after_price is None:
+                # Listings without a price sort first: the rest of those, then all priced ones
+                clauses.append("(l.monthly_price IS NOT NULL OR l.id > ?)")
+                params.append(after_id)
+            else:
+                clauses.append("(l.monthly_price, l.id) > (?, ?)")
+                params.extend(after)
+
+        if near is not None:
+            bbox = radius_bbox(*near)
+        join = ""
+        if bbox is not None:
+            min_lat, max_lat, min_lng, max_lng = bbox
+            if self.has_rtree:
+                join = "JOIN listings_geo g ON g.id = l.id"
+                clauses.append("g.min_lat >= ? AND g.max_lat <= ? AND g.min_lng >= ? AND g.max_lng <= ?")
+            else:
+                clauses.append("l.latitude BETWEEN ? AND ? AND l.longitude BETWEEN ? AND ?")
+            params.extend((min_lat, max_lat, min_lng, max_lng))
+
+        sql = f"SELECT l.* FROM listings l {join}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY l.monthly_price, l.id"
+        # The radius filter runs after the SQL, so the limit is applied there too
+        if limit is not None and near is None:
+            sql += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(sql, params)]
+        if near is None:
+            return rows
+
+        lat, lng, radius_km = near
+        within = []
+        for row in rows:
+            row['distance_km'] = haversine_km(lat, lng, row['latitude'], row['longitude'])
+            if row['distance_km'] <= radius_km:
+                within.append(row)
+        within.sort(key=lambda row: row['distance_km'])
+        return within if limit is None else within[:limit]
+
+    def rent_stats(self, by: Tuple[str, ...] = ('area', 'property_type'), site: str = None,
+                   seen_since: str = None, dedupe: bool = False) -> List[Dict]:
+        """
+        Listing count and median monthly rent per group. Groups are any of
+        area (the address's postcode district), property_type and site.
+        dedupe counts each property once, by its canonical listing.
+        """
+        clauses, params = ["l.monthly_price IS NOT NULL"], []
+        if site is not None:
+            clauses.append("l.site = ?")
+            params.append(site)
+        if seen_since is not None:
+            clauses.append("l.last_seen >= ?")
+            params.append(seen_since)
+        if dedupe:
+            clauses.append(NOT_DUPLICATE)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT l.site, l.address, l.property_type, l.monthly_price FROM listings l "
+                f"WHERE {' AND '.join(clauses)}", params
+            ).fetchall()
+
+        groups = defaultdict(list)
+        for row in rows:
+            values = {'site': row['site'], 'property_type': row['property_type'],
+                      'area': extract_postcode_district(row['address'])}
+            groups[tuple(values[field] for field in by)].append(row['monthly_price'])
+        return [
+            {**dict(zip(by, group)), 'count': len(prices), 'median_rent': statistics.median(prices)}
+            for group, prices in sorted(groups.items(), key=lambda item: tuple(str(v) for v in item[0]))
+        ]
+
+    def market_stats(self, by: Tuple[str, ...] = ('area', 'property_type'), since: str = None,
+                     until: str = None, site: str = None, area: str = None, property_type: str = None,
+                     quantiles: Tuple[float, ...] = DEFAULT_QUANTILES) -> List[Dict]:
+        """
+        Rent and rent per sqm (count, mean, quantiles) per group over the
+        weeks from since to until, from the rollups. Groups are any of
+        week, site, area and property_type.
+        """
+        with self._lock:
+            return self.rollups.query(by=by, since=since, until=until, site=site, area=area,
+                                      property_type=property_type, quantiles=quantiles)
+
+    def find_duplicates(self, seen_since: str = None, threshold: float = DEFAULT_THRESHOLD) -> int:
+        """
+        Cluster the listings seen since seen_since (all by default) that
+        look like the same property, across sites and agents, and replace
+        the recorded duplicates with the non-canonical member of each.
+        Returns how many listings are duplicates.
+        """
+        sql = f"SELECT {', '.join(DEDUP_COLUMNS)} FROM listings"
+        params = []
+        if seen_since is not None:
+            sql += " WHERE last_seen >= ?"
+            params.append(seen_since)
+        with self._lock:
+            listings = [dict(row) for row in self._conn.execute(sql, params)]
+        clusters = find_clusters(listings, threshold=threshold)
+        # Cluster members are identified by URL, or by position when there is none
+        key_of = {dedup_listing_id(listing, index): listing['key'] for index, listing in enumerate(listings)}
+        rows = [(key_of[member], key_of[cluster['canonical_id']])
+                for cluster in clusters for member in cluster['member_ids']
+                if member != cluster['canonical_id']]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM duplicates")
+            self._conn.executemany("INSERT INTO duplicates VALUES (?, ?)", rows)
+        return len(rows)
+
+    def rebuild_rollups(self) -> int:
+        """Recompute the rollups from every stored observation, returning how many were counted"""
+        by_date = defaultdict(lambda: defaultdict(list))
+        for row in self.iter_observations():
+            by_date[row['scrape_date']][row['site']].append((listing_key(row['site'], row), row))
+        added = 0
+        with self._lock, self._conn:
+            self.rollups.clear()
+            for scrape_date in sorted(by_date):
+                for site, keyed in by_date[scrape_date].items():
+                    added += self.rollups.add(site, keyed, scrape_date)
+        return added
+
+    def version(self) -> str:
+        """Changes whenever the database file is written, e.g. by a finished scrape"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return "0"
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def history(self, url: str) -> List[Dict]:
+        """Every observation of one listing, oldest first"""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(
+                "SELECT o.scrape_date, o.monthly_price, o.available_from "
+                "FROM observations o JOIN listings l ON l.id = o.listing_id "
+                "WHERE l.key = ? ORDER BY o.scrape_date", (url,)
+            )]
+
+    def iter_observations(self, since: str = None) -> Iterable[Dict]:
+        """One row per listing per scrape date, with the listing's latest details"""
+        sql = ("SELECT l.site, o.scrape_date, l.url, l.address, o.monthly_price, l.property_type, "
+               "l.size_sqm, l.latitude, l.longitude, l.deposit, o.available_from "
+               "FROM observations o JOIN listings l ON l.id = o.listing_id")
+        params = []
+        if since is not None:
+            sql += " WHERE o.scrape_date >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for row in rows:
+            yield dict(row)
+
+    def export_parquet(self, out_dir: str, since: str = None) -> int:
+        """
+        Write observations to out_dir as Parquet partitioned by site and
+        scrape_date (hive layout, site=.../scrape_date=...). Returns the
+        number of rows written.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+        rows = list(self.iter_observations(since))
+        if not rows:
+            return 0
+        table = pa.Table.from_pylist(rows)
+        pq.write_to_dataset(table, root_path=out_dir, partition_cols=['site', 'scrape_date'],
+                            existing_data_behavior='delete_matching')
+        return len(rows)
+
+    def count(self, site: str = None) -> int:
+        with self._lock:
+            if site is None:
+                return self._conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM listings WHERE site = ?", (site,)).fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class StoreSink:
+    """
+    Sink interface over a ListingStore, upserting in batches of flush_every.
+    An optional enricher is offered each batch once it is stored, along with
+    what was stored for those listings before.
+    """
+
+    def __init__(self, store: ListingStore, site: str, flush_every: int = 100, enricher=None):
+        self.store = store
+        self.site = site
+        self.flush_every = flush_every or 100
+        self.enricher = enricher
+        self.count = 0
+        self._pending = []
+
+    def write(self, listing):
+        self._pending.append(listing)
+        self.count += 1
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def write_all(self, listings):
+        for listing in listings:
+            self.write(listing)
+        return self.count
+
+    def flush(self):
+        if self._pending:
+            previous = self.store.lookup(self.site, self._pending) if self.enricher else None
+            self.store.upsert(self.site, self._pending)
+            if self.enricher:
+                for listing in self._pending:
+                    self.enricher.offer(listing, previous.get(listing_key(self.site, listing)))
+            self._pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,20 +1,82 @@
 import requests
-from twocaptcha import TwoCaptcha
+import heapq
+import re
 import time
-import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from typing import Dict, Optional, List
 import logging
-from datetime import datetime, timedelta
+from urllib.parse import urlparse
 from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from utils.host_scheduler import (RateLimiter, get_shared_scheduler, parse_retry_after,
+                                  OK, THROTTLED, CAPTCHA, BLOCKED, ERROR)
+from utils.response_cache import ResponseCache
+from utils.telemetry import get_metrics
+
+# This is a simplified example - adjust based on actual HTML structure
+CAPTCHA_KEY_RE = re.compile(r'data-sitekey="([^"]+)"')
+
+# reCAPTCHA v2 tokens are accepted for two minutes after solving
+DEFAULT_TOKEN_TTL = 110
+# Longest a page stays parked waiting for its CAPTCHA to be solved
+DEFAULT_SOLVE_TIMEOUT = 180
+DEFAULT_SOLVER_WORKERS = 2
+# Attempts per request, counting the first; waits between them come from the HostScheduler
+DEFAULT_MAX_ATTEMPTS = 3
+
+class ProxyHealth:
+    """Rolling health of a single proxy"""
+    __slots__ = ('key', 'proxy', 'proxies', 'latency', 'success_rate', 'consecutive_failures',
+                 'in_flight', 'cooldown_until', 'version')
+
+    def __init__(self, key: str, proxy: Dict[str, str], initial_latency: float):
+        self.key = key
+        self.proxy = proxy
+        proxy_auth = f"{proxy['username']}:{proxy['password']}"
+        self.proxies = {
+            "http": f"http://{proxy_auth}@{proxy['host']}:{proxy['port']}",
+            "https": f"http://{proxy_auth}@{proxy['host']}:{proxy['port']}"
+        }
+        # Unknown proxies start with an optimistic latency so they get tried
+        self.latency = initial_latency
+        self.success_rate = 1.0
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        # Bumped on every change; heap entries with an old version are stale
+        self.version = 0
+
+    def score(self) -> float:
+        """Expected cost of the next request: lower is better"""
+        return self.latency * (1 + self.in_flight) / max(self.success_rate, 0.05)
+
 
 class ProxyRotator:
+    """
+    Proxy pool that picks the fastest healthy proxy.
+
+    Healthy proxies sit in a min-heap keyed by ProxyHealth.score() (rolling
+    latency, success rate and current load); proxies that fail max_failures
+    times in a row move to a cooldown heap keyed by expiry and rejoin the
+    pool automatically once cooldown_minutes have passed. Selection and
+    updates are O(log n); stale heap entries are skipped lazily.
+    """
+
     def __init__(self, proxy_list: List[Dict[str, str]] = None):
         self.proxy_list = proxy_list or self._get_default_proxies()
-        self.proxy_failures = {}
-        self.proxy_last_used = {}
         self.max_failures = 3
         self.cooldown_minutes = 10
+        self.latency_alpha = 0.3
+        self._lock = threading.Lock()
+        self._healthy = []
+        self._cooling = []
+        self._by_key = {}
+        self._by_url = {}
+        for proxy in self.proxy_list:
+            health = ProxyHealth(self.proxy_key(proxy), proxy, initial_latency=1.0)
+            self._by_key[health.key] = health
+            self._by_url[health.proxies['https']] = health
+            self._push(health)
 
     def _get_default_proxies(self) -> List[Dict[str, str]]:
         """Configure multiple proxy services"""
@@ -36,145 +98,371 @@ class ProxyRotator:
         proxies.extend([bright_data, iproyal])
         return proxies
 
-    def get_proxy(self) -> Dict[str, str]:
-        """Get least recently used working proxy"""
-        available_proxies = [p for p in self.proxy_list 
-                           if self.proxy_failures.get(str(p), 0) < self.max_failures]
-        
-        if not available_proxies:
-            raise Exception("No working proxies available")
+    @staticmethod
+    def proxy_key(proxy: Dict[str, str]) -> str:
+        return f"{proxy['username']}@{proxy['host']}:{proxy['port']}"
 
-        # Sort by last used time (or never used)
-        available_proxies.sort(
-            key=lambda p: self.proxy_last_used.get(str(p), datetime.min)
-        )
-        
-        proxy = available_proxies[0]
-        self.proxy_last_used[str(proxy)] = datetime.now()
-        
-        proxy_auth = f"{proxy['username']}:{proxy['password']}"
-        return {
-            "http": f"http://{proxy_auth}@{proxy['host']}:{proxy['port']}",
-            "https": f"http://{proxy_auth}@{proxy['host']}:{proxy['port']}"
-        }
+    def key_of(self, proxy: Dict[str, str]) -> Optional[str]:
+        """proxy_key of a raw proxy_list entry or of the formatted dict get_proxy handed out"""
+        health = self._lookup(proxy)
+        return health.key if health else None
+
+    def proxy_label(self, proxy: Dict[str, str]) -> str:
+        """host:port of a proxy, for metrics (no credentials)"""
+        health = self._lookup(proxy)
+        return f"{health.proxy['host']}:{health.proxy['port']}" if health else 'unknown'
+
+    def get_proxy(self, prefer: Dict[str, str] = None) -> Dict[str, str]:
+        """Get the fastest healthy proxy (or prefer, if still healthy), formatted for requests"""
+        with self._lock:
+            self._recover_cooled(time.monotonic())
+            health = self._lookup(prefer) if prefer else None
+            if health is not None and not health.cooldown_until:
+                health.in_flight += 1
+                self._push(health)
+                return health.proxies
+            while self._healthy:
+                _, version, key = heapq.heappop(self._healthy)
+                health = self._by_key[key]
+                if version != health.version:
+                    continue
+                health.in_flight += 1
+                self._push(health)
+                return health.proxies
+        raise Exception("No working proxies available")
+
+    def mark_proxy_success(self, proxy: Dict[str, str], latency: float):
+        """Record a completed request and its round-trip latency"""
+        with self._lock:
+            health = self._lookup(proxy)
+            if health is None:
+                return
+            health.in_flight = max(0, health.in_flight - 1)
+            health.latency += self.latency_alpha * (latency - health.latency)
+            health.success_rate += self.latency_alpha * (1.0 - health.success_rate)
+            health.consecutive_failures = 0
+            if not health.cooldown_until:
+                self._push(health)
 
     def mark_proxy_failure(self, proxy: Dict[str, str]):
-        """Track proxy failures"""
-        proxy_key = str(proxy)
-        self.proxy_failures[proxy_key] = self.proxy_failures.get(proxy_key, 0) + 1
-        if self.proxy_failures[proxy_key] >= self.max_failures:
-            logging.warning(f"Proxy {proxy['host']} exceeded failure threshold")
-
-class RateLimiter:
-    def __init__(self, requests_per_minute: int = 20):
-        self.requests_per_minute = requests_per_minute
-        self.requests = []
-        
-    def wait_if_needed(self):
-        """Implement rate limiting"""
-        now = datetime.now()
-        minute_ago = now - timedelta(minutes=1)
-        
-        # Remove requests older than 1 minute
-        self.requests = [req_time for req_time in self.requests if req_time > minute_ago]
-        
-        if len(self.requests) >= self.requests_per_minute:
-            sleep_time = (self.requests[0] - minute_ago).total_seconds()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-            self.requests = self.requests[1:]
-        
-        self.requests.append(now)
+        """Track proxy failures, cooling the proxy down after max_failures in a row"""
+        with self._lock:
+            health = self._lookup(proxy)
+            if health is None:
+                return
+            health.in_flight = max(0, health.in_flight - 1)
+            health.success_rate -= self.latency_alpha * health.success_rate
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.max_failures and not health.cooldown_until:
+                logging.warning(f"Proxy {health.proxy['host']} exceeded failure threshold, "
+                                f"cooling down for {self.cooldown_minutes} minutes")
+                health.cooldown_until = time.monotonic() + self.cooldown_minutes * 60
+                health.version += 1
+                heapq.heappush(self._cooling, (health.cooldown_until, health.key))
+            elif not health.cooldown_until:
+                self._push(health)
 
-class ProxyCaptchaHandler:
-    def __init__(self, two_captcha_key: str):
-        self.solver = TwoCaptcha(two_captcha_key)
-        self.proxy_rotator = ProxyRotator()
-        self.rate_limiter = RateLimiter()
-        
-        # Configure retry strategy
-        self.retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-        )
-        self.adapter = HTTPAdapter(max_retries=self.retry_strategy)
-        
-        # Configure session
-        self.session = requests.Session()
-        self.session.mount("https://", self.adapter)
-        self.session.mount("http://", self.adapter)
+    def _lookup(self, proxy: Dict[str, str]) -> Optional[ProxyHealth]:
+        # Accept both the formatted {"http": ..., "https": ...} dict handed out
+        # by get_proxy and a raw proxy_list entry
+        if 'https' in proxy:
+            return self._by_url.get(proxy['https'])
+        return self._by_key.get(self.proxy_key(proxy))
+
+    def _push(self, health: ProxyHealth):
+        health.version += 1
+        heapq.heappush(self._healthy, (health.score(), health.version, health.key))
+        if len(self._healthy) > 4 * len(self._by_key) + 16:
+            # Drop stale entries; amortised O(1) per push
+            self._healthy = [(h.score(), h.version, h.key) for h in self._by_key.values()
+                             if not h.cooldown_until]
+            heapq.heapify(self._healthy)
+
+    def _recover_cooled(self, now: float):
+        while self._cooling and self._cooling[0][0] <= now:
+            _, key = heapq.heappop(self._cooling)
+            health = self._by_key[key]
+            logging.info(f"Proxy {health.proxy['host']} back in rotation after cooldown")
+            health.cooldown_until = 0.0
+            health.consecutive_failures = 0
+            health.success_rate = max(health.success_rate, 0.5)
+            self._push(health)
+
+class TwoCaptchaSolver:
+    """
+    The 2captcha client, imported and built on the first solve: the import
+    is slow and most runs never meet a CAPTCHA.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def recaptcha(self, **kwargs) -> Dict:
+        with self._lock:
+            if self._client is None:
+                from twocaptcha import TwoCaptcha
+                self._client = TwoCaptcha(self.api_key)
+        return self._client.recaptcha(**kwargs)
 
-    def solve_captcha(self, site_key: str, url: str) -> Optional[str]:
-        """Solve CAPTCHA using 2captcha service"""
+
+class FakeSolver:
+    """
+    Local stand-in for the 2captcha client: "solves" after delay seconds
+    with a numbered token (or fails), for tests and offline benchmarks.
+    """
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.solved = 0
+        self._lock = threading.Lock()
+
+    def recaptcha(self, sitekey: str, url: str, **kwargs) -> Dict:
+        time.sleep(self.delay)
+        if self.fail:
+            raise Exception("FakeSolver set to fail")
+        with self._lock:
+            self.solved += 1
+            return {'code': f'fake-token-{self.solved}'}
+
+
+class CaptchaSolverPool:
+    """
+    Background CAPTCHA solving on a small thread pool.
+
+    Solves are keyed by (host, proxy), proxy being the rotator's proxy_key
+    (gateway usernames pick the exit IP, so host:port alone does not tell
+    proxies apart): a challenge is solved once however many pages hit it
+    through that proxy at the same time, and the token is reused for that
+    proxy until it expires. Callers get a Future, so a
+    blocked page waits on its own token while other pages keep crawling.
+    """
+
+    def __init__(self, solver, workers: int = DEFAULT_SOLVER_WORKERS, token_ttl: float = DEFAULT_TOKEN_TTL):
+        self.solver = solver
+        self.token_ttl = token_ttl
+        self.metrics = get_metrics()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='captcha')
+        self._tokens = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def token(self, host: str, proxy: str) -> Optional[str]:
+        """Unexpired token solved for host through proxy, if any"""
+        with self._lock:
+            token, expires = self._tokens.get((host, proxy), (None, 0.0))
+            return token if expires > time.monotonic() else None
+
+    def invalidate(self, host: str, proxy: str, token: str):
+        """Forget a token the site rejected"""
+        with self._lock:
+            if self._tokens.get((host, proxy), (None,))[0] == token:
+                del self._tokens[(host, proxy)]
+
+    def solve(self, site_key: str, url: str, proxy: str) -> Future:
+        """Future token for url's CAPTCHA through proxy, sharing any solve already under way"""
+        key = (urlparse(url).netloc, proxy)
+        with self._lock:
+            token, expires = self._tokens.get(key, (None, 0.0))
+            if expires > time.monotonic():
+                done = Future()
+                done.set_result(token)
+                return done
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(self._solve, key, site_key, url)
+            return future
+
+    def _solve(self, key, site_key: str, url: str) -> Optional[str]:
+        host = key[0]
+        token = None
         try:
-            result = self.solver.recaptcha(
-                sitekey=site_key,
-                url=url,
-                version='v2',
-                enterprise=0
-            )
-            return result['code']
+            with self.metrics.timer('scrape_captcha_solve_seconds', host=host):
+                result = self.solver.recaptcha(
+                    sitekey=site_key,
+                    url=url,
+                    version='v2',
+                    enterprise=0
+                )
+            token = result['code']
+            self.metrics.inc('scrape_captchas_total', host=host, outcome='solved')
         except Exception as e:
             logging.error(f"CAPTCHA solving failed: {e}")
+            self.metrics.inc('scrape_captchas_total', host=host, outcome='failed')
+        with self._lock:
+            self._pending.pop(key, None)
+            if token:
+                self._tokens[key] = (token, time.monotonic() + self.token_ttl)
+        return token
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProxyCaptchaHandler:
+    def __init__(self, two_captcha_key: str, cache: ResponseCache = None, pool_size: int = 16,
+                 solver=None, solver_workers: int = DEFAULT_SOLVER_WORKERS,
+                 solve_timeout: float = DEFAULT_SOLVE_TIMEOUT):
+        # solver defaults to the 2captcha client; pass a FakeSolver to test offline
+        self.solver = solver if solver is not None else TwoCaptchaSolver(two_captcha_key)
+        self.captcha_pool = CaptchaSolverPool(self.solver, workers=solver_workers)
+        self.solve_timeout = solve_timeout
+        # Optional on-disk response cache (see utils/response_cache.py)
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.proxy_rotator = ProxyRotator()
+        # Owns pacing and retries' timing for every host (see utils/host_scheduler.py)
+        self.scheduler = get_shared_scheduler()
+        self.max_attempts = DEFAULT_MAX_ATTEMPTS
+        self.metrics = get_metrics()
+
+        # One keep-alive session per host, created on first use
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._mounts = []
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self.scheduler.rate_limiter
+
+    def session_for(self, url: str) -> requests.Session:
+        """Pooled session for url's host, sized for concurrent page fetches"""
+        host = urlparse(url).netloc
+        with self._sessions_lock:
+            session = self._sessions.get(host)
+            if session is None:
+                # No transport-level retries: _request is the only retry loop
+                adapter = HTTPAdapter(max_retries=0, pool_connections=1, pool_maxsize=self.pool_size)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                for prefix, transport in self._mounts:
+                    session.mount(prefix, transport)
+                self._sessions[host] = session
+            return session
+
+    def mount(self, prefix: str, adapter):
+        """Mount a transport adapter on every per-host session, current and future"""
+        with self._sessions_lock:
+            self._mounts.append((prefix, adapter))
+            for session in self._sessions.values():
+                session.mount(prefix, adapter)
+
+    def solve_captcha(self, site_key: str, url: str, proxy: str = '') -> Optional[str]:
+        """Solve CAPTCHA using 2captcha service, waiting up to solve_timeout for the solver pool"""
+        try:
+            return self.captcha_pool.solve(site_key, url, proxy).result(timeout=self.solve_timeout)
+        except FutureTimeout:
+            logging.error(f"CAPTCHA not solved within {self.solve_timeout}s")
             return None
 
     def handle_request(self, url: str, params: Dict = None, headers: Dict = None) -> requests.Response:
-        """Make a request with proxy rotation and CAPTCHA handling"""
-        max_retries = 3
-        current_retry = 0
-        
-        while current_retry < max_retries:
+        """Make a request with proxy rotation and CAPTCHA handling, through the cache if enabled"""
+        if self.cache is None:
+            return self._request(url, params, headers)
+        return self.cache.fetch(
+            url, params,
+            lambda validators: self._request(url, dict(params or {}), {**(headers or {}), **validators})
+        )
+
+    def _request(self, url: str, params: Dict = None, headers: Dict = None) -> requests.Response:
+        attempt = 0
+        proxies = None
+        # A CAPTCHA token is only good for the IP that solved it, so its retry keeps the proxy
+        pinned = None
+        host = urlparse(url).netloc
+        scheduler = self.scheduler
+
+        def retry(outcome, retry_after=None):
+            nonlocal attempt
+            scheduler.record(host, outcome, retry_after)
+            attempt += 1
+            # A Retry-After pauses the host in the scheduler instead
+            if attempt < self.max_attempts and not retry_after:
+                time.sleep(scheduler.retry_delay(attempt))
+
+        while attempt < self.max_attempts:
             try:
-                # Apply rate limiting
-                self.rate_limiter.wait_if_needed()
-                
-                # Get proxy and make request
-                proxies = self.proxy_rotator.get_proxy()
-                response = self.session.get(
-                    url,
-                    params=params,
-                    headers=headers,
-                    proxies=proxies,
-                    timeout=30
-                )
+                # Wait for a slot, the rate budget and any Retry-After pause
+                with self.metrics.timer('scrape_rate_limit_wait_seconds', host=host):
+                    scheduler.acquire(host)
+                try:
+                    # Get proxy and make request
+                    proxies = self.proxy_rotator.get_proxy(pinned)
+                    pinned = None
+                    started = time.monotonic()
+                    response = self.session_for(url).get(
+                        url,
+                        params=params,
+                        headers=headers,
+                        proxies=proxies,
+                        timeout=30
+                    )
+                finally:
+                    scheduler.release(host)
+                latency = time.monotonic() - started
+                self.metrics.observe('scrape_request_seconds', latency,
+                                     host=host, proxy=self.proxy_rotator.proxy_label(proxies))
+                self.metrics.inc('scrape_responses_total', host=host, status=response.status_code)
                 
                 # Handle different types of blocking
+                if response.status_code == 403 and 'captcha' not in response.text.lower():
+                    logging.warning("IP possibly blocked, rotating proxy...")
+                    self.metrics.inc('scrape_blocked_total', host=host)
+                    self.proxy_rotator.mark_proxy_failure(proxies)
+                    retry(BLOCKED)
+                    continue
+
+                # The proxy got a response through, even if the page is challenged
+                self.proxy_rotator.mark_proxy_success(proxies, latency)
+
                 if response.status_code == 403:
-                    if 'captcha' in response.text.lower():
-                        logging.info("CAPTCHA detected, attempting to solve...")
+                    scheduler.record(host, CAPTCHA)
+                    proxy = self.proxy_rotator.key_of(proxies)
+                    sent_token = (params or {}).get('g-recaptcha-response')
+                    if sent_token:
+                        # The token did not get us through; solve afresh
+                        self.captcha_pool.invalidate(host, proxy, sent_token)
+                        attempt += 1
+                    captcha_token = self.captcha_pool.token(host, proxy)
+                    if captcha_token is None:
+                        # Park this page on the solver pool; other pages keep crawling meanwhile
+                        logging.info("CAPTCHA detected, waiting for the solver pool...")
                         site_key = self._extract_captcha_key(response.text)
-                        captcha_token = self.solve_captcha(site_key, url)
-                        
-                        if captcha_token:
-                            if params is None:
-                                params = {}
-                            params['g-recaptcha-response'] = captcha_token
-                            continue
-                    else:
-                        logging.warning("IP possibly blocked, rotating proxy...")
-                        self.proxy_rotator.mark_proxy_failure(proxies)
+                        captcha_token = self.solve_captcha(site_key, url, proxy)
+                    
+                    if captcha_token:
+                        params = {**(params or {}), 'g-recaptcha-response': captcha_token}
+                        pinned = proxies
                         continue
-                
-                # Success case
-                if response.status_code == 200:
+
+                # Success case (304 answers a conditional request from the cache)
+                if response.status_code in (200, 304):
+                    scheduler.record(host, OK)
                     return response
-                
+
+                if response.status_code in (429, 503):
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    logging.warning(f"{host} is throttling us ({response.status_code})")
+                    retry(THROTTLED, retry_after)
+                    continue
+
                 # Other error cases
                 logging.error(f"Request failed with status code: {response.status_code}")
-                current_retry += 1
+                retry(ERROR)
                 
             except requests.exceptions.RequestException as e:
                 logging.error(f"Request failed: {e}")
-                self.proxy_rotator.mark_proxy_failure(proxies)
-                current_retry += 1
-                time.sleep(random.uniform(2, 5))
+                self.metrics.inc('scrape_request_errors_total', host=host)
+                if proxies is not None:
+                    self.proxy_rotator.mark_proxy_failure(proxies)
+                retry(ERROR)
         
         raise Exception("Max retries exceeded")
 
     def _extract_captcha_key(self, html_content: str) -> str:
         """Extract reCAPTCHA site key from HTML"""
-        # This is a simplified example - adjust based on actual HTML structure
-        import re
-        match = re.search(r'data-sitekey="([^"]+)"', html_content)
+        match = CAPTCHA_KEY_RE.search(html_content)
         return match.group(1) if match else "SITE_KEY_HERE" 
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+LRU cache of rendered API responses, keyed by endpoint and query string.
+
+Entries are tagged with the data version they were computed from (see
+ListingStore.version), so a scrape landing new listings makes every older
+entry stale without explicit invalidation. The ETag of a response is
+derived from the same key and version, so clients polling with
+If-None-Match get a 304 until the data actually changes.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(key: str, version: str) -> str:
+        """Opaque (unquoted) entity tag for key at version"""
+        return hashlib.sha1(f"{version}|{key}".encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, key: str, version: str, compute: Callable[[], str]) -> Tuple[str, str]:
+        """(etag, body) for key at version, computing the body on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+        self.misses += 1
+        # Computed outside the lock; concurrent misses for one key just race to store
+        body = compute()
+        etag = self.etag(key, version)
+        with self._lock:
+            self._entries[key] = (version, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag, body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
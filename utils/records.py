@@ -0,0 +1,102 @@
+"""
+Compact listing records and column batches.
+
+A cleaned listing used to be a dict of ten string keys; Listing keeps the
+same fields in __slots__ with typed values (floats for the numbers, an
+interned property type, since a crawl has only a few dozen distinct
+ones) and no per-listing hash table; the field strings are most of what
+is left. It is a read-only Mapping, so
+everything that reads listings with .get() or ** keeps working, and the
+sinks write it without building a dict first.
+
+ListingBatch holds one page or backfill worth of listings as columns: the
+numeric fields in float64 arrays (NaN for missing), the text fields in
+lists. Cleaners produce it; iterating it yields Listing records.
+"""
+
+import sys
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+FIELDS = ("url", "address", "monthly_price", "property_type", "size_sqm",
+          "latitude", "longitude", "deposit", "available_from", "postcode")
+NUMERIC_FIELDS = ("monthly_price", "size_sqm", "latitude", "longitude", "deposit")
+# Coordinates are never missing in a cleaned batch: 0.0 stands for unknown
+COORDINATE_FIELDS = ("latitude", "longitude")
+
+
+@dataclass(eq=False)
+class Listing(Mapping):
+    __slots__ = FIELDS
+    url: Optional[str]
+    address: Optional[str]
+    monthly_price: Optional[float]
+    property_type: Optional[str]
+    size_sqm: Optional[float]
+    latitude: float
+    longitude: float
+    deposit: Optional[float]
+    available_from: Optional[str]
+    postcode: Optional[str]
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def row(self, fields: Sequence[str] = FIELDS) -> tuple:
+        """Values of fields in order, e.g. for a CSV row"""
+        return tuple(getattr(self, field) if field in FIELDS else None for field in fields)
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in FIELDS}
+
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if value != value else value for value in values.tolist()]
+
+
+class ListingBatch:
+    """Column-oriented listings: float64 arrays for numbers, lists for text"""
+
+    def __init__(self, columns: Dict[str, Sequence]):
+        size = len(next(iter(columns.values()))) if columns else 0
+        self.size = size
+        self.columns = {}
+        for field in FIELDS:
+            values = columns.get(field)
+            if values is None:
+                values = [None] * size
+            if field in NUMERIC_FIELDS:
+                self.columns[field] = np.array([np.nan if value is None else value for value in values],
+                                               dtype=np.float64) if not isinstance(values, np.ndarray) \
+                    else values.astype(np.float64)
+            elif field == 'property_type':
+                self.columns[field] = [sys.intern(value) if value else value for value in values]
+            else:
+                self.columns[field] = list(values)
+
+    def __len__(self):
+        return self.size
+
+    def column(self, field: str) -> list:
+        """One field as a Python list (missing numbers as None)"""
+        values = self.columns[field]
+        if field in COORDINATE_FIELDS:
+            return np.nan_to_num(values, nan=0.0).tolist()
+        return _nullable(values) if field in NUMERIC_FIELDS else list(values)
+
+    def __iter__(self) -> Iterator[Listing]:
+        return map(Listing, *(self.column(field) for field in FIELDS))
+
+    def listings(self) -> List[Listing]:
+        return list(self)
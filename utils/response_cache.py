@@ -0,0 +1,205 @@
+"""
+On-disk HTTP response cache for the scrapers' fetch path.
+
+Bodies are stored gzip-compressed, one file per key, with metadata (ETag,
+Last-Modified, size, access time) in a small SQLite index. Keys are the
+normalized URL plus query parameters. Fresh entries (younger than `ttl`)
+are served without touching the network; stale ones are revalidated with
+If-None-Match / If-Modified-Since where the server supplied validators.
+The least recently used entries are evicted once the cache exceeds
+`max_bytes`. In replay mode only the cache is consulted, so re-running a
+scrape during selector development costs no requests at all.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_CACHE_DIR = '.http_cache'
+DEFAULT_TTL = 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Per-request parameters that must not split the cache
+IGNORED_PARAMS = {'g-recaptcha-response'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    encoding TEXT,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+"""
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a request is not in the cache"""
+
+
+def normalize_url(url: str, params: Dict = None) -> str:
+    """Canonical form of url + params: lowercase host, sorted query, no fragment"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query.extend((k, str(v)) for k, v in (params or {}).items() if v is not None)
+    query = sorted((k, v) for k, v in query if k not in IGNORED_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/',
+                       urlencode(query), ''))
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES, replay: bool = False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Cache configured by HTTP_CACHE_DIR / HTTP_CACHE_TTL / HTTP_CACHE_REPLAY, or None"""
+        cache_dir = os.environ.get('HTTP_CACHE_DIR')
+        if not cache_dir:
+            return None
+        return cls(cache_dir,
+                   ttl=float(os.environ.get('HTTP_CACHE_TTL', DEFAULT_TTL)),
+                   replay=os.environ.get('HTTP_CACHE_REPLAY', '').lower() in ('1', 'true', 'yes'))
+
+    def fetch(self, url: str, params: Dict, send: Callable[[Dict], requests.Response]) -> requests.Response:
+        """
+        Serve url+params from the cache, or call send(extra_headers) to fetch
+        it. extra_headers carries conditional-request validators, and a 304
+        answer is turned back into the cached 200 response.
+        """
+        normalized = normalize_url(url, params)
+        key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        meta = self._meta(key)
+
+        if meta is not None and (self.replay or time.time() - meta['stored_at'] < self.ttl):
+            cached = self._load(key, meta)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        if self.replay:
+            raise CacheMiss(f"Not in cache: {normalized}")
+
+        validators = {}
+        if meta is not None:
+            if meta['etag']:
+                validators['If-None-Match'] = meta['etag']
+            if meta['last_modified']:
+                validators['If-Modified-Since'] = meta['last_modified']
+
+        response = send(validators)
+        if response.status_code == 304 and meta is not None:
+            cached = self._load(key, meta, refresh=True)
+            if cached is not None:
+                self.revalidated += 1
+                return cached
+        self.misses += 1
+        if response.status_code == 200:
+            self._store(key, normalized, response)
+        return response
+
+    def close(self):
+        self._conn.close()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.gz')
+
+    def _meta(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, encoding, content_type, etag, last_modified, stored_at FROM entries WHERE key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('url', 'encoding', 'content_type', 'etag', 'last_modified', 'stored_at'), row))
+
+    def _load(self, key, meta, refresh=False):
+        try:
+            with gzip.open(self._path(key), 'rb') as f:
+                body = f.read()
+        except (OSError, EOFError):
+            return None
+        now = time.time()
+        with self._lock, self._conn:
+            if refresh:
+                self._conn.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                                   (now, now, key))
+            else:
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = meta['url']
+        response.encoding = meta['encoding']
+        response.headers = CaseInsensitiveDict({'Content-Type': meta['content_type'] or 'text/html'})
+        response._content = body
+        response.from_cache = True
+        return response
+
+    def _store(self, key, normalized, response):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock, self._conn:
+            previous = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, url, encoding, content_type, etag, last_modified, size, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalized, response.encoding, response.headers.get('Content-Type'),
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                 size, now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes (lock held)"""
+        while self._total_bytes > self.max_bytes:
+            oldest = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 64").fetchall()
+            if not oldest:
+                self._total_bytes = 0
+                return
+            for key, size in oldest:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= size
+        logging.debug(f"Response cache at {self._total_bytes} bytes")
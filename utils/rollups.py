@@ -0,0 +1,315 @@
+"""
+Incremental rent rollups for market reports.
+
+Medians of £/month and £/sqm by postcode district, property type and
+week used to mean re-reading every listing ever scraped. RentRollups
+instead keeps one row per (week, site, district, property type) cell
+with counts, sums and two quantile sketches (monthly rent and rent per
+square metre), updated as each batch of listings is stored. A listing
+counts once per week however often it is scraped that week; if its size
+only arrives later that week (from its detail page, or a later card), it
+is then added to the cell's rent per square metre. Which listings were
+counted, and in which cell, is kept while a week is open: for
+DEFAULT_OPEN_WEEKS weeks behind the newest week ingested, so listings
+arriving out of order still count once. Listings for an older, closed
+week are not added (rebuild_rollups() folds in such backfills).
+
+The sketches are log-bucketed histograms (the DDSketch scheme): a value
+x falls in bucket ceil(log_gamma(x)), so any quantile read back is
+within relative_accuracy (1% by default) of a true sample quantile.
+Merging two sketches adds their bucket counts, so a query over any range
+of weeks merges the cells in range and never touches raw listings; a
+year of weekly cells answers in milliseconds.
+
+Weeks start on Monday; query windows are rounded out to whole weeks.
+"""
+
+import logging
+import math
+import sqlite3
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.data_cleaner import extract_postcode_district
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_QUANTILES = (0.5,)
+# Weeks behind the newest one ingested that still accept listings
+DEFAULT_OPEN_WEEKS = 8
+
+ROLLUP_GROUPS = ('week', 'site', 'area', 'property_type')
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rent_rollups (
+    week TEXT NOT NULL,
+    site TEXT NOT NULL,
+    area TEXT NOT NULL,
+    property_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    rent_sum REAL NOT NULL,
+    sized_count INTEGER NOT NULL,
+    per_sqm_sum REAL NOT NULL,
+    rent_sketch BLOB NOT NULL,
+    per_sqm_sketch BLOB NOT NULL,
+    PRIMARY KEY (week, site, area, property_type)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rolled_up (
+    key TEXT NOT NULL,
+    week TEXT NOT NULL,
+    site TEXT,
+    area TEXT,
+    property_type TEXT,
+    rent REAL,
+    sized INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, week)
+) WITHOUT ROWID;
+"""
+
+# Columns added to rolled_up since it was first created
+ROLLED_UP_COLUMNS = {
+    'site': 'TEXT', 'area': 'TEXT', 'property_type': 'TEXT', 'rent': 'REAL',
+    'sized': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+
+def week_of(day) -> str:
+    """ISO date of the Monday starting day's week (day: date, datetime or ISO string)"""
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    elif isinstance(day, datetime):
+        day = day.date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _positive(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 and math.isfinite(value) else None
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch over positive values with relative error
+    guarantees. Bucket counts are kept dense from the lowest to the
+    highest bucket used, which for rents is a few hundred at most.
+    """
+    __slots__ = ('gamma', 'offset', 'counts')
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, values: Iterable[float]):
+        values = np.asarray([value for value in values if value and value > 0], dtype=np.float64)
+        if not len(values):
+            return
+        buckets = np.ceil(np.log(values) / math.log(self.gamma)).astype(np.int64)
+        low = int(buckets.min())
+        self._add_counts(low, np.bincount(buckets - low))
+
+    def merge(self, other: 'QuantileSketch'):
+        if len(other.counts):
+            self._add_counts(other.offset, other.counts)
+
+    def _add_counts(self, offset: int, counts: np.ndarray):
+        if not len(self.counts):
+            self.offset, self.counts = offset, counts.astype(np.int64)
+            return
+        low = min(self.offset, offset)
+        high = max(self.offset + len(self.counts), offset + len(counts))
+        merged = np.zeros(high - low, dtype=np.int64)
+        merged[self.offset - low:self.offset - low + len(self.counts)] += self.counts
+        merged[offset - low:offset - low + len(counts)] += counts
+        self.offset, self.counts = low, merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1), or None if the sketch is empty"""
+        total = self.counts.sum()
+        if not total:
+            return None
+        # Same rank convention as a lower median: the ceil(q * n)-th smallest value
+        rank = max(1, math.ceil(q * total))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank)) + self.offset
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def to_bytes(self) -> bytes:
+        return np.int64(self.offset).tobytes() + self.counts.astype(np.uint32).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> 'QuantileSketch':
+        sketch = cls(relative_accuracy)
+        if data:
+            sketch.offset = int(np.frombuffer(data[:8], dtype=np.int64)[0])
+            sketch.counts = np.frombuffer(data[8:], dtype=np.uint32).astype(np.int64)
+        return sketch
+
+
+class RentRollups:
+    def __init__(self, conn: sqlite3.Connection, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 open_weeks: int = DEFAULT_OPEN_WEEKS):
+        """
+        conn is the ListingStore's connection: rollups are updated inside
+        the same transaction as the listings they summarize.
+        """
+        self._conn = conn
+        self.relative_accuracy = relative_accuracy
+        self.open_weeks = open_weeks
+        self._conn.executescript(ROLLUP_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(rolled_up)")}
+        for column, kind in ROLLED_UP_COLUMNS.items():
+            if column not in columns:
+                # Rows from before have no cell, so a late size cannot be added for them
+                self._conn.execute(f"ALTER TABLE rolled_up ADD COLUMN {column} {kind}")
+
+    def add(self, site: str, listings: Sequence[Tuple[str, Dict]], seen_at) -> int:
+        """
+        Fold (key, listing) pairs seen at seen_at into their week's cells,
+        skipping listings already counted that week (but adding a size they
+        were counted without). Returns how many were added. Does not commit.
+        """
+        week = week_of(seen_at)
+        newest = self._conn.execute("SELECT MAX(week) FROM rolled_up").fetchone()[0]
+        oldest_open = self._oldest_open(max(week, newest or week))
+        if week < oldest_open:
+            # Its membership is gone, so listings already counted cannot be told apart
+            logging.warning(f"Week of {week} is closed, not rolling up {len(listings)} {site} listings; "
+                            f"rebuild_rollups() to include them")
+            return 0
+        self._conn.execute("DELETE FROM rolled_up WHERE week < ?", (oldest_open,))
+        cells = defaultdict(lambda: ([], []))
+        added = 0
+        for key, listing in listings:
+            rent = _positive(listing.get('monthly_price'))
+            if rent is None:
+                continue
+            size = _positive(listing.get('size_sqm'))
+            cell = (site, extract_postcode_district(listing.get('address')) or '',
+                    listing.get('property_type') or '')
+            if self._conn.execute(
+                    "INSERT OR IGNORE INTO rolled_up VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, week, *cell, rent, size is not None)).rowcount == 0:
+                if size is not None:
+                    self._add_late_size(cells, key, week, size)
+                continue
+            added += 1
+            rents, per_sqm = cells[cell]
+            rents.append(rent)
+            if size is not None:
+                per_sqm.append(rent / size)
+        self._fold(week, cells)
+        return added
+
+    def add_size(self, key: str, size_sqm, seen_at):
+        """
+        Add the rent per sqm of a listing counted in seen_at's week without
+        a size, now that its size is known. Does not commit.
+        """
+        size = _positive(size_sqm)
+        if size is None:
+            return
+        week = week_of(seen_at)
+        cells = defaultdict(lambda: ([], []))
+        self._add_late_size(cells, key, week, size)
+        self._fold(week, cells)
+
+    def _oldest_open(self, newest: str) -> str:
+        return (date.fromisoformat(newest) - timedelta(weeks=self.open_weeks)).isoformat()
+
+    def _add_late_size(self, cells, key: str, week: str, size: float):
+        row = self._conn.execute(
+            "UPDATE rolled_up SET sized = 1 WHERE key = ? AND week = ? AND sized = 0 AND rent IS NOT NULL "
+            "RETURNING site, area, property_type, rent", (key, week)
+        ).fetchone()
+        if row is not None:
+            cells[(row[0], row[1], row[2])][1].append(row[3] / size)
+
+    def _fold(self, week: str, cells: Dict[Tuple[str, str, str], Tuple[List[float], List[float]]]):
+        """Add (rents, rents per sqm) to each (site, area, property_type) cell of week"""
+        for (site, area, property_type), (rents, per_sqm) in cells.items():
+            row = self._conn.execute(
+                "SELECT count, rent_sum, sized_count, per_sqm_sum, rent_sketch, per_sqm_sketch "
+                "FROM rent_rollups WHERE week = ? AND site = ? AND area = ? AND property_type = ?",
+                (week, site, area, property_type)
+            ).fetchone()
+            count, rent_sum, sized_count, per_sqm_sum = row[:4] if row else (0, 0.0, 0, 0.0)
+            rent_sketch = QuantileSketch.from_bytes(row[4] if row else b'', self.relative_accuracy)
+            per_sqm_sketch = QuantileSketch.from_bytes(row[5] if row else b'', self.relative_accuracy)
+            rent_sketch.add(rents)
+            per_sqm_sketch.add(per_sqm)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rent_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (week, site, area, property_type, count + len(rents), rent_sum + sum(rents),
+                 sized_count + len(per_sqm), per_sqm_sum + sum(per_sqm),
+                 rent_sketch.to_bytes(), per_sqm_sketch.to_bytes())
+            )
+
+    def query(self, by: Tuple[str, ...] = ('area', 'property_type'), since: str = None, until: str = None,
+              site: str = None, area: str = None, property_type: str = None,
+              quantiles: Sequence[float] = DEFAULT_QUANTILES) -> List[Dict]:
+        """
+        Count, mean and quantiles of monthly rent and rent per sqm per
+        group, over the weeks from since to until (ISO dates, inclusive).
+        Groups are any of week, site, area (postcode district) and
+        property_type.
+        """
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("week >= ?")
+            params.append(week_of(since))
+        if until is not None:
+            clauses.append("week <= ?")
+            params.append(week_of(until))
+        for name, value in (('site', site), ('area', area), ('property_type', property_type)):
+            if value is not None:
+                clauses.append(f"{name} = ?")
+                params.append(value.upper() if name == 'area' else value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._conn.execute(
+            f"SELECT week, site, area, property_type, count, rent_sum, sized_count, per_sqm_sum, "
+            f"rent_sketch, per_sqm_sketch FROM rent_rollups {where}", params
+        ).fetchall()
+
+        groups = {}
+        for row in rows:
+            group = tuple(row[field] for field in by)
+            totals = groups.get(group)
+            if totals is None:
+                totals = groups[group] = [0, 0.0, 0, 0.0, QuantileSketch(self.relative_accuracy),
+                                          QuantileSketch(self.relative_accuracy)]
+            totals[0] += row['count']
+            totals[1] += row['rent_sum']
+            totals[2] += row['sized_count']
+            totals[3] += row['per_sqm_sum']
+            totals[4].merge(QuantileSketch.from_bytes(row['rent_sketch'], self.relative_accuracy))
+            totals[5].merge(QuantileSketch.from_bytes(row['per_sqm_sketch'], self.relative_accuracy))
+
+        result = []
+        for group, (count, rent_sum, sized_count, per_sqm_sum, rents, per_sqm) in sorted(groups.items()):
+            entry = {**dict(zip(by, group)), 'count': count,
+                     'mean_rent': round(rent_sum / count, 2), 'sized_count': sized_count,
+                     'mean_rent_per_sqm': round(per_sqm_sum / sized_count, 2) if sized_count else None}
+            for q in quantiles:
+                name = 'median' if q == 0.5 else f'p{round(q * 100):g}'
+                value = rents.quantile(q)
+                entry[f'{name}_rent'] = round(value, 2)
+                value = per_sqm.quantile(q)
+                entry[f'{name}_rent_per_sqm'] = round(value, 2) if value is not None else None
+            result.append(entry)
+        return result
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM rent_rollups LIMIT 1").fetchone() is None
+
+    def clear(self):
+        self._conn.execute("DELETE FROM rent_rollups")
+        self._conn.execute("DELETE FROM rolled_up")
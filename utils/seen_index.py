@@ -0,0 +1,162 @@
+"""
+Persistent index of listings already scraped, for incremental runs.
+
+Each listing URL maps to a fingerprint of the fields that matter when a
+listing changes (price, availability, address). An incremental run emits
+only new or changed listings and stops paging once several consecutive
+results pages contain nothing new.
+
+SharedSeenSet is the cross-process set of URLs a sharded crawl has
+written, so a listing found by two shards is only written once.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+DEFAULT_INDEX_DB = 'listing_index.db'
+
+# Stop after this many consecutive pages with no new or changed listings
+DEFAULT_STOP_AFTER_SEEN_PAGES = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_listings (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (site, url)
+) WITHOUT ROWID;
+"""
+
+
+def fingerprint(listing: Dict) -> str:
+    """Content hash of the fields whose change makes a listing worth re-emitting"""
+    content = "|".join(str(listing.get(field) or '') for field in
+                       ("monthly_price", "available_from", "address"))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class SeenIndex:
+    def __init__(self, path: str = DEFAULT_INDEX_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def lookup(self, site: str, urls: List[str]) -> Dict[str, str]:
+        """Stored fingerprints for the given URLs (missing ones are new)"""
+        urls = [url for url in urls if url]
+        if not urls:
+            return {}
+        placeholders = ",".join("?" * len(urls))
+        with self._lock:
+            return dict(self._conn.execute(
+                f"SELECT url, fingerprint FROM seen_listings WHERE site = ? AND url IN ({placeholders})",
+                [site, *urls]
+            ))
+
+    def record(self, site: str, listings: List[Dict]):
+        now = datetime.now().isoformat()
+        rows = [(site, listing['url'], fingerprint(listing), now, now)
+                for listing in listings if listing.get('url')]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO seen_listings (site, url, fingerprint, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (site, url) DO UPDATE SET "
+                "fingerprint = excluded.fingerprint, last_seen = excluded.last_seen",
+                rows
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class IncrementalFilter:
+    """Per-run filter over results pages backed by a SeenIndex"""
+
+    def __init__(self, index: SeenIndex, site: str,
+                 stop_after_seen_pages: int = DEFAULT_STOP_AFTER_SEEN_PAGES):
+        self.index = index
+        self.site = site
+        self.stop_after_seen_pages = stop_after_seen_pages
+        self.consecutive_seen_pages = 0
+        self.new = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    @property
+    def exhausted(self) -> bool:
+        """True once enough consecutive pages had nothing new to stop paging"""
+        return bool(self.stop_after_seen_pages) and \
+            self.consecutive_seen_pages >= self.stop_after_seen_pages
+
+    def filter_page(self, listings: List[Dict]) -> List[Dict]:
+        """New or changed listings from one results page"""
+        known = self.index.lookup(self.site, [listing.get('url') for listing in listings])
+        fresh = []
+        for listing in listings:
+            stored = known.get(listing.get('url'))
+            if stored is None:
+                self.new += 1
+                fresh.append(listing)
+            elif stored != fingerprint(listing):
+                self.changed += 1
+                fresh.append(listing)
+            else:
+                self.unchanged += 1
+        self.consecutive_seen_pages = 0 if fresh else self.consecutive_seen_pages + 1
+        return fresh
+
+    def commit(self, listings: List[Dict]):
+        """Remember listings once they have been emitted"""
+        if listings:
+            self.index.record(self.site, listings)
+
+
+CLAIMS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (
+    url TEXT PRIMARY KEY,
+    owner TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SharedSeenSet:
+    """
+    URLs already written by one of the shards of a sharded crawl, shared
+    between worker processes through a SQLite file. The first shard to
+    claim a URL owns it; a resumed shard can re-claim its own URLs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Several processes write here at once; take the write lock up front
+        # (BEGIN IMMEDIATE) so a claim waits for theirs instead of failing
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level='IMMEDIATE', check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(CLAIMS_SCHEMA)
+        self._lock = threading.Lock()
+
+    def claim(self, url: str, owner: str) -> bool:
+        """True if url is new or already owned by owner, so owner should write it"""
+        if not url:
+            return True
+        with self._lock, self._conn:
+            stored = self._conn.execute(
+                "INSERT INTO claims (url, owner) VALUES (?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET owner = owner RETURNING owner",
+                (url, owner)
+            ).fetchone()[0]
+        return stored == owner
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM claims").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,144 @@
+"""
+Incremental output sinks for scraped listings.
+
+Listings are written as they arrive and flushed every `flush_every` records,
+so a crash part-way through a crawl keeps everything scraped so far and
+memory stays constant regardless of how many listings are collected.
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+
+from utils.records import Listing
+
+FIELDNAMES = ["url", "address", "monthly_price", "property_type", "size_sqm",
+              "latitude", "longitude", "deposit", "available_from"]
+
+
+def _open_text(path, mode):
+    """Open a text file, transparently gzip-compressed for *.gz paths"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', newline='', encoding='utf-8')
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+class ListingSink:
+    """Base class: buffered, periodically flushed writer for listing dicts"""
+
+    def __init__(self, path, flush_every=100, append=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._existing = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = _open_text(path, 'a' if append else 'w')
+
+    def write(self, listing):
+        self._write(listing)
+        self.count += 1
+        if self.flush_every and self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def write_all(self, listings):
+        for listing in listings:
+            self.write(listing)
+        return self.count
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, listing):
+        raise NotImplementedError
+
+
+class CsvSink(ListingSink):
+    def __init__(self, path, fieldnames=FIELDNAMES, flush_every=100, append=False):
+        super().__init__(path, flush_every=flush_every, append=append)
+        self.fieldnames = fieldnames
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction='ignore')
+        # Listing records go straight to rows, without a dict per listing
+        self._rows = csv.writer(self._file)
+        if not self._existing:
+            self._writer.writeheader()
+
+    def _write(self, listing):
+        if isinstance(listing, Listing):
+            self._rows.writerow(listing.row(self.fieldnames))
+        else:
+            self._writer.writerow(listing)
+
+
+class JsonlSink(ListingSink):
+    def _write(self, listing):
+        if isinstance(listing, Listing):
+            listing = listing.to_dict()
+        self._file.write(json.dumps(listing, ensure_ascii=False) + '\n')
+
+
+class TeeSink:
+    """Fan each listing out to several sinks; count follows the first"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    @property
+    def count(self):
+        return self.sinks[0].count
+
+    def write(self, listing):
+        for sink in self.sinks:
+            sink.write(listing)
+
+    def write_all(self, listings):
+        for listing in listings:
+            self.write(listing)
+        return self.count
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_sink(path, flush_every=100, append=False):
+    """Pick a sink from the file extension (.csv, .jsonl, optionally .gz)"""
+    base = path[:-3] if path.endswith('.gz') else path
+    if base.endswith('.jsonl') or base.endswith('.json'):
+        return JsonlSink(path, flush_every=flush_every, append=append)
+    if base.endswith('.csv'):
+        return CsvSink(path, flush_every=flush_every, append=append)
+    raise ValueError(f"Unsupported output format: {path}")
+
+
+def read_listings(path):
+    """Listings back from a file written by open_sink (CSV values come back as strings)"""
+    base = path[:-3] if path.endswith('.gz') else path
+    with _open_text(path, 'r') as f:
+        if base.endswith('.jsonl') or base.endswith('.json'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
@@ -0,0 +1,250 @@
+"""
+Process-wide scrape telemetry: counters and latency histograms.
+
+Instrumented code records into the shared registry (get_metrics()) with
+labels such as site, host, proxy, stage or status. The Flask app renders
+the registry in the Prometheus text format at /metrics. A RunReport
+diffs the registry over one scrape and summarizes it as JSON (stage
+timings, request latency per proxy, status codes, CAPTCHAs, blocks,
+pages, cards, throughput), which shows at a glance whether proxies,
+CAPTCHAs or parsing are holding a run back.
+"""
+
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds in seconds, from a parse of one page to a slow proxy fetch
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_RECENT_REPORTS = 20
+
+HELP = {
+    "scrape_stage_seconds": "Time spent per scrape stage (fetch, parse, clean, write) per page or listing",
+    "scrape_request_seconds": "HTTP round-trip latency per host and proxy",
+    "scrape_rate_limit_wait_seconds": "Time requests waited for the per-host rate limit",
+    "scrape_captcha_solve_seconds": "CAPTCHA solve time per host",
+    "scrape_responses_total": "HTTP responses per host and status code",
+    "scrape_request_errors_total": "Requests that failed without a response, per host",
+    "scrape_blocked_total": "Responses that looked like an IP block, per host",
+    "scrape_throttled_total": "Responses that slowed a host down, per host and reason",
+    "scrape_captchas_total": "CAPTCHA challenges per host and outcome",
+    "scrape_pages_total": "Results pages per site and outcome (ok, empty, failed)",
+    "scrape_cards_total": "Property cards per site and outcome (parsed, incomplete, failed)",
+    "scrape_listings_written_total": "Listings written to the output per site",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram of one labelled series"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and histograms"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the time spent in the with block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        """
+        {(name, labels): value} for counters and {(name, labels): (count,
+        sum)} for histograms, as plain values that can be diffed
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {key: (h.count, h.sum) for key, h in self._histograms.items()},
+            }
+
+    def render_prometheus(self) -> str:
+        """The registry in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count))
+                                for key, h in self._histograms.items())
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), (counts, total, count) in histograms:
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound}'),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+_metrics = Metrics()
+_recent_reports = deque(maxlen=MAX_RECENT_REPORTS)
+_recent_reports_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """The process-wide registry every scraper records into"""
+    return _metrics
+
+
+def recent_reports() -> List[Dict]:
+    """Reports of the most recently finished runs, newest last"""
+    with _recent_reports_lock:
+        return list(_recent_reports)
+
+
+class RunReport:
+    """
+    Telemetry of one site's scrape: the registry's change between start()
+    and finish(), restricted to the site's own series (label site=name,
+    or host=the site's host for request-level metrics).
+    """
+
+    def __init__(self, site: str, host: str, metrics: Metrics = None):
+        self.site = site
+        self.host = host
+        self.metrics = metrics or get_metrics()
+        self._started = None
+        self._started_at = None
+        self._before = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._started_at = datetime.now().isoformat()
+        self._before = self.metrics.snapshot()
+        return self
+
+    def _mine(self, labels: Labels) -> bool:
+        labels = dict(labels)
+        return labels.get('site') == self.site or labels.get('host') == self.host
+
+    def finish(self, report_file: Optional[str] = None) -> Dict:
+        """Build the report, remember it for recent_reports() and write it to report_file if given"""
+        elapsed = time.perf_counter() - self._started
+        after = self.metrics.snapshot()
+        counters = {}
+        for key, value in after["counters"].items():
+            delta = value - self._before["counters"].get(key, 0)
+            if delta and self._mine(key[1]):
+                counters[key] = delta
+        histograms = {}
+        for key, (count, total) in after["histograms"].items():
+            before_count, before_total = self._before["histograms"].get(key, (0, 0.0))
+            if count > before_count and self._mine(key[1]):
+                histograms[key] = (count - before_count, total - before_total)
+
+        def counted(name, by):
+            result = {}
+            for (metric, labels), value in counters.items():
+                if metric == name:
+                    label = dict(labels).get(by, '')
+                    result[label] = result.get(label, 0) + value
+            return result
+
+        def timed(name, by):
+            result = {}
+            for (metric, labels), (count, total) in histograms.items():
+                if metric == name:
+                    label = dict(labels).get(by, '')
+                    result[label] = {"count": count, "total_seconds": round(total, 4),
+                                     "mean_seconds": round(total / count, 4)}
+            return result
+
+        pages = counted("scrape_pages_total", "outcome")
+        written = sum(counted("scrape_listings_written_total", "site").values())
+        report = {
+            "site": self.site,
+            "started_at": self._started_at,
+            "finished_at": datetime.now().isoformat(),
+            "elapsed_seconds": round(elapsed, 3),
+            "listings_written": written,
+            "listings_per_second": round(written / elapsed, 2) if elapsed else None,
+            "pages": pages,
+            "pages_per_second": round(sum(pages.values()) / elapsed, 2) if elapsed else None,
+            "cards": counted("scrape_cards_total", "outcome"),
+            "stages": timed("scrape_stage_seconds", "stage"),
+            "requests_by_proxy": timed("scrape_request_seconds", "proxy"),
+            "rate_limit_wait": timed("scrape_rate_limit_wait_seconds", "host"),
+            "status_codes": counted("scrape_responses_total", "status"),
+            "request_errors": sum(counted("scrape_request_errors_total", "host").values()),
+            "blocked": sum(counted("scrape_blocked_total", "host").values()),
+            "throttled": counted("scrape_throttled_total", "reason"),
+            "captchas": counted("scrape_captchas_total", "outcome"),
+            "captcha_solve": timed("scrape_captcha_solve_seconds", "host"),
+        }
+        with _recent_reports_lock:
+            _recent_reports.append(report)
+        if report_file:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        return report